@@ -1,8 +1,12 @@
 import logging
 import logging.handlers
 import os
+import threading
 from .service_config import config
 
+_setup_lock = threading.Lock()
+_setup_done = False
+
 
 def setup_logging():
     """设置日志系统"""
@@ -45,6 +49,7 @@ def setup_logging():
     logging.getLogger("transformers").setLevel(logging.WARNING)
     logging.getLogger("sentence_transformers").setLevel(logging.INFO)
     logging.getLogger("urllib3").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
 
     # 设置访问日志
     setup_access_logging()
@@ -77,6 +82,27 @@ def setup_access_logging():
     access_logger.addHandler(access_handler)
 
 
-# 初始化日志
-logger = setup_logging()
-access_logger = logging.getLogger('access')
\ No newline at end of file
+def ensure_logging():
+    """首次使用日志时才初始化（创建日志目录与处理器），import本模块不再有副作用"""
+    global _setup_done
+    if _setup_done:
+        return
+    with _setup_lock:
+        if not _setup_done:
+            setup_logging()
+            _setup_done = True
+
+
+class _LazyLogger:
+    """日志代理：访问任意属性时先完成日志初始化，再转发给真实的logger"""
+
+    def __init__(self, name=None):
+        self._name = name
+
+    def __getattr__(self, item):
+        ensure_logging()
+        return getattr(logging.getLogger(self._name), item)
+
+
+logger = _LazyLogger()
+access_logger = _LazyLogger('access')
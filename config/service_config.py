@@ -8,6 +8,29 @@ class ServiceConfig:
     # url配置
     embedding_url = "http://172.18.10.61:8010"
     milvus_url = "http://172.18.10.65:19530"
+    # http连接池配置
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http2: bool = False
+    # 向量缓存配置（文件路径为空时不启用）
+    embedding_model_id: str = "bge-m3"
+    embedding_cache_file: str = ""
+    embedding_cache_max_mb: int = 1024
+    # 向量服务响应优先使用紧凑的二进制格式，服务端不支持时自动使用JSON
+    embedding_compact_format: bool = True
+    # PDF转换命令（为空时使用 conda run -n mineru-env mineru），测试时可替换为假转换器
+    mineru_command: str = ""
+    # 转换程序版本，参与转换缓存的key，升级MinerU后需修改以使旧结果失效
+    converter_version: str = "mineru"
+    # PDF转换结果缓存上限（MB），为0时不启用缓存
+    pdf_convert_cache_max_mb: int = 10240
+    # 检索缓存配置：查询向量LRU缓存条数、检索结果缓存条数与有效期（秒，为0时不缓存检索结果）
+    search_embedding_cache_size: int = 10000
+    search_result_cache_size: int = 10000
+    search_result_cache_ttl: float = 60.0
+    # 本地向量索引目录，设置后入库与检索使用本地索引而不连接Milvus
+    local_index_dir: str = ""
     # 日志配置
     log_level: str = "INFO"
     log_file: str = "/home/zhangjiang/logs/file_split/file_split.log"
@@ -23,6 +46,36 @@ class ServiceConfig:
             self.embedding_url = os.getenv("EMBEDDINGS_URL")
         if os.getenv("MILVUS_URL"):
             self.milvus_url = os.getenv("MILVUS_URL")
+        if os.getenv("HTTP_MAX_CONNECTIONS"):
+            self.http_max_connections = int(os.getenv("HTTP_MAX_CONNECTIONS"))
+        if os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS"):
+            self.http_max_keepalive_connections = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS"))
+        if os.getenv("HTTP_KEEPALIVE_EXPIRY"):
+            self.http_keepalive_expiry = float(os.getenv("HTTP_KEEPALIVE_EXPIRY"))
+        if os.getenv("HTTP2"):
+            self.http2 = os.getenv("HTTP2").lower() in ("1", "true", "yes")
+        if os.getenv("EMBEDDING_MODEL_ID"):
+            self.embedding_model_id = os.getenv("EMBEDDING_MODEL_ID")
+        if os.getenv("EMBEDDING_CACHE_FILE"):
+            self.embedding_cache_file = os.getenv("EMBEDDING_CACHE_FILE")
+        if os.getenv("EMBEDDING_CACHE_MAX_MB"):
+            self.embedding_cache_max_mb = int(os.getenv("EMBEDDING_CACHE_MAX_MB"))
+        if os.getenv("EMBEDDING_COMPACT_FORMAT"):
+            self.embedding_compact_format = os.getenv("EMBEDDING_COMPACT_FORMAT").lower() in ("1", "true", "yes")
+        if os.getenv("MINERU_COMMAND"):
+            self.mineru_command = os.getenv("MINERU_COMMAND")
+        if os.getenv("CONVERTER_VERSION"):
+            self.converter_version = os.getenv("CONVERTER_VERSION")
+        if os.getenv("PDF_CONVERT_CACHE_MAX_MB"):
+            self.pdf_convert_cache_max_mb = int(os.getenv("PDF_CONVERT_CACHE_MAX_MB"))
+        if os.getenv("SEARCH_EMBEDDING_CACHE_SIZE"):
+            self.search_embedding_cache_size = int(os.getenv("SEARCH_EMBEDDING_CACHE_SIZE"))
+        if os.getenv("SEARCH_RESULT_CACHE_SIZE"):
+            self.search_result_cache_size = int(os.getenv("SEARCH_RESULT_CACHE_SIZE"))
+        if os.getenv("SEARCH_RESULT_CACHE_TTL"):
+            self.search_result_cache_ttl = float(os.getenv("SEARCH_RESULT_CACHE_TTL"))
+        if os.getenv("LOCAL_INDEX_DIR"):
+            self.local_index_dir = os.getenv("LOCAL_INDEX_DIR")
         if os.getenv("FILE_SPLIT_LOG_FILE"):
             self.log_file = os.getenv("FILE_SPLIT_LOG_FILE")
         if os.getenv("FILE_SPLIT_LOG_LEVEL"):
@@ -0,0 +1,155 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from config.logging_config import logger
+from core.file_split import FileSplit
+from core.vector.async_milvus_write import AsyncMilvusWrite
+
+
+class AsyncIngestEngine:
+    """
+    asyncio入库引擎：单进程内可同时保持数百个向量化/写入请求
+    - 切分在线程中执行，通过有界asyncio.Queue把切片交给事件循环，队列满时切分线程阻塞
+    - 每个批次一个协程：向量化 -> upsert，并发度由AsyncMilvusWrite中的信号量控制
+    - max_pending_batches限制在途批次数，替代MAX_TASK_NUM自旋等待
+    """
+    _STOP = object()
+
+    def __init__(self,
+                 milvus_write: AsyncMilvusWrite,
+                 collection_name: str,
+                 file_split: Optional[FileSplit] = None,
+                 batch_size: int = 32,
+                 max_pending_batches: int = 256,
+                 queue_size: int = 1024):
+        if batch_size <= 0:
+            raise ValueError("batch_size must be > 0")
+
+        self._milvus_write = milvus_write
+        self._collection_name = collection_name
+        self._file_split = file_split
+        self._batch_size = batch_size
+        self._max_pending_batches = max_pending_batches
+        self._queue_size = queue_size
+
+        self._stats = {
+            "chunks": 0,
+            "written": 0,
+            "failed": 0
+        }
+        self._failures: List[dict] = []
+
+    async def ingest_documents(self, documents: List[tuple]) -> Dict[str, int]:
+        """入库多个文档，documents为[(doc_id, doc_name), ...]"""
+        if self._file_split is None:
+            raise RuntimeError("AsyncIngestEngine has no FileSplit")
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self._queue_size)
+
+        def put(item) -> None:
+            # 在切分线程中调用：等待事件循环完成put，队列满时自然阻塞切分
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def split_all() -> None:
+            try:
+                for doc_id, doc_name in documents:
+                    for chunk in self._file_split.iter_chunks(doc_id=doc_id, path=doc_name):
+                        put((doc_id, doc_name, chunk.chunk_id, chunk.content))
+            finally:
+                put(self._STOP)
+
+        start_time = time.time()
+        split_task = asyncio.create_task(asyncio.to_thread(split_all))
+        await self._consume(queue)
+        await split_task
+
+        stats = self.get_stats()
+        logger.info(f"async ingest finished | docs={len(documents)} | {stats} | "
+                    f"elapsed={time.time() - start_time:.1f}s")
+        return stats
+
+    async def ingest_chunks(self, chunks: List[tuple]) -> Dict[str, int]:
+        """入库已切分好的切片，chunks为[(doc_id, doc_name, chunk_id, content), ...]"""
+        queue: asyncio.Queue = asyncio.Queue()
+        for chunk in chunks:
+            queue.put_nowait(chunk)
+        queue.put_nowait(self._STOP)
+        await self._consume(queue)
+        return self.get_stats()
+
+    async def _consume(self, queue: asyncio.Queue) -> None:
+        pending_semaphore = asyncio.Semaphore(self._max_pending_batches)
+        tasks = set()
+        batch = []
+
+        async def dispatch(items: List[tuple]) -> None:
+            await pending_semaphore.acquire()
+            task = asyncio.create_task(self._process_batch(items))
+            tasks.add(task)
+
+            def done(t):
+                tasks.discard(t)
+                pending_semaphore.release()
+
+            task.add_done_callback(done)
+
+        while True:
+            item = await queue.get()
+            if item is self._STOP:
+                break
+            self._stats["chunks"] += 1
+            # 批次只包含同一文档的切片
+            if batch and batch[0][:2] != item[:2]:
+                await dispatch(batch)
+                batch = []
+            batch.append(item)
+            if len(batch) >= self._batch_size:
+                await dispatch(batch)
+                batch = []
+        if batch:
+            await dispatch(batch)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def _process_batch(self, items: List[tuple]) -> None:
+        doc_id, doc_name = items[0][:2]
+        try:
+            rows = await self._milvus_write.gene_data_batch(doc_id=doc_id,
+                                                            doc_name=doc_name,
+                                                            texts=[item[3] for item in items],
+                                                            chunk_ids=[item[2] for item in items])
+            await self._milvus_write.upsert(self._collection_name, rows)
+        except Exception as e:
+            logger.exception(f"async ingest batch failed | doc_id={doc_id} | size={len(items)}")
+            self._stats["failed"] += len(items)
+            self._failures.extend({"doc_id": item[0], "chunk_id": item[2], "error": str(e)} for item in items)
+            return
+        self._stats["written"] += len(rows)
+
+    def get_stats(self) -> Dict[str, int]:
+        return self._stats.copy()
+
+    def get_failures(self) -> List[dict]:
+        return list(self._failures)
+
+
+async def _main():
+    collection_name = "cn_1"
+    doc_id = 1
+    doc_name = "/home/zhangjiang/广东大湾区空天信息研究院2025年度职工考核评价办法.md"
+
+    milvus_write = AsyncMilvusWrite()
+    engine = AsyncIngestEngine(milvus_write=milvus_write,
+                               collection_name=collection_name,
+                               file_split=FileSplit())
+    try:
+        stats = await engine.ingest_documents([(doc_id, doc_name)])
+    finally:
+        await milvus_write.close()
+    print(f"doc_name: {doc_name} process Finished | {stats}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
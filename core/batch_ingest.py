@@ -0,0 +1,316 @@
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from queue import Empty, Queue
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config.logging_config import logger
+from core.file_split import FileSplit
+from core.ingest_pipeline import IngestPipeline
+from core.pdf_convert_scheduler import PdfConvertScheduler
+from core.vector.milvus_write import MilvusWrite
+
+SUPPORTED_SUFFIXES = (".md", ".pdf")
+
+
+@dataclass
+class DocTask:
+    doc_id: int
+    path: str
+
+
+@dataclass
+class DocStatus:
+    doc_id: int
+    path: str
+    status: str = "pending"  # pending / done / partial / failed
+    chunks: int = 0
+    failed_chunks: int = 0
+    error: Optional[str] = None
+    duration: float = 0.0
+
+
+def _check_unique_doc_ids(tasks: List[DocTask]) -> None:
+    """doc_id重复时各文档的状态会互相覆盖，写入Milvus的切片主键也会冲突"""
+    seen = set()
+    duplicates = set()
+    for task in tasks:
+        if task.doc_id in seen:
+            duplicates.add(task.doc_id)
+        seen.add(task.doc_id)
+    if duplicates:
+        raise ValueError(f"duplicate doc_id in tasks: {sorted(duplicates)}")
+
+
+def load_tasks(source: str, start_doc_id: int = 1) -> List[DocTask]:
+    """
+    加载待入库文档
+    - 目录：递归收集其中的Markdown/PDF文件，按路径排序后从start_doc_id开始编号
+    - 单个Markdown/PDF文件：一个文档，doc_id为start_doc_id
+    - .jsonl清单：每行 {"doc_id": 1, "path": "..."}，doc_id缺省时自动编号
+    - 其他清单文件：每行一个文件路径
+    """
+    source_path = Path(source)
+    if source_path.is_dir():
+        paths = sorted(str(p) for p in source_path.rglob("*")
+                       if p.is_file() and p.suffix.lower() in SUPPORTED_SUFFIXES)
+        return [DocTask(doc_id=start_doc_id + i, path=p) for i, p in enumerate(paths)]
+    if source_path.suffix.lower() in SUPPORTED_SUFFIXES:
+        return [DocTask(doc_id=start_doc_id, path=str(source_path))]
+
+    tasks = []
+    next_doc_id = start_doc_id
+    with open(source_path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if source_path.suffix.lower() == ".jsonl":
+                item = json.loads(line)
+                doc_id = int(item.get("doc_id", next_doc_id))
+                path = item["path"]
+            else:
+                doc_id = next_doc_id
+                path = line
+            tasks.append(DocTask(doc_id=doc_id, path=path))
+            next_doc_id = doc_id + 1
+    _check_unique_doc_ids(tasks)
+    return tasks
+
+
+# 每个子进程只初始化一次FileSplit（加载一次tokenizer）
+_worker_file_split: Optional[FileSplit] = None
+
+
+def _init_worker(file_split_kwargs: dict) -> None:
+    global _worker_file_split
+    _worker_file_split = FileSplit(**file_split_kwargs)
+
+
+def _split_document(doc_id: int, path: str, initial_headers: Optional[dict] = None) -> List[tuple]:
+    """在子进程中执行：将Markdown切分为(chunk_id, content)列表，分片转换时带上一分片末尾的标题"""
+    return [(chunk.chunk_id, chunk.content)
+            for chunk in _worker_file_split.iter_chunks(doc_id=doc_id, path=path,
+                                                        initial_headers=initial_headers)]
+
+
+class BatchIngest:
+    """
+    多文档并行入库：
+    - 文档切分（CPU密集，受GIL限制）分发到进程池，每个子进程只加载一次tokenizer；
+      父进程中已有连接池、写入线程等，子进程以forkserver方式启动，不从多线程进程fork
+    - PDF由PdfConvertScheduler在后台线程中批量并发转换，每转换完成一个就送入切分进程池
+    - 超过pdf_shard_pages页的PDF按页码范围分片转换，各分片并行切分后按顺序合并，chunk_id连续编号
+    - 切分结果汇入父进程中共享的IngestPipeline完成向量化与写入，
+      pipeline的embed/write工作线程数即为对向量服务与Milvus的全局并发上限
+    """
+
+    # 不支持forkserver的平台使用spawn
+    MP_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+    def __init__(self,
+                 milvus_write: MilvusWrite,
+                 collection_name: str,
+                 process_workers: Optional[int] = None,
+                 embed_workers: int = 4,
+                 write_workers: int = 2,
+                 pdf_output_dir: Optional[str] = None,
+                 file_split_kwargs: Optional[dict] = None,
+                 pdf_concurrency: int = 1,
+                 pdf_batch_size: int = 4,
+                 pdf_shard_pages: int = 0):
+        self._milvus_write = milvus_write
+        self._collection_name = collection_name
+        self._process_workers = process_workers or os.cpu_count() or 1
+        self._embed_workers = embed_workers
+        self._write_workers = write_workers
+        self._pdf_output_dir = pdf_output_dir
+        self._file_split_kwargs = file_split_kwargs or {}
+        self._pdf_concurrency = pdf_concurrency
+        self._pdf_batch_size = pdf_batch_size
+        self._pdf_shard_pages = pdf_shard_pages
+
+    def _start_conversion(self, pdf_tasks: List[DocTask], ready: Queue) -> None:
+        """后台线程转换PDF，每个任务向ready队列放入一项：(task, 各分片markdown路径, error, 转换耗时)"""
+        tasks_by_path: Dict[str, List[DocTask]] = {}
+        for task in pdf_tasks:
+            tasks_by_path.setdefault(os.path.abspath(task.path), []).append(task)
+        scheduler = PdfConvertScheduler(output_dir=self._pdf_output_dir,
+                                        max_concurrency=self._pdf_concurrency,
+                                        batch_size=self._pdf_batch_size,
+                                        shard_pages=self._pdf_shard_pages)
+
+        def convert_all() -> None:
+            try:
+                for result in scheduler.convert(list(tasks_by_path.keys())):
+                    for task in tasks_by_path.pop(result.pdf_path, []):
+                        ready.put((task, result.markdown_paths, result.error, result.duration))
+            except Exception as e:
+                logger.exception("pdf conversion thread failed")
+                for tasks in tasks_by_path.values():
+                    for task in tasks:
+                        ready.put((task, [], str(e), 0.0))
+
+        threading.Thread(target=convert_all, name="BatchIngest-convert", daemon=True).start()
+
+    def run(self, tasks: List[DocTask]) -> List[DocStatus]:
+        _check_unique_doc_ids(tasks)
+        if not self._pdf_output_dir and any(task.path.lower().endswith(".pdf") for task in tasks):
+            raise ValueError("pdf_output_dir is required to ingest PDF files")
+
+        statuses: Dict[int, DocStatus] = {task.doc_id: DocStatus(doc_id=task.doc_id, path=task.path)
+                                          for task in tasks}
+        total = len(tasks)
+        finished = 0
+        start_time = time.time()
+
+        # 先创建进程池，再启动流水线与转换线程
+        executor = ProcessPoolExecutor(max_workers=self._process_workers,
+                                       mp_context=multiprocessing.get_context(self.MP_START_METHOD),
+                                       initializer=_init_worker,
+                                       initargs=(self._file_split_kwargs,))
+        # 父进程只用于扫描分片标题
+        file_split = FileSplit(**self._file_split_kwargs)
+
+        pipeline = IngestPipeline(milvus_write=self._milvus_write,
+                                  collection_name=self._collection_name,
+                                  embed_workers=self._embed_workers,
+                                  write_workers=self._write_workers)
+
+        # 就绪队列：Markdown直接就绪，PDF转换完成后就绪
+        ready: Queue = Queue()
+        pdf_tasks = [task for task in tasks if task.path.lower().endswith(".pdf")]
+        for task in tasks:
+            if not task.path.lower().endswith(".pdf"):
+                ready.put((task, [task.path], None, 0.0))
+        if pdf_tasks:
+            self._start_conversion(pdf_tasks, ready)
+
+        with executor, pipeline:
+            remaining = total
+            running = {}
+            # 分片文档的切分状态：doc_id -> {"chunks": 各分片切分结果, "pending": 未完成分片数, "error": 错误}
+            sharded: Dict[int, dict] = {}
+            # 控制同时在切分中的分片数，避免切分结果在父进程中大量堆积
+            max_running = self._process_workers * 2
+            while remaining or running:
+                while remaining and len(running) < max_running:
+                    try:
+                        # 没有切分中的文档时阻塞等待转换结果
+                        task, markdown_paths, error, convert_duration = ready.get(block=not running)
+                    except Empty:
+                        break
+                    remaining -= 1
+                    if error is not None:
+                        status = statuses[task.doc_id]
+                        status.status = "failed"
+                        status.error = error
+                        status.duration = convert_duration
+                        finished += 1
+                        logger.error(f"convert document failed | doc_id={task.doc_id} | path={task.path} | {error}")
+                        continue
+                    task_start = time.time() - convert_duration
+                    if len(markdown_paths) == 1:
+                        future = executor.submit(_split_document, task.doc_id, markdown_paths[0])
+                        running[future] = (task, task_start, None)
+                        continue
+                    sharded[task.doc_id] = {"chunks": [None] * len(markdown_paths),
+                                            "pending": len(markdown_paths),
+                                            "error": None}
+                    for index, (path, initial_headers) in enumerate(
+                            zip(markdown_paths, file_split.shard_initial_headers(markdown_paths))):
+                        future = executor.submit(_split_document, task.doc_id, path, initial_headers)
+                        running[future] = (task, task_start, index)
+
+                if not running:
+                    continue
+                # 仍有文档在转换时定期返回，及时把新转换好的文档送入进程池
+                done, _ = wait(running.keys(), timeout=0.1 if remaining else None,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    task, task_start, shard_index = running.pop(future)
+                    status = statuses[task.doc_id]
+                    try:
+                        chunks = future.result()
+                        error = None
+                    except Exception as e:
+                        chunks = []
+                        error = str(e)
+
+                    if shard_index is not None:
+                        shards = sharded[task.doc_id]
+                        shards["chunks"][shard_index] = chunks
+                        shards["error"] = shards["error"] or error
+                        shards["pending"] -= 1
+                        if shards["pending"]:
+                            continue
+                        del sharded[task.doc_id]
+                        error = shards["error"]
+                        # 各分片的chunk_id均从1开始，按分片顺序重新连续编号
+                        chunks = [(chunk_id, content) for chunk_id, (_, content) in
+                                  enumerate((chunk for shard in shards["chunks"] for chunk in shard), start=1)]
+
+                    if error is not None:
+                        status.status = "failed"
+                        status.error = error
+                        logger.error(f"split document failed | doc_id={task.doc_id} | path={task.path} | {error}")
+                    else:
+                        for chunk_id, content in chunks:
+                            pipeline.submit(doc_id=task.doc_id,
+                                            doc_name=task.path,
+                                            chunk_id=chunk_id,
+                                            content=content)
+                        status.status = "done"
+                        status.chunks = len(chunks)
+                    status.duration = time.time() - task_start
+                    finished += 1
+                    logger.info(f"batch ingest progress [{finished}/{total}] | doc_id={task.doc_id} | "
+                                f"status={status.status} | chunks={status.chunks} | "
+                                f"elapsed={time.time() - start_time:.1f}s")
+
+        for failure in pipeline.get_failures():
+            status = statuses.get(failure["doc_id"])
+            if status is None:
+                continue
+            status.failed_chunks += 1
+            if status.status == "done":
+                status.status = "partial"
+                status.error = failure["error"]
+
+        logger.info(f"batch ingest finished | docs={total} | {pipeline.get_stats()} | "
+                    f"elapsed={time.time() - start_time:.1f}s")
+        return list(statuses.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量并行入库Markdown/PDF文档")
+    parser.add_argument("source", help="文档目录或清单文件（.jsonl / 每行一个路径）")
+    parser.add_argument("--collection", default="cn_1")
+    parser.add_argument("--start-doc-id", type=int, default=1)
+    parser.add_argument("--process-workers", type=int, default=None)
+    parser.add_argument("--embed-workers", type=int, default=4)
+    parser.add_argument("--write-workers", type=int, default=2)
+    parser.add_argument("--pdf-output-dir", default=None)
+    parser.add_argument("--pdf-concurrency", type=int, default=1)
+    parser.add_argument("--pdf-batch-size", type=int, default=4)
+    parser.add_argument("--pdf-shard-pages", type=int, default=0,
+                        help="超过该页数的PDF按页码范围分片并行转换与切分，0表示不分片")
+    args = parser.parse_args()
+
+    batch_ingest = BatchIngest(milvus_write=MilvusWrite(),
+                               collection_name=args.collection,
+                               process_workers=args.process_workers,
+                               embed_workers=args.embed_workers,
+                               write_workers=args.write_workers,
+                               pdf_output_dir=args.pdf_output_dir,
+                               pdf_concurrency=args.pdf_concurrency,
+                               pdf_batch_size=args.pdf_batch_size,
+                               pdf_shard_pages=args.pdf_shard_pages)
+    for doc_status in batch_ingest.run(load_tasks(args.source, start_doc_id=args.start_doc_id)):
+        print(doc_status)
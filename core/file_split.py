@@ -1,11 +1,26 @@
-from typing import List, Callable
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import List, Callable, Iterator, Optional
 
-from langchain_community.document_loaders import TextLoader
 from langchain_core.documents import Document
-from langchain_text_splitters import MarkdownHeaderTextSplitter
-from transformers import AutoTokenizer
 
 from core.gilingual_text_splitter import BilingualTextSplitter
+from core.markdown_stream_reader import MarkdownSection, MarkdownStreamReader
+from core.token_offset_splitter import TokenOffsetTextSplitter
+from core.tool.token_length import TokenLengthCounter
+from core.tool.tokenizer_registry import get_tokenizer
+
+
+@dataclass
+class Chunk:
+    """切片记录：section_start_byte/section_end_byte为其所在标题段落（而非切片本身）在源文件中的字节范围"""
+    doc_id: Optional[int]
+    chunk_id: int
+    content: str
+    header_path: List[str] = field(default_factory=list)
+    section_start_byte: int = 0
+    section_end_byte: int = 0
+    metadata: dict = field(default_factory=dict)
 
 
 class FileSplit:
@@ -15,13 +30,29 @@ class FileSplit:
     HEADER_CONTENT_SEG = "："
     LATER_HEADER_PREFIX = "续"
 
-    def __init__(self, model_name: str="/home/zhangjiang/bge-m3-model",
+    # 长段落分割方式：递归正则分割 / 基于token偏移的单遍分割
+    SPLITTER_RECURSIVE = "recursive"
+    SPLITTER_TOKEN_OFFSET = "token_offset"
+
+    DEFAULT_MODEL_NAME = "/home/zhangjiang/bge-m3-model"
+
+    # 每次批量预计算token长度的段落数，流式读取时内存只保留这一批段落
+    WARM_BATCH_SECTIONS = 64
+
+    def __init__(self, model_name: str=DEFAULT_MODEL_NAME,
                  chunk_size: int=512,
                  chunk_overlap: int=0,
-                 header_level: int=4):
+                 header_level: int=4,
+                 splitter_mode: str=SPLITTER_RECURSIVE,
+                 use_mmap: bool=False,
+                 fast_tokenizer: bool=True):
+        if splitter_mode not in (self.SPLITTER_RECURSIVE, self.SPLITTER_TOKEN_OFFSET):
+            raise ValueError(f"unknown splitter_mode: {splitter_mode}")
+
         self.model_name = model_name
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.splitter_mode = splitter_mode
 
         self.headers_to_split_on = []
         for i in range(header_level):
@@ -30,8 +61,14 @@ class FileSplit:
             header_name = self.HEADER_VALUE_PREFIX + str(plus_one)
             self.headers_to_split_on.append((symbol_str, header_name))
 
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self._length_function = lambda x: len(tokenizer.encode(x))
+        self._reader = MarkdownStreamReader(headers_to_split_on=self.headers_to_split_on,
+                                            use_mmap=use_mmap)
+
+        # tokenizer在进程内共享，多个FileSplit实例不会重复加载
+        tokenizer = get_tokenizer(model_name, fast=fast_tokenizer)
+        self._tokenizer = tokenizer
+        # 带缓存的token长度计算，递归分割时重复片段不再重复编码
+        self._length_function = TokenLengthCounter(tokenizer)
 
 
     def _merge_headers(self, metadata: dict) -> str:
@@ -45,110 +82,89 @@ class FileSplit:
                     header_str += metadata[key]
         return header_str
 
-    def _split_by_headers(self, input_file):
-        # 1. 读取markdown文件
-        loader = TextLoader(input_file)
-        documents = loader.load()
-
-        # 2. 创建标题分割器(按标题层级分割)
-        # 这是核心：保留标题结构，将标题信息作为元数据
-        splitter = MarkdownHeaderTextSplitter(
-            headers_to_split_on=self.headers_to_split_on,
-            return_each_line=False,
-            strip_headers=True
-        )
-
-        # 3. 执行标题分割(按标题层级分割文档)
+    def _create_text_splitter(self, chunk_size: int):
+        if self.splitter_mode == self.SPLITTER_TOKEN_OFFSET:
+            return TokenOffsetTextSplitter(tokenizer=self._tokenizer,
+                                           chunk_size=chunk_size,
+                                           chunk_overlap=self.chunk_overlap)
+        return BilingualTextSplitter(chunk_size=chunk_size,
+                                     chunk_overlap=self.chunk_overlap,
+                                     length_function=self._length_function)
+
+    def _split_by_headers(self, input_file, initial_headers: Optional[dict] = None) -> Iterator[MarkdownSection]:
+        # 流式读取markdown文件并按标题层级分割，保留标题结构，将标题信息作为元数据
         # 例如：将"## 财务表现"作为边界，分割出财务表现部分
-        return splitter.split_text(documents[0].page_content)
-
-    def split_markdown(self, input_file) -> List[Document]:
+        sections = self._reader.read(input_file, initial_headers=initial_headers)
+
+        # 按批预计算标题的token长度，后续逐个判断时直接命中缓存
+        while True:
+            batch = list(islice(sections, self.WARM_BATCH_SECTIONS))
+            if not batch:
+                return
+            self._warm_lengths(batch)
+            yield from batch
+
+    def _warm_lengths(self, headers_chunks: List[MarkdownSection]) -> None:
+        """批量预计算标题的token长度；段落正文只用一次且不进缓存，不在此预计算"""
+        self._length_function.batch([self._merge_headers(chunk.metadata) for chunk in headers_chunks])
+
+    def _header_path(self, metadata: dict) -> List[str]:
+        return [metadata[name] for _, name in self.headers_to_split_on if name in metadata]
+
+    def iter_chunks(self, doc_id: Optional[int], path: str,
+                    initial_headers: Optional[dict] = None,
+                    start_chunk_id: int = 1) -> Iterator[Chunk]:
+        """
+        逐个产出切片，切分过程中不保留整篇文档的切片列表
+        :param initial_headers: 分片转换时上一分片末尾生效的标题，见shard_initial_headers
+        :param start_chunk_id: 起始chunk_id
+        """
+        chunk_id = start_chunk_id
         # 1. 先按标题分割
-        headers_chunks = self._split_by_headers(input_file)
-
-        # 2. 递归分割(处理过长的块)
-        # 如果某个块内容过长(超过chunk_size)，按内容递归分割
-        final_chunks = []
-        for chunk in headers_chunks:
-            # 如果块内容长度超过限制，则递归分割
-            header = self._merge_headers(chunk.metadata)
+        for section in self._split_by_headers(path, initial_headers=initial_headers):
+            header = self._merge_headers(section.metadata)
             header_len = self._length_function(header)
+            header_path = self._header_path(section.metadata)
 
-            if header_len + self._length_function(chunk.page_content) > self.chunk_size:
+            # 2. 递归分割(处理过长的块)
+            # 如果某个块内容过长(超过chunk_size)，按内容递归分割
+            if header_len + self._length_function(section.page_content) > self.chunk_size:
                 # 使用递归分割器处理长内容
-                recursive_splitter = BilingualTextSplitter(
-                    chunk_size=self.chunk_size - header_len,
-                    chunk_overlap=self.chunk_overlap,
-                    length_function=self._length_function
-                )
-                # 递归分割内容(保留标题元数据)
-                sub_chunks = recursive_splitter.split_text(chunk.page_content)
-
-                # 为每个子块添加相同的元数据(保留标题结构)
-                first_sub_chunk = True
-                for sub_chunk in sub_chunks:
-                    if first_sub_chunk:
-                        first_sub_chunk = False
-                        sub_chunk_content = header + self.HEADER_CONTENT_SEG + sub_chunk
-                    else:
-                        sub_chunk_content = (self.LATER_HEADER_PREFIX + header +
-                                             self.HEADER_CONTENT_SEG + sub_chunk)
-                    # 保留父级标题信息(避免结构断裂)
-                    new_chunk = Document(
-                        page_content=sub_chunk_content,
-                        metadata=chunk.metadata.copy()  # 重要：复制metadata，避免引用问题
-                    )
-                    final_chunks.append(new_chunk)
+                recursive_splitter = self._create_text_splitter(self.chunk_size - header_len)
+                sub_chunks = recursive_splitter.split_text(section.page_content)
             else:
-                new_chunk = Document(
-                    page_content=header + self.HEADER_CONTENT_SEG + chunk.page_content,
-                    metadata=chunk.metadata
-                )
-                final_chunks.append(new_chunk)
-        return final_chunks
+                sub_chunks = [section.page_content]
+
+            # 为每个子块添加相同的标题前缀(保留标题结构，避免结构断裂)
+            # 接续上一分片的段落，第一个子块也按"续"处理
+            for i, sub_chunk in enumerate(sub_chunks):
+                prefix = header if i == 0 and not section.continued else self.LATER_HEADER_PREFIX + header
+                yield Chunk(doc_id=doc_id,
+                            chunk_id=chunk_id,
+                            content=prefix + self.HEADER_CONTENT_SEG + sub_chunk,
+                            header_path=header_path,
+                            section_start_byte=section.start_byte,
+                            section_end_byte=section.end_byte,
+                            metadata=section.metadata.copy())  # 重要：复制metadata，避免引用问题
+                chunk_id = chunk_id + 1
+
+    def shard_initial_headers(self, paths: List[str]) -> List[dict]:
+        """按顺序扫描各分片的标题，返回每个分片开头处生效的标题（只扫描标题，开销远小于切分）"""
+        initial_headers = []
+        headers = {}
+        for path in paths:
+            initial_headers.append(headers)
+            headers = self._reader.scan_headers(path, initial_headers=headers)
+        return initial_headers
 
-    def split_markdown_callback(self, doc_id: int, doc_name: str, fn: Callable) -> None:
-        # 1. 先按标题分割
-        headers_chunks = self._split_by_headers(doc_name)
-
-        # 2. 递归分割(处理过长的块)
-        # 如果某个块内容过长(超过chunk_size)，按内容递归分割
-        chunk_id = 1
-        for chunk in headers_chunks:
-            # 如果块内容长度超过限制，则递归分割
-            header = self._merge_headers(chunk.metadata)
-            header_len = self._length_function(header)
+    def split_markdown(self, input_file) -> List[Document]:
+        return [Document(page_content=chunk.content, metadata=chunk.metadata)
+                for chunk in self.iter_chunks(doc_id=None, path=input_file)]
 
-            if header_len + self._length_function(chunk.page_content) > self.chunk_size:
-                # 使用递归分割器处理长内容
-                recursive_splitter = BilingualTextSplitter(
-                    chunk_size=self.chunk_size - header_len,
-                    chunk_overlap=self.chunk_overlap,
-                    length_function=self._length_function
-                )
-                # 递归分割内容(保留标题元数据)
-                sub_chunks = recursive_splitter.split_text(chunk.page_content)
-
-                # 为每个子块添加相同的元数据(保留标题结构)
-                first_sub_chunk = True
-                for sub_chunk in sub_chunks:
-                    if first_sub_chunk:
-                        first_sub_chunk = False
-                        sub_chunk_content = header + self.HEADER_CONTENT_SEG + sub_chunk
-                    else:
-                        sub_chunk_content = (self.LATER_HEADER_PREFIX + header +
-                                             self.HEADER_CONTENT_SEG + sub_chunk)
-                    # 保留父级标题信息(避免结构断裂)
-                    fn(doc_id=doc_id, 
-                       doc_name=doc_name,
-                       chunk_id=chunk_id, 
-                       content=sub_chunk_content, 
-                       metadata=chunk.metadata)
-                    chunk_id = chunk_id + 1
-            else:
-                fn(doc_id=doc_id,
-                   doc_name=doc_name,
-                   chunk_id=chunk_id,
-                   content=header + self.HEADER_CONTENT_SEG + chunk.page_content,
-                   metadata=chunk.metadata)
-                chunk_id = chunk_id + 1
\ No newline at end of file
+    def split_markdown_callback(self, doc_id: int, doc_name: str, fn: Callable) -> None:
+        for chunk in self.iter_chunks(doc_id=doc_id, path=doc_name):
+            fn(doc_id=doc_id,
+               doc_name=doc_name,
+               chunk_id=chunk.chunk_id,
+               content=chunk.content,
+               metadata=chunk.metadata)
@@ -101,11 +101,14 @@ class BilingualTextSplitter(RecursiveCharacterTextSplitter):
     #         ""
     #     ]
 
-    def split_text(self, text: str) -> List[str]:
-        """重写分割方法，处理中英文混合文本"""
-        # 预处理：统一一些空白字符
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """预处理：统一一些空白字符"""
         text = re.sub(r'\r\n', '\n', text)  # Windows换行转Unix
         text = re.sub(r'\r', '\n', text)  # Mac换行转Unix
         text = re.sub(r'\u3000', ' ', text)  # 全角空格转半角
+        return text
 
-        return super().split_text(text)
\ No newline at end of file
+    def split_text(self, text: str) -> List[str]:
+        """重写分割方法，处理中英文混合文本"""
+        return super().split_text(self.normalize_text(text))
\ No newline at end of file
@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+from typing import Dict
+
+from config.logging_config import logger
+from core.file_split import FileSplit
+from core.ingest_pipeline import IngestPipeline
+from core.tool.hash import text_to_sha256
+from core.tool.time import get_current_timestamp_ms
+from core.vector.milvus_write import MilvusWrite
+
+
+class MilvusChunkIndex:
+    """直接查询Milvus获取文档已入库的切片，数据以Milvus为准"""
+
+    def __init__(self, milvus_write: MilvusWrite, collection_name: str):
+        self._milvus_write = milvus_write
+        self._collection_name = collection_name
+
+    def load(self, doc_id: int) -> Dict[str, int]:
+        """返回 主键id -> chunk_id"""
+        return self._milvus_write.query_chunk_ids(self._collection_name, doc_id)
+
+    def save(self, doc_id: int, chunk_ids: Dict[str, int]) -> None:
+        """无需保存：写入与删除已直接作用于Milvus，下次load时查询到的即为最新状态"""
+
+
+class ManifestChunkIndex:
+    """本地清单记录每个文档已入库的切片（每个文档一个json文件），避免每次全量查询Milvus"""
+
+    def __init__(self, manifest_dir: str, collection_name: str):
+        self._manifest_dir = os.path.join(manifest_dir, collection_name)
+        os.makedirs(self._manifest_dir, exist_ok=True)
+
+    def _manifest_path(self, doc_id: int) -> str:
+        return os.path.join(self._manifest_dir, f"{int(doc_id)}.json")
+
+    def load(self, doc_id: int) -> Dict[str, int]:
+        path = self._manifest_path(doc_id)
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, doc_id: int, chunk_ids: Dict[str, int]) -> None:
+        # 先写临时文件再替换，避免中断时留下损坏的清单
+        path = self._manifest_path(doc_id)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(chunk_ids, f)
+        os.replace(tmp_path, path)
+
+
+class IncrementalIngest:
+    """
+    增量入库：切片主键为文本的SHA-256，对比新旧切片集合
+    - 新增切片：向量化并写入
+    - 消失的切片：从Milvus删除
+    - 内容未变但chunk_id变化的切片：只做部分更新chunk_id，不重新向量化
+    """
+
+    def __init__(self,
+                 milvus_write: MilvusWrite,
+                 collection_name: str,
+                 file_split: FileSplit,
+                 chunk_index=None):
+        self._milvus_write = milvus_write
+        self._collection_name = collection_name
+        self._file_split = file_split
+        self._chunk_index = chunk_index or MilvusChunkIndex(milvus_write, collection_name)
+
+    def _split(self, doc_id: int, doc_name: str) -> Dict[str, tuple]:
+        chunks: Dict[str, tuple] = {}
+        for chunk in self._file_split.iter_chunks(doc_id=doc_id, path=doc_name):
+            # 同一文档内重复文本主键相同，保留第一次出现的位置
+            chunks.setdefault(text_to_sha256(chunk.content), (chunk.chunk_id, chunk.content))
+        return chunks
+
+    def ingest(self, doc_id: int, doc_name: str) -> Dict[str, int]:
+        new_chunks = self._split(doc_id, doc_name)
+        old_chunk_ids = self._chunk_index.load(doc_id)
+
+        added = [row_id for row_id in new_chunks if row_id not in old_chunk_ids]
+        removed = [row_id for row_id in old_chunk_ids if row_id not in new_chunks]
+        moved = [row_id for row_id in new_chunks
+                 if row_id in old_chunk_ids and old_chunk_ids[row_id] != new_chunks[row_id][0]]
+
+        failed_ids = set()
+        if added:
+            pipeline = IngestPipeline(milvus_write=self._milvus_write,
+                                      collection_name=self._collection_name)
+            with pipeline:
+                for row_id in added:
+                    position, content = new_chunks[row_id]
+                    pipeline.submit(doc_id=doc_id, doc_name=doc_name, chunk_id=position, content=content)
+            failed_positions = {failure["chunk_id"] for failure in pipeline.get_failures()}
+            failed_ids = {row_id for row_id in added if new_chunks[row_id][0] in failed_positions}
+
+        if moved:
+            current_timestamp_ms = get_current_timestamp_ms()
+            self._milvus_write.upsert(self._collection_name,
+                                      [{"id": row_id,
+                                        "chunk_id": new_chunks[row_id][0],
+                                        "update_time": current_timestamp_ms} for row_id in moved],
+                                      partial_update=True)
+
+        if removed:
+            self._milvus_write.delete(self._collection_name, removed)
+
+        # 写入失败的切片不记入清单，下次增量时会重新写入
+        self._chunk_index.save(doc_id, {row_id: position for row_id, (position, _) in new_chunks.items()
+                                        if row_id not in failed_ids})
+
+        stats = {
+            "total": len(new_chunks),
+            "added": len(added) - len(failed_ids),
+            "removed": len(removed),
+            "moved": len(moved),
+            "unchanged": len(new_chunks) - len(added) - len(moved),
+            "failed": len(failed_ids)
+        }
+        logger.info(f"incremental ingest | doc_id={doc_id} | doc_name={doc_name} | {stats}")
+        return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="增量入库单个Markdown文档")
+    parser.add_argument("doc_id", type=int)
+    parser.add_argument("doc_name")
+    parser.add_argument("--collection", default="cn_1")
+    parser.add_argument("--manifest-dir", default=None, help="使用本地清单代替查询Milvus")
+    args = parser.parse_args()
+
+    milvus_write = MilvusWrite()
+    chunk_index = None
+    if args.manifest_dir:
+        chunk_index = ManifestChunkIndex(args.manifest_dir, args.collection)
+    incremental_ingest = IncrementalIngest(milvus_write=milvus_write,
+                                           collection_name=args.collection,
+                                           file_split=FileSplit(),
+                                           chunk_index=chunk_index)
+    print(incremental_ingest.ingest(args.doc_id, args.doc_name))
@@ -0,0 +1,257 @@
+import threading
+import time
+from queue import Queue, Empty
+from typing import Any, Dict, List, Optional
+
+from config.logging_config import logger
+from core.file_split import FileSplit
+from core.vector.milvus_buffered_write import MilvusBufferedWrite
+from core.vector.milvus_write import MilvusWrite
+from core.vector.row_batch import RowBatch
+
+
+class IngestPipeline:
+    """
+    分阶段入库流水线：切分 -> 批量向量化 -> 批量写入
+    阶段之间使用有界队列连接，下游变慢时上游put阻塞，背压逐级向上传递
+    向量化阶段产出按列存放的RowBatch，写入阶段交给MilvusBufferedWrite按条数/字节数/等待时长合并写入，
+    close时等待所有写入完成，写入失败的行记入get_failures()
+    """
+    _STOP = object()
+
+    def __init__(self,
+                 milvus_write: MilvusWrite,
+                 collection_name: str,
+                 file_split: Optional[FileSplit] = None,
+                 split_workers: int = 1,
+                 embed_workers: int = 2,
+                 write_workers: int = 2,
+                 embed_batch_size: int = 32,
+                 write_batch_size: int = 64,
+                 queue_size: int = 256,
+                 linger: float = 0.05):
+        if min(split_workers, embed_workers, write_workers) <= 0:
+            raise ValueError("worker count must be > 0")
+        if embed_batch_size <= 0 or write_batch_size <= 0:
+            raise ValueError("batch size must be > 0")
+
+        self._milvus_write = milvus_write
+        self._collection_name = collection_name
+        self._file_split = file_split
+        self._split_workers = split_workers
+        self._embed_workers = embed_workers
+        self._write_workers = write_workers
+        self._embed_batch_size = embed_batch_size
+        self._write_batch_size = write_batch_size
+        self._linger = linger
+
+        self._doc_queue = Queue(maxsize=queue_size)
+        self._chunk_queue = Queue(maxsize=queue_size)
+        self._row_queue = Queue(maxsize=queue_size)
+
+        self._lock = threading.Lock()
+        self._threads: Dict[str, List[threading.Thread]] = {}
+        self._started = False
+        self._closed = False
+
+        # 指标统计（线程安全）
+        self._buffered_write: Optional[MilvusBufferedWrite] = None
+        self._stats = {
+            "docs": 0,
+            "chunks": 0,
+            "embedded": 0,
+            "written": 0,
+            "failed": 0
+        }
+        self._failures: List[dict] = []
+        # 已交给缓冲写入的行数，close时减去失败行数即为写入成功的行数
+        self._queued_rows = 0
+
+    def start(self) -> 'IngestPipeline':
+        if self._started:
+            return self
+        self._started = True
+        self._buffered_write = MilvusBufferedWrite(milvus_write=self._milvus_write,
+                                                   max_rows=self._write_batch_size)
+        # 未配置FileSplit时由调用方直接提交切片，无需切分线程
+        split_workers = self._split_workers if self._file_split is not None else 0
+        self._threads["split"] = self._start_workers("split", split_workers, self._split_loop)
+        self._threads["embed"] = self._start_workers("embed", self._embed_workers, self._embed_loop)
+        self._threads["write"] = self._start_workers("write", self._write_workers, self._write_loop)
+        logger.info(
+            f"IngestPipeline started | split={split_workers} | embed={self._embed_workers} | "
+            f"write={self._write_workers} | collection={self._collection_name}"
+        )
+        return self
+
+    @staticmethod
+    def _start_workers(stage: str, count: int, target) -> List[threading.Thread]:
+        threads = []
+        for i in range(count):
+            t = threading.Thread(target=target, name=f"Ingest-{stage}-{i}", daemon=True)
+            t.start()
+            threads.append(t)
+        return threads
+
+    def submit_document(self, doc_id: int, doc_name: str) -> None:
+        """提交整篇文档，由切分阶段的工作线程完成切分"""
+        if self._file_split is None:
+            raise RuntimeError("IngestPipeline has no FileSplit, use submit() to feed chunks")
+        self._check_running()
+        self._doc_queue.put((doc_id, doc_name))
+
+    def submit(self, doc_id: int, doc_name: str, chunk_id: int, content: str, metadata: dict = None) -> None:
+        """提交单个切片，签名与FileSplit.split_markdown_callback的回调一致；队列满时阻塞"""
+        self._check_running()
+        self._chunk_queue.put((doc_id, doc_name, chunk_id, content))
+        with self._lock:
+            self._stats["chunks"] += 1
+
+    def _check_running(self) -> None:
+        if self._closed:
+            raise RuntimeError("IngestPipeline is closed, cannot submit new tasks")
+        if not self._started:
+            self.start()
+
+    def close(self) -> Dict[str, int]:
+        """按阶段顺序关闭：上游全部结束后再通知下游，保证队列中的数据全部处理完"""
+        if self._closed or not self._started:
+            self._closed = True
+            return self.get_stats()
+        self._closed = True
+
+        for stage, stage_queue in (("split", self._doc_queue),
+                                   ("embed", self._chunk_queue),
+                                   ("write", self._row_queue)):
+            threads = self._threads[stage]
+            for _ in threads:
+                stage_queue.put(self._STOP)
+            for t in threads:
+                t.join()
+
+        # 刷新缓冲区并等待在途写入完成，写入结果在此统计
+        failed_rows = self._buffered_write.close()
+        with self._lock:
+            self._stats["written"] += self._queued_rows - len(failed_rows)
+        if failed_rows:
+            self._record_failure("write", [(row["doc_id"], None, row["chunk_id"]) for row in failed_rows],
+                                 Exception("upsert failed"))
+
+        stats = self.get_stats()
+        logger.info(f"IngestPipeline closed | {stats}")
+        return stats
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return self._stats.copy()
+
+    def get_failures(self) -> List[dict]:
+        """返回处理失败的切片（doc_id、chunk_id、所在阶段、异常信息）"""
+        with self._lock:
+            return list(self._failures)
+
+    def _record_failure(self, stage: str, items: List[Any], error: Exception) -> None:
+        with self._lock:
+            self._stats["failed"] += len(items)
+            for item in items:
+                self._failures.append({
+                    "stage": stage,
+                    "doc_id": item[0],
+                    "chunk_id": item[2],
+                    "error": str(error)
+                })
+
+    def _take_batch(self, source: Queue, max_items: int):
+        """
+        从队列中取一批数据：阻塞等待第一条，之后在linger时间内尽量凑满一批
+        :return: (batch, stopped)
+        """
+        first = source.get()
+        if first is self._STOP:
+            return [], True
+
+        batch = [first]
+        deadline = time.monotonic() + self._linger
+        while len(batch) < max_items:
+            remaining = deadline - time.monotonic()
+            try:
+                item = source.get(timeout=remaining) if remaining > 0 else source.get_nowait()
+            except Empty:
+                break
+            if item is self._STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _split_loop(self) -> None:
+        while True:
+            item = self._doc_queue.get()
+            if item is self._STOP:
+                return
+            doc_id, doc_name = item
+            try:
+                for chunk in self._file_split.iter_chunks(doc_id=doc_id, path=doc_name):
+                    self._submit_split_chunk(doc_id=doc_id,
+                                             doc_name=doc_name,
+                                             chunk_id=chunk.chunk_id,
+                                             content=chunk.content)
+                with self._lock:
+                    self._stats["docs"] += 1
+            except Exception as e:
+                logger.exception(f"split document failed | doc_id={doc_id} | doc_name={doc_name}")
+                self._record_failure("split", [(doc_id, doc_name, None)], e)
+
+    def _submit_split_chunk(self, doc_id: int, doc_name: str, chunk_id: int, content: str, metadata: dict = None) -> None:
+        # 切分阶段内部回调，关闭过程中仍需把剩余切片送入下游
+        self._chunk_queue.put((doc_id, doc_name, chunk_id, content))
+        with self._lock:
+            self._stats["chunks"] += 1
+
+    def _embed_loop(self) -> None:
+        while True:
+            batch, stopped = self._take_batch(self._chunk_queue, self._embed_batch_size)
+            if batch:
+                self._embed_batch(batch)
+            if stopped:
+                return
+
+    def _embed_batch(self, batch: List[tuple]) -> None:
+        # 同一批次可能跨文档，按文档分组生成数据
+        groups: Dict[tuple, List[tuple]] = {}
+        for item in batch:
+            groups.setdefault((item[0], item[1]), []).append(item)
+
+        for (doc_id, doc_name), items in groups.items():
+            try:
+                rows = self._milvus_write.gene_row_batch(doc_id=doc_id,
+                                                         doc_name=doc_name,
+                                                         texts=[item[3] for item in items],
+                                                         chunk_ids=[item[2] for item in items])
+            except Exception as e:
+                logger.exception(f"embedding batch failed | doc_id={doc_id} | size={len(items)}")
+                self._record_failure("embed", items, e)
+                continue
+
+            with self._lock:
+                self._stats["embedded"] += len(rows)
+            self._row_queue.put(rows)
+
+    def _write_loop(self) -> None:
+        while True:
+            rows = self._row_queue.get()
+            if rows is self._STOP:
+                return
+            self._write_rows(rows)
+
+    def _write_rows(self, rows: RowBatch) -> None:
+        # 在途写入已满时阻塞，背压传递到向量化阶段；提交失败的行由缓冲区在close时返回
+        self._buffered_write.write(self._collection_name, rows)
+        with self._lock:
+            self._queued_rows += len(rows)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
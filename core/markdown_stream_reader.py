@@ -0,0 +1,199 @@
+import mmap
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+@dataclass
+class MarkdownSection:
+    """
+    标题分割后的段落：page_content/metadata与langchain Document一致，另带文件中的字节范围
+    continued为True表示该段落接续上一分片末尾的内容（位于本文件第一个标题之前）
+    """
+    page_content: str
+    metadata: Dict[str, str] = field(default_factory=dict)
+    start_byte: int = 0
+    end_byte: int = 0
+    continued: bool = False
+
+
+class MarkdownStreamReader:
+    """
+    流式按标题分割Markdown文件
+    - 逐行读取（可选mmap），边读边维护标题栈，每得到一个完整段落就立即产出
+    - 内存峰值取决于最大的段落，而不是整个文件
+    - 分割结果与 MarkdownHeaderTextSplitter(return_each_line=False, strip_headers=True) 一致
+    """
+    PARAGRAPH_SEG = "  \n"
+    # 与文本模式的通用换行一致：单独的\r也视为换行
+    _LINE_PATTERN = re.compile(rb"[^\r\n]*(?:\r\n|\r|\n)|[^\r\n]+")
+
+    def __init__(self, headers_to_split_on: List[Tuple[str, str]],
+                 encoding: str = "utf-8",
+                 use_mmap: bool = False):
+        # 长标记优先匹配，避免"##"被识别为"#"
+        self.headers_to_split_on = sorted(headers_to_split_on, key=lambda split: len(split[0]), reverse=True)
+        self.encoding = encoding
+        self.use_mmap = use_mmap
+
+    def _iter_lines(self, path: str) -> Iterator[Tuple[bytes, int]]:
+        """逐行读取文件，返回(行内容, 行起始字节偏移)"""
+        with open(path, "rb") as f:
+            if self.use_mmap:
+                try:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:
+                    # 空文件无法mmap
+                    return
+                with mm:
+                    offset = 0
+                    while True:
+                        line = mm.readline()
+                        if not line:
+                            return
+                        yield from self._split_cr(line, offset)
+                        offset += len(line)
+            else:
+                offset = 0
+                for line in f:
+                    yield from self._split_cr(line, offset)
+                    offset += len(line)
+
+    def _split_cr(self, line: bytes, offset: int) -> Iterator[Tuple[bytes, int]]:
+        body = line[:-2] if line.endswith(b"\r\n") else line[:-1]
+        if b"\r" not in body:
+            yield line, offset
+            return
+        for m in self._LINE_PATTERN.finditer(line):
+            yield m.group(), offset + m.start()
+
+    def _match_header(self, stripped_line: str):
+        for sep, name in self.headers_to_split_on:
+            if stripped_line.startswith(sep) and (
+                    len(stripped_line) == len(sep) or stripped_line[len(sep)] == " "):
+                return sep, name
+        return None
+
+    def _iter_events(self, path: str) -> Iterator[Tuple[str, bytes, int, bool]]:
+        """逐行产出(清洗后的行, 原始行, 字节偏移, 是否在代码块内)"""
+        in_code_block = False
+        opening_fence = ""
+        raw_line = b""
+        offset = 0
+        for raw_line, offset in self._iter_lines(path):
+            line = raw_line.decode(self.encoding, errors="replace").strip()
+            # 去除不可见字符
+            line = "".join(filter(str.isprintable, line))
+
+            if not in_code_block:
+                # 排除行内代码
+                if line.startswith("```") and line.count("```") == 1:
+                    in_code_block = True
+                    opening_fence = "```"
+                elif line.startswith("~~~"):
+                    in_code_block = True
+                    opening_fence = "~~~"
+            elif line.startswith(opening_fence):
+                in_code_block = False
+                opening_fence = ""
+            yield line, raw_line, offset, in_code_block
+
+        # 文件以换行结尾时，按行切分会多出一个空行，在代码块内需保留
+        if in_code_block and raw_line.endswith((b"\n", b"\r")):
+            yield "", b"", offset + len(raw_line), True
+
+    def _init_header_stack(self, initial_headers: Optional[Dict[str, str]]) -> List[Tuple[int, str]]:
+        levels = {name: sep.count("#") for sep, name in self.headers_to_split_on}
+        return sorted(((levels[name], name) for name in (initial_headers or {}) if name in levels))
+
+    @staticmethod
+    def _push_header(header_stack: List[Tuple[int, str]], headers: Dict[str, str],
+                     sep: str, name: str, line: str) -> None:
+        level = sep.count("#")
+        while header_stack and header_stack[-1][0] >= level:
+            _, popped_name = header_stack.pop()
+            headers.pop(popped_name, None)
+        header_stack.append((level, name))
+        headers[name] = line[len(sep):].strip()
+
+    def scan_headers(self, path: str, initial_headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """只扫描标题，返回文件末尾处生效的标题（作为下一个分片的initial_headers）"""
+        header_stack = self._init_header_stack(initial_headers)
+        headers = {name: initial_headers[name] for _, name in header_stack}
+        for line, _, _, in_code_block in self._iter_events(path):
+            if in_code_block:
+                continue
+            matched = self._match_header(line)
+            if matched is not None:
+                self._push_header(header_stack, headers, matched[0], matched[1], line)
+        return headers
+
+    def read(self, path: str, initial_headers: Optional[Dict[str, str]] = None) -> Iterator[MarkdownSection]:
+        """
+        :param initial_headers: 文件开头处生效的标题（分片转换时为上一分片末尾的标题），
+            文件中第一个标题之前的内容属于这些标题，对应的section标记为continued
+        """
+        header_stack = self._init_header_stack(initial_headers)
+        headers = {name: initial_headers[name] for _, name in header_stack}
+        seen_header = False
+
+        # 当前段落（空行分隔的连续行）
+        block_lines: List[str] = []
+        block_start = block_end = 0
+        block_continued = False
+        # 当前待产出的section：metadata相同的连续段落合并
+        section = None
+
+        def flush_block():
+            nonlocal section
+            content = "\n".join(block_lines)
+            block_lines.clear()
+            if section is not None and section.metadata == block_metadata:
+                section.page_content += self.PARAGRAPH_SEG + content
+                section.end_byte = block_end
+                return None
+            finished = section
+            section = MarkdownSection(page_content=content,
+                                      metadata=block_metadata.copy(),
+                                      start_byte=block_start,
+                                      end_byte=block_end,
+                                      continued=block_continued)
+            return finished
+
+        block_metadata: Dict[str, str] = headers.copy()
+        for line, raw_line, offset, in_code_block in self._iter_events(path):
+            if in_code_block:
+                # 代码块内的空行、标题符号都作为普通内容
+                if not block_lines:
+                    block_start = offset
+                    block_continued = bool(header_stack) and not seen_header
+                block_lines.append(line)
+                block_end = offset + len(raw_line)
+                continue
+
+            matched = self._match_header(line)
+            if matched is not None:
+                seen_header = True
+                self._push_header(header_stack, headers, matched[0], matched[1], line)
+                if block_lines:
+                    finished = flush_block()
+                    if finished is not None:
+                        yield finished
+            elif line:
+                if not block_lines:
+                    block_start = offset
+                    block_continued = bool(header_stack) and not seen_header
+                block_lines.append(line)
+                block_end = offset + len(raw_line)
+            elif block_lines:
+                finished = flush_block()
+                if finished is not None:
+                    yield finished
+            block_metadata = headers.copy()
+
+        if block_lines:
+            finished = flush_block()
+            if finished is not None:
+                yield finished
+        if section is not None:
+            yield section
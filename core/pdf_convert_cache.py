@@ -0,0 +1,128 @@
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from config.logging_config import logger
+
+
+class PdfConvertCache:
+    """
+    PDF转换结果缓存，key为 SHA-256(转换程序版本 + PDF内容哈希)，由调用方计算
+    - 索引存于SQLite，转换结果保留在以key命名的输出目录中
+    - 输出目录总大小超过max_bytes时按最近访问时间淘汰（删除对应目录）
+    """
+    MAX_BYTES = 10 * 1024 * 1024 * 1024  # 10GB
+    # 淘汰到上限的该比例以下，避免每次写入都触发淘汰
+    EVICT_RATIO = 0.9
+
+    def __init__(self, db_path: str, max_bytes: int = MAX_BYTES):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be > 0")
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS convert_cache ("
+            "key TEXT PRIMARY KEY, "
+            "output_dir TEXT NOT NULL, "
+            "markdown_path TEXT NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "last_access INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_convert_cache_last_access ON convert_cache(last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM convert_cache").fetchone()[0]
+
+        # 指标统计
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0
+        }
+
+    @staticmethod
+    def _dir_size(path: str) -> int:
+        size = 0
+        for dir_path, _, file_names in os.walk(path):
+            for file_name in file_names:
+                try:
+                    size += os.path.getsize(os.path.join(dir_path, file_name))
+                except OSError:
+                    pass
+        return size
+
+    def get(self, key: str) -> Optional[str]:
+        """返回缓存的Markdown路径，未命中或结果文件已不存在时返回None"""
+        with self._lock:
+            row = self._conn.execute("SELECT markdown_path, size FROM convert_cache WHERE key=?",
+                                     (key,)).fetchone()
+            if row and os.path.isfile(row[0]):
+                self._conn.execute("UPDATE convert_cache SET last_access=? WHERE key=?",
+                                   (int(time.time()), key))
+                self._conn.commit()
+                self._stats["hits"] += 1
+                return row[0]
+            if row:
+                # 结果文件被外部删除，清理失效记录
+                self._conn.execute("DELETE FROM convert_cache WHERE key=?", (key,))
+                self._conn.commit()
+                self._total_bytes -= row[1]
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, output_dir: str, markdown_path: str) -> None:
+        size = self._dir_size(output_dir)
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM convert_cache WHERE key=?", (key,)).fetchone()
+            if old:
+                self._total_bytes -= old[0]
+            self._conn.execute("INSERT OR REPLACE INTO convert_cache VALUES (?, ?, ?, ?, ?)",
+                               (key, output_dir, markdown_path, size, int(time.time())))
+            self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict(keep_key=key)
+            self._conn.commit()
+
+    def _evict(self, keep_key: str) -> None:
+        """按最近访问时间淘汰，直到总大小低于上限的EVICT_RATIO；刚写入的结果不淘汰"""
+        target = int(self.max_bytes * self.EVICT_RATIO)
+        evicted = 0
+        rows = self._conn.execute(
+            "SELECT key, output_dir, size FROM convert_cache WHERE key!=? ORDER BY last_access",
+            (keep_key,))
+        evict_rows = []
+        for key, output_dir, size in rows:
+            if self._total_bytes <= target:
+                break
+            evict_rows.append((key, output_dir))
+            self._total_bytes -= size
+        for key, output_dir in evict_rows:
+            self._conn.execute("DELETE FROM convert_cache WHERE key=?", (key,))
+            shutil.rmtree(output_dir, ignore_errors=True)
+            evicted += 1
+        self._stats["evictions"] += evicted
+        logger.info(f"pdf convert cache evicted {evicted} entries | total_bytes={self._total_bytes}")
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = self._stats.copy()
+            stats["bytes"] = self._total_bytes
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / total if total else 0.0
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
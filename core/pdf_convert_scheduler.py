@@ -0,0 +1,249 @@
+import importlib.util
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from config.logging_config import logger
+from config.service_config import config
+from core.pdf_convert_cache import PdfConvertCache
+from core.pdf_to_markdown import build_mineru_command, count_pdf_pages, mineru_output_path, run_converter
+from core.tool.hash import file_to_sha256, text_to_sha256
+
+
+@dataclass
+class ConvertResult:
+    """markdown_paths为按页码顺序排列的各分片Markdown，未分片时只有一个，与markdown_path相同"""
+    pdf_path: str
+    success: bool
+    markdown_path: Optional[str] = None
+    error: Optional[str] = None
+    duration: float = 0.0
+    cached: bool = False
+    markdown_paths: List[str] = field(default_factory=list)
+
+
+class PdfConvertScheduler:
+    """
+    PDF转Markdown调度器
+    - 以 SHA-256(转换程序版本 + PDF内容哈希) 作为key，结果输出到 <output_dir>/<key>/ 下，
+      同名不同内容的PDF互不覆盖，内容相同的PDF只转换一次
+    - 命中转换缓存的PDF直接返回结果，不再调用mineru
+    - 多个PDF合并为一次mineru调用（输入为目录），模型只加载一次，摊薄进程启动与模型加载开销
+    - 多个批次在max_concurrency限制下并发执行，每个批次完成即产出结果，下游可边转换边切分
+    - 超时按文件数累计；批次失败或超时时，已产出的文件照常返回，其余文件逐个重试，单个坏文件不影响同批其他文件
+    - 页数超过shard_pages的PDF按页码范围拆分为多个分片并行转换（需要pypdf获取页数），
+      全部分片完成后按顺序返回各分片的Markdown
+    """
+
+    def __init__(self,
+                 output_dir: str,
+                 max_concurrency: int = 1,
+                 batch_size: int = 4,
+                 timeout_per_file: float = 600.0,
+                 gpu_memory_utilization: float = 0.2,
+                 conda_env: str = "mineru-env",
+                 command: Optional[List[str]] = None,
+                 converter_version: Optional[str] = None,
+                 cache: Optional[PdfConvertCache] = None,
+                 shard_pages: int = 0,
+                 page_counter: Callable[[str], Optional[int]] = count_pdf_pages):
+        if max_concurrency <= 0:
+            raise ValueError("max_concurrency must be > 0")
+        if batch_size <= 0:
+            raise ValueError("batch_size must be > 0")
+
+        self.output_dir = os.path.abspath(output_dir)
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.timeout_per_file = timeout_per_file
+        self.gpu_memory_utilization = gpu_memory_utilization
+        self.conda_env = conda_env
+        self.command = command
+        self.converter_version = converter_version or config.converter_version
+        if cache is None and config.pdf_convert_cache_max_mb > 0:
+            cache = PdfConvertCache(db_path=os.path.join(self.output_dir, "convert_cache.db"),
+                                    max_bytes=config.pdf_convert_cache_max_mb * 1024 * 1024)
+        self.cache = cache
+        self.shard_pages = shard_pages
+        self.page_counter = page_counter
+        if shard_pages > 0 and page_counter is count_pdf_pages and importlib.util.find_spec("pypdf") is None:
+            logger.warning("pypdf is not installed, PDF page count is unavailable and sharding is disabled; "
+                           "install pypdf to enable shard_pages")
+
+    def _key(self, pdf_path: str) -> str:
+        return text_to_sha256(self.converter_version + "\n" + file_to_sha256(pdf_path))
+
+    def _plan_shards(self, key: str, pdf_path: str) -> List[tuple]:
+        """返回转换单元列表[(单元key, pdf路径, 页码范围)]，未分片时页码范围为None"""
+        if self.shard_pages > 0:
+            pages = self.page_counter(pdf_path)
+            if pages is None:
+                logger.warning(f"page count unavailable, convert without sharding | pdf={pdf_path}")
+            elif pages > self.shard_pages:
+                return [(text_to_sha256(f"{key}\n{start}-{min(start + self.shard_pages, pages) - 1}"),
+                         pdf_path,
+                         (start, min(start + self.shard_pages, pages) - 1))
+                        for start in range(0, pages, self.shard_pages)]
+        return [(key, pdf_path, None)]
+
+    def _markdown_path(self, key: str) -> str:
+        return str(mineru_output_path(self.output_dir, key))
+
+    def _run(self, input_path: str, num_files: int, page_range: Optional[Tuple[int, int]] = None) -> Optional[str]:
+        """执行一次转换，成功返回None，失败返回错误信息"""
+        cmd = build_mineru_command(input_path=input_path,
+                                   output_dir=self.output_dir,
+                                   gpu_memory_utilization=self.gpu_memory_utilization,
+                                   conda_env=self.conda_env,
+                                   command=self.command,
+                                   start_page=page_range[0] if page_range else None,
+                                   end_page=page_range[1] if page_range else None)
+        try:
+            returncode, stderr = run_converter(cmd, timeout=self.timeout_per_file * num_files)
+        except subprocess.TimeoutExpired:
+            return f"转换超时（{self.timeout_per_file * num_files:.0f}s）"
+        except FileNotFoundError:
+            return f"错误：未找到 '{cmd[0]}' 命令"
+        if returncode != 0:
+            return f"转换失败:\n{stderr}"
+        return None
+
+    def _run_linked(self, batch: List[tuple]) -> Optional[str]:
+        """
+        以 <key>.pdf 为文件名软链接到临时目录后转换，mineru按文件名生成输出目录，
+        结果即落在 <output_dir>/<key>/ 下
+        """
+        link_dir = tempfile.mkdtemp(prefix=".batch_", dir=self.output_dir)
+        try:
+            for key, pdf_path, _ in batch:
+                link_path = os.path.join(link_dir, key + ".pdf")
+                try:
+                    os.symlink(pdf_path, link_path)
+                except OSError:
+                    shutil.copyfile(pdf_path, link_path)
+            if len(batch) == 1:
+                return self._run(link_path, 1, page_range=batch[0][2])
+            return self._run(link_dir, len(batch))
+        finally:
+            shutil.rmtree(link_dir, ignore_errors=True)
+
+    def _finish(self, key: str, pdf_path: str, error: Optional[str], start_time: float,
+                duration: float) -> ConvertResult:
+        markdown_path = self._markdown_path(key)
+        produced = os.path.isfile(markdown_path) and os.path.getmtime(markdown_path) >= start_time
+        if error is None and not produced:
+            error = f"转换结果不存在: {markdown_path}"
+        if error is not None and not produced:
+            return ConvertResult(pdf_path=pdf_path, success=False, error=error, duration=duration)
+        if self.cache is not None:
+            self.cache.put(key, os.path.join(self.output_dir, key), markdown_path)
+        return ConvertResult(pdf_path=pdf_path, success=True, markdown_path=markdown_path, duration=duration,
+                             markdown_paths=[markdown_path])
+
+    def _convert_one(self, unit: tuple) -> ConvertResult:
+        start_time = time.time()
+        error = self._run_linked([unit])
+        return self._finish(unit[0], unit[1], error, start_time, time.time() - start_time)
+
+    def _convert_batch(self, batch: List[tuple]) -> List[ConvertResult]:
+        if len(batch) == 1:
+            return [self._convert_one(batch[0])]
+
+        start_time = time.time()
+        error = self._run_linked(batch)
+        duration = (time.time() - start_time) / len(batch)
+
+        results = []
+        for unit in batch:
+            result = self._finish(unit[0], unit[1], error, start_time, duration)
+            if not result.success and error is not None:
+                # 批次失败且该文件未产出结果，单独重试
+                logger.warning(f"batch convert failed, retry single file | pdf={unit[1]} | {error}")
+                result = self._convert_one(unit)
+            results.append(result)
+        return results
+
+    def convert(self, pdf_paths: List[str]) -> Iterator[ConvertResult]:
+        """转换多个PDF，按完成顺序逐个产出结果（与输入路径一一对应）"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        # 内容相同的PDF只转换一次：key -> 输入路径列表
+        paths_by_key: Dict[str, List[str]] = {}
+        for pdf_path in pdf_paths:
+            pdf_path = os.path.abspath(pdf_path)
+            paths_by_key.setdefault(self._key(pdf_path), []).append(pdf_path)
+
+        def expand(key: str, result: ConvertResult) -> Iterator[ConvertResult]:
+            for pdf_path in paths_by_key[key]:
+                yield ConvertResult(pdf_path=pdf_path, success=result.success,
+                                    markdown_path=result.markdown_path, error=result.error,
+                                    duration=result.duration, cached=result.cached,
+                                    markdown_paths=list(result.markdown_paths))
+
+        # 每个文档各分片的转换状态，全部分片完成后产出文档结果
+        docs: Dict[str, dict] = {}
+        unit_docs: Dict[str, Tuple[str, int]] = {}
+        whole_units = []
+        shard_units = []
+        for key, paths in paths_by_key.items():
+            units = self._plan_shards(key, paths[0])
+            doc = {"markdown_paths": [None] * len(units), "remaining": 0, "error": None, "duration": 0.0}
+            for index, unit in enumerate(units):
+                markdown_path = self.cache.get(unit[0]) if self.cache is not None else None
+                if markdown_path is not None:
+                    doc["markdown_paths"][index] = markdown_path
+                    continue
+                doc["remaining"] += 1
+                unit_docs[unit[0]] = (key, index)
+                (whole_units if unit[2] is None else shard_units).append(unit)
+            if doc["remaining"]:
+                docs[key] = doc
+            else:
+                yield from expand(key, ConvertResult(pdf_path=paths[0], success=True,
+                                                     markdown_path=doc["markdown_paths"][0], cached=True,
+                                                     markdown_paths=doc["markdown_paths"]))
+
+        # 整本PDF合并为批次；分片需各自指定页码范围，单独转换
+        batches = [whole_units[i:i + self.batch_size] for i in range(0, len(whole_units), self.batch_size)]
+        batches.extend([unit] for unit in shard_units)
+        logger.info(f"pdf convert start | files={len(pdf_paths)} | cached={len(paths_by_key) - len(docs)} | "
+                    f"batches={len(batches)} | shards={len(shard_units)} | concurrency={self.max_concurrency}")
+        if not batches:
+            return
+
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="PdfConvert-")
+        try:
+            futures = {executor.submit(self._convert_batch, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                for unit, result in zip(futures[future], future.result()):
+                    key, index = unit_docs[unit[0]]
+                    doc = docs[key]
+                    doc["remaining"] -= 1
+                    doc["duration"] = max(doc["duration"], result.duration)
+                    if result.success:
+                        doc["markdown_paths"][index] = result.markdown_path
+                    elif doc["error"] is None:
+                        doc["error"] = result.error
+                    if doc["remaining"]:
+                        continue
+
+                    pdf_path = paths_by_key[key][0]
+                    if doc["error"] is None:
+                        logger.info(f"pdf converted | pdf={pdf_path} | shards={len(doc['markdown_paths'])} | "
+                                    f"duration={doc['duration']:.1f}s")
+                        doc_result = ConvertResult(pdf_path=pdf_path, success=True,
+                                                   markdown_path=doc["markdown_paths"][0],
+                                                   duration=doc["duration"],
+                                                   markdown_paths=doc["markdown_paths"])
+                    else:
+                        logger.error(f"pdf convert failed | pdf={pdf_path} | {doc['error']}")
+                        doc_result = ConvertResult(pdf_path=pdf_path, success=False, error=doc["error"],
+                                                   duration=doc["duration"])
+                    yield from expand(key, doc_result)
+        finally:
+            # 调用方提前结束迭代时取消尚未开始的批次
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -1,44 +1,119 @@
-import subprocess
 import os
+import shlex
+import signal
+import subprocess
 import sys
 from pathlib import Path
+from typing import List, Optional, Tuple
+
+from config.service_config import config
+
+
+def build_mineru_command(input_path: str,
+                         output_dir: str,
+                         gpu_memory_utilization: float = 0.2,
+                         conda_env: str = "mineru-env",
+                         command: Optional[List[str]] = None,
+                         start_page: Optional[int] = None,
+                         end_page: Optional[int] = None) -> List[str]:
+    """
+    构建MinerU命令，input_path可以是单个PDF或包含多个PDF的目录
+    转换程序优先使用command参数，其次为配置项mineru_command，默认通过conda run调用mineru
+    start_page/end_page为转换的页码范围（从0开始，包含end_page）
+    """
+    if command is None:
+        if config.mineru_command:
+            command = shlex.split(config.mineru_command)
+        else:
+            # 构建 conda run 命令（自动处理环境变量和依赖）
+            command = ["conda", "run", "-n", conda_env, "mineru"]
+    cmd = list(command) + [
+        "-p", input_path, "-o", output_dir,
+        "--gpu-memory-utilization", str(gpu_memory_utilization)
+    ]
+    if start_page is not None:
+        cmd += ["-s", str(start_page)]
+    if end_page is not None:
+        cmd += ["-e", str(end_page)]
+    return cmd
+
+
+def count_pdf_pages(pdf_path: str) -> Optional[int]:
+    """获取PDF页数，依赖pypdf（可选），未安装或解析失败时返回None"""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return None
+    try:
+        return len(PdfReader(pdf_path).pages)
+    except Exception:
+        return None
+
+
+def mineru_output_path(output_dir: str, stem: str) -> Path:
+    """MinerU输出的Markdown文件路径：<output_dir>/<stem>/hybrid_auto/<stem>.md"""
+    return Path(output_dir) / stem / "hybrid_auto" / (stem + ".md")
+
+
+def run_converter(cmd: List[str], timeout: float) -> Tuple[int, str]:
+    """
+    执行转换命令，返回(返回码, stderr)
+    转换程序在独立进程组中运行，超时时整组终止，避免conda run留下孤儿mineru进程
+    """
+    popen_kwargs = {}
+    if sys.platform != 'win32':
+        popen_kwargs["start_new_session"] = True
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding='utf-8' if sys.platform != 'win32' else None,
+        errors='replace',
+        **popen_kwargs
+    )
+    try:
+        _, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        if sys.platform != 'win32':
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        else:
+            process.kill()
+        process.communicate()
+        raise
+    return process.returncode, stderr
 
 
 def convert_pdf_with_mineru(pdf_path: str,
                             output_dir: str,
                             gpu_memory_utilization: float=0.2,
                             timeout: float=600.0,
-                            conda_env="mineru-env"):
+                            conda_env="mineru-env",
+                            command: Optional[List[str]] = None):
     pdf_path = os.path.abspath(pdf_path)
     output_path = os.path.abspath(output_dir)
     os.makedirs(output_path, exist_ok=True)
 
-    # 构建 conda run 命令（自动处理环境变量和依赖）
-    cmd = [
-        "conda", "run", "-n", conda_env,
-        "mineru", "-p", pdf_path, "-o", output_path,
-        "--gpu-memory-utilization", gpu_memory_utilization
-    ]
+    cmd = build_mineru_command(input_path=pdf_path,
+                               output_dir=output_path,
+                               gpu_memory_utilization=gpu_memory_utilization,
+                               conda_env=conda_env,
+                               command=command)
 
     try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-            encoding='utf-8' if sys.platform != 'win32' else None
-        )
-
-        if result.returncode == 0:
-            file_name_no_ext = Path(pdf_path).stem
-            dest_file_name = file_name_no_ext + ".md"
-            dest_file_path = Path(output_path) / file_name_no_ext / "hybrid_auto" / dest_file_name
+        returncode, stderr = run_converter(cmd, timeout=timeout)
+
+        if returncode == 0:
+            dest_file_path = mineru_output_path(output_path, Path(pdf_path).stem)
             return True, str(dest_file_path)
         else:
-            return False, f"转换失败:\n{result.stderr}"
+            return False, f"转换失败:\n{stderr}"
 
     except FileNotFoundError:
-        return False, "错误：未找到 'conda' 命令。请确保 Conda 已加入系统 PATH，或使用绝对路径调用。"
+        return False, f"错误：未找到 '{cmd[0]}' 命令。请确保 Conda 已加入系统 PATH，或使用绝对路径调用。"
     except subprocess.TimeoutExpired:
         return False, "转换超时，请检查 PDF 大小或增加 timeout 参数。"
     except Exception as e:
@@ -54,4 +129,4 @@ if __name__ == "__main__":
         gpu_memory_utilization=0.2
     )
     print(success)
-    print(msg)
\ No newline at end of file
+    print(msg)
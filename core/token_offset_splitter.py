@@ -0,0 +1,112 @@
+import re
+from bisect import bisect_left
+from typing import List, Optional
+
+from core.gilingual_text_splitter import BilingualTextSplitter
+
+
+class TokenOffsetTextSplitter:
+    """
+    基于token偏移的单遍分割器
+    1. 对整段文本只做一次带offset的分词
+    2. 将所有分隔符合并为一个正则，一次扫描得到每个token边界上优先级最高的断点
+    3. 按token位置贪心切块：窗口内选优先级最高的断点，同优先级取最靠后的位置
+    4. 有重叠时，下一块从重叠窗口内优先级最高的断点开始（同优先级取最靠前的位置），没有断点时按token数重叠
+    分隔符优先级与BilingualTextSplitter一致，整体复杂度与文本长度线性相关
+    """
+
+    def __init__(self,
+                 tokenizer,
+                 chunk_size: int = 512,
+                 chunk_overlap: int = 0,
+                 separators: Optional[List[str]] = None):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+
+        if separators is None:
+            separators = BilingualTextSplitter.get_default_separators()
+
+        self._tokenizer = tokenizer
+        self._chunk_size = chunk_size
+        self._chunk_overlap = chunk_overlap
+        # encode默认会添加特殊token，块内容可用的token数需扣除
+        self._special_tokens = len(tokenizer.encode(""))
+
+        # 空分隔符为字符级兜底，对应任意token边界，优先级最低
+        patterns = [sep for sep in separators if sep]
+        self._fallback_priority = len(patterns)
+        self._pattern = re.compile("|".join(f"(?P<s{i}>{sep})" for i, sep in enumerate(patterns)))
+
+    @staticmethod
+    def _break_position(match) -> int:
+        """结构/空白类分隔符作为下一块的开头，标点类分隔符保留在前一块末尾"""
+        separator = match.group(0)
+        if separator.startswith("\n") or not separator.strip():
+            return match.start()
+        return match.end()
+
+    def _find_breaks(self, text: str, token_starts: List[int]):
+        """一次扫描所有分隔符，返回每个token边界的(优先级, 断点字符位置)"""
+        token_num = len(token_starts)
+        break_priority = [self._fallback_priority] * (token_num + 1)
+        break_char = token_starts + [len(text)]
+
+        for match in self._pattern.finditer(text):
+            pos = self._break_position(match)
+            # 断点映射到其后的第一个token
+            index = bisect_left(token_starts, pos)
+            if index <= 0 or index >= token_num:
+                continue
+            priority = int(match.lastgroup[1:])
+            if priority < break_priority[index]:
+                break_priority[index] = priority
+                break_char[index] = pos
+        return break_priority, break_char
+
+    def split_text(self, text: str) -> List[str]:
+        text = BilingualTextSplitter.normalize_text(text)
+        encoded = self._tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        token_starts = [start for start, _ in encoded["offset_mapping"]]
+        token_num = len(token_starts)
+
+        budget = max(self._chunk_size - self._special_tokens, 1)
+        if token_num <= budget:
+            text = text.strip()
+            return [text] if text else []
+
+        break_priority, break_char = self._find_breaks(text, token_starts)
+        break_char[0] = 0
+
+        chunks = []
+        start = 0
+        while start < token_num:
+            if token_num - start <= budget:
+                end = token_num
+            else:
+                # 从窗口末尾向前找优先级最高的断点，同优先级保留最靠后的
+                end = start + budget
+                best_priority = break_priority[end]
+                for index in range(start + budget - 1, start, -1):
+                    if break_priority[index] < best_priority:
+                        best_priority = break_priority[index]
+                        end = index
+
+            chunk = text[break_char[start]:break_char[end]].strip()
+            if chunk:
+                chunks.append(chunk)
+
+            if end >= token_num:
+                break
+            start = self._overlap_start(break_priority, start, end) if self._chunk_overlap else end
+        return chunks
+
+    def _overlap_start(self, break_priority: List[int], start: int, end: int) -> int:
+        """重叠部分与BilingualTextSplitter一样由完整的片段组成，不从句子中间开始"""
+        lower = max(end - self._chunk_overlap, start + 1)
+        best_priority = self._fallback_priority
+        best = lower
+        for index in range(lower, end):
+            if break_priority[index] < best_priority:
+                best_priority = break_priority[index]
+                best = index
+        return best
@@ -0,0 +1,69 @@
+"""
+假的MinerU转换程序，命令行参数与输出目录结构与mineru一致，用于在没有GPU/模型的环境中测试转换流程
+用法: MINERU_COMMAND="python core/tool/fake_mineru.py"
+- 输入文件内容可按UTF-8解码时直接作为Markdown输出，否则输出占位段落
+- FAKE_MINERU_SLEEP: 每个文件的模拟耗时（秒）
+- FAKE_MINERU_FAIL: 文件名包含该字符串时转换失败（其余文件照常输出，最终返回非0）
+- FAKE_MINERU_HANG: 文件名包含该字符串时一直挂起，用于测试超时
+- 文本内容中的换页符(\\f)视为分页，支持 -s/-e 页码范围
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+
+def _convert(pdf_path: Path, output_dir: Path, start_page=None, end_page=None) -> bool:
+    stem = pdf_path.stem
+    # 输入可能是软链接，按原始文件名匹配故障注入规则
+    name = Path(os.path.realpath(pdf_path)).stem
+    if os.getenv("FAKE_MINERU_HANG") and os.getenv("FAKE_MINERU_HANG") in name:
+        while True:
+            time.sleep(1)
+    if os.getenv("FAKE_MINERU_SLEEP"):
+        time.sleep(float(os.getenv("FAKE_MINERU_SLEEP")))
+    if os.getenv("FAKE_MINERU_FAIL") and os.getenv("FAKE_MINERU_FAIL") in name:
+        print(f"fake mineru: failed to convert {pdf_path}", file=sys.stderr)
+        return False
+
+    data = pdf_path.read_bytes()
+    try:
+        content = data.decode("utf-8")
+    except UnicodeDecodeError:
+        content = f"# {stem}\n\n{len(data)} bytes\n"
+    if start_page is not None or end_page is not None:
+        pages = content.split("\f")
+        start = start_page or 0
+        end = len(pages) - 1 if end_page is None else end_page
+        content = "\n".join(pages[start:end + 1])
+
+    dest_dir = output_dir / stem / "hybrid_auto"
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    (dest_dir / (stem + ".md")).write_text(content, encoding="utf-8")
+    return True
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="fake mineru")
+    parser.add_argument("-p", "--path", required=True)
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--gpu-memory-utilization", default=None)
+    parser.add_argument("-s", "--start", type=int, default=None)
+    parser.add_argument("-e", "--end", type=int, default=None)
+    args = parser.parse_args()
+
+    input_path = Path(args.path)
+    if input_path.is_dir():
+        pdf_paths = sorted(p for p in input_path.iterdir() if p.suffix.lower() == ".pdf")
+    else:
+        pdf_paths = [input_path]
+
+    ok = True
+    for pdf_path in pdf_paths:
+        ok = _convert(pdf_path, Path(args.output), args.start, args.end) and ok
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -18,6 +18,23 @@ def text_to_sha256(text: str, encoding: str = 'utf-8') -> str:
     # 编码为字节 → 计算哈希 → 返回十六进制字符串
     return hashlib.sha256(text.encode(encoding)).hexdigest()
 
+def file_to_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    分块读取文件计算 SHA256，避免大文件一次性读入内存
+
+    Args:
+        path: 文件路径
+        chunk_size: 每次读取的字节数
+
+    Returns:
+        64 位小写十六进制字符串
+    """
+    sha256_hash = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            sha256_hash.update(block)
+    return sha256_hash.hexdigest()
+
 def compute_sha256(text):
     """
     计算文本的SHA-256哈希值
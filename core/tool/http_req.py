@@ -1,9 +1,119 @@
+import asyncio
+import importlib.util
+import random
+import threading
 import time
-from typing import Optional
+import weakref
+from typing import Dict, Optional
+from urllib.parse import urlsplit
 
 import httpx
 
 from config.logging_config import logger
+from config.service_config import config
+
+# 可重试的HTTP状态码：限流与网关/服务暂时不可用
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+# 可重试的网络异常：超时，以及keep-alive连接被服务端关闭等连接层错误
+RETRY_EXCEPTIONS = (httpx.TimeoutException, httpx.ConnectError, httpx.RemoteProtocolError)
+
+
+class HttpClientPool:
+    """
+    长连接客户端池：按host复用httpx.Client/AsyncClient，每个host独立的连接数限制
+    开启keep-alive，可选HTTP/2（需安装h2）
+    """
+
+    def __init__(self,
+                 max_connections: int = 100,
+                 max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 30.0,
+                 http2: bool = False):
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("h2 is not installed, fallback to HTTP/1.1")
+            http2 = False
+
+        self.http2 = http2
+        self._limits = httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_keepalive_connections,
+                                    keepalive_expiry=keepalive_expiry)
+        self._lock = threading.Lock()
+        self._clients: Dict[str, httpx.Client] = {}
+        # AsyncClient绑定创建它的事件循环：loop -> {host: client}
+        # 以loop对象为弱引用key，loop被回收后其客户端随之释放，不会被id相同的新loop误用
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def _origin(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def get_client(self, url: str) -> httpx.Client:
+        origin = self._origin(url)
+        client = self._clients.get(origin)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(origin)
+                if client is None:
+                    client = httpx.Client(limits=self._limits, http2=self.http2)
+                    self._clients[origin] = client
+        return client
+
+    def get_async_client(self, url: str) -> httpx.AsyncClient:
+        origin = self._origin(url)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # 未调用aclose就结束的loop：其客户端已无法使用，释放引用以免连接堆积
+            for closed_loop in [key for key in self._async_clients if key.is_closed()]:
+                del self._async_clients[closed_loop]
+            clients = self._async_clients.setdefault(loop, {})
+            client = clients.get(origin)
+            if client is None:
+                client = httpx.AsyncClient(limits=self._limits, http2=self.http2)
+                clients[origin] = client
+        return client
+
+    def close(self) -> None:
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for client in clients.values():
+            client.close()
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环的AsyncClient，需在该loop结束前调用"""
+        with self._lock:
+            clients = self._async_clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            await client.aclose()
+
+
+_default_pool: Optional[HttpClientPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool() -> HttpClientPool:
+    """进程级共享的客户端池，参数来自服务配置"""
+    global _default_pool
+    if _default_pool is None:
+        with _default_pool_lock:
+            if _default_pool is None:
+                _default_pool = HttpClientPool(max_connections=config.http_max_connections,
+                                               max_keepalive_connections=config.http_max_keepalive_connections,
+                                               keepalive_expiry=config.http_keepalive_expiry,
+                                               http2=config.http2)
+    return _default_pool
+
+
+def _backoff_delay(attempt: int, base: float = 0.05, cap: float = 2.0) -> float:
+    """指数退避 + 全抖动：在[0, min(cap, base * 2^attempt)]中随机取值"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _build_headers(headers: Optional[dict]) -> dict:
+    # 复制一份，避免修改调用方传入的headers
+    headers = dict(headers) if headers else {"Content-Type": "application/json; charset=UTF-8"}
+    headers["from"] = "Y"
+    return headers
 
 
 def send_request(url: str,
@@ -12,15 +122,17 @@ def send_request(url: str,
                  json_data: dict = None,
                  headers: dict = None,
                  timeout: float = 5.0,
-                 retries: int = 3) -> Optional[httpx.Response]:
-    if headers is None:
-        headers = {"Content-Type": "application/json; charset=UTF-8"}
-    headers["from"] = "Y"
+                 retries: int = 3,
+                 pool: Optional[HttpClientPool] = None) -> Optional[httpx.Response]:
+    headers = _build_headers(headers)
+    client = (pool or get_default_pool()).get_client(url)
 
-    counter = 0
-    while counter < retries:
+    last_error: Optional[Exception] = None
+    for attempt in range(retries):
+        if attempt:
+            time.sleep(_backoff_delay(attempt - 1))
         try:
-            response = httpx.request(
+            response = client.request(
                 method=method,
                 url=url,
                 params=params,
@@ -32,20 +144,64 @@ def send_request(url: str,
             return response
         except httpx.HTTPStatusError as e:
             logger.error(f"HTTP 错误: {e.response.status_code} - {e.response.text}")
+            if e.response.status_code in RETRY_STATUS_CODES:
+                last_error = e
+                continue
             return None
-        except httpx.ReadTimeout as e:
-            logger.error("readTimeout")
-            continue
-        except httpx.ConnectTimeout as e:
-            logger.error("connectTimeout")
+        except RETRY_EXCEPTIONS as e:
+            logger.error(f"send_request retryable error: {type(e).__name__} {e}")
+            last_error = e
             continue
-        except httpx.RequestError as e:
+        except Exception as e:
             logger.error(f"send_request catch exception: {e}")
             return None
+
+    if isinstance(last_error, httpx.HTTPStatusError):
+        return None
+    raise httpx.ReadTimeout(f"request failed after {retries} retries: {last_error}")
+
+
+async def async_send_request(url: str,
+                             method: str = "POST",
+                             params: dict = None,
+                             json_data: dict = None,
+                             headers: dict = None,
+                             timeout: float = 5.0,
+                             retries: int = 3,
+                             pool: Optional[HttpClientPool] = None) -> Optional[httpx.Response]:
+    """send_request的异步版本，重试与错误处理规则相同"""
+    headers = _build_headers(headers)
+    client = (pool or get_default_pool()).get_async_client(url)
+
+    last_error: Optional[Exception] = None
+    for attempt in range(retries):
+        if attempt:
+            await asyncio.sleep(_backoff_delay(attempt - 1))
+        try:
+            response = await client.request(
+                method=method,
+                url=url,
+                params=params,
+                json=json_data,
+                headers=headers,
+                timeout=timeout
+            )
+            response.raise_for_status()
+            return response
+        except httpx.HTTPStatusError as e:
+            logger.error(f"HTTP 错误: {e.response.status_code} - {e.response.text}")
+            if e.response.status_code in RETRY_STATUS_CODES:
+                last_error = e
+                continue
+            return None
+        except RETRY_EXCEPTIONS as e:
+            logger.error(f"async_send_request retryable error: {type(e).__name__} {e}")
+            last_error = e
+            continue
         except Exception as e:
-            logger.error(f"send_request catch exception: {e}")
+            logger.error(f"async_send_request catch exception: {e}")
             return None
-        finally:
-            time.sleep(0.005)
-            counter += 1
-    raise httpx.ReadTimeout("read timeout")
\ No newline at end of file
+
+    if isinstance(last_error, httpx.HTTPStatusError):
+        return None
+    raise httpx.ReadTimeout(f"request failed after {retries} retries: {last_error}")
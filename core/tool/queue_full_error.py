@@ -1,9 +1,2 @@
 class QueueFullError(Exception):
-    """ Inappropriate argument value (of correct type). """
-    def __init__(self, *args, **kwargs): # real signature unknown
-        pass
-
-    @staticmethod # known case of __new__
-    def __new__(*args, **kwargs): # real signature unknown
-        """ Create and return a new object.  See help(type) for accurate signature. """
-        pass
\ No newline at end of file
+    """队列或资源池已满，任务无法提交"""
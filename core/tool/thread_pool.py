@@ -1,19 +1,38 @@
+import heapq
 import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, Future, wait
+from concurrent.futures import Future, InvalidStateError
+from queue import Queue, Empty, Full
 from typing import Callable, Any, Optional, Dict
 from contextlib import contextmanager
 
 from config.logging_config import logger
-from core.tool.atomic_counter import AtomicCounter
 from core.tool.queue_full_error import QueueFullError
 
+# 关闭时为每个工作线程放入一个，工作线程取到后退出
+_SHUTDOWN_SENTINEL = None
+
+
+class _WorkItem:
+    __slots__ = ("future", "fn", "args", "kwargs", "submit_time")
+
+    def __init__(self, future: Future, fn: Callable, args: tuple, kwargs: dict):
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.submit_time = time.monotonic()
+
 
 class ThreadPool:
     """
-    线上级线程池：异常隔离 + 优雅关闭 + 指标监控 + 资源保护
+    线上级线程池：有界队列 + 拒绝策略 + 任务级超时 + 异常隔离 + 优雅关闭 + 指标监控
     适用场景：模型推理、DB查询、外部API调用等阻塞操作
     """
+    # 队列满时的拒绝策略
+    POLICY_BLOCK = "block"              # 阻塞提交方直到队列有空位
+    POLICY_CALLER_RUNS = "caller_runs"  # 在提交方线程中直接执行
+    POLICY_REJECT = "reject"            # 抛出QueueFullError
 
     def __init__(
             self,
@@ -21,17 +40,21 @@ class ThreadPool:
             queue_size: int = 100,
             thread_name_prefix: str = "Pool-",
             task_timeout: Optional[float] = None,
-            shutdown_timeout: float = 30.0
+            shutdown_timeout: float = 30.0,
+            rejection_policy: str = POLICY_REJECT
     ):
         if max_workers <= 0:
             raise ValueError("max_workers must be > 0")
         if queue_size <= 0:
             raise ValueError("queue_size must be > 0")
+        if rejection_policy not in (self.POLICY_BLOCK, self.POLICY_CALLER_RUNS, self.POLICY_REJECT):
+            raise ValueError(f"unknown rejection_policy: {rejection_policy}")
 
         self.max_workers = max_workers
         self.queue_size = queue_size
         self.task_timeout = task_timeout
         self.shutdown_timeout = shutdown_timeout
+        self.rejection_policy = rejection_policy
         self._shutdown = False
         self._lock = threading.Lock()
 
@@ -41,45 +64,118 @@ class ThreadPool:
             "completed": 0,
             "failed": 0,
             "timeout": 0,
-            "rejected": 0
+            "rejected": 0,
+            "caller_runs": 0
         }
+        self._active = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+        self._total_wait = 0.0
+        self._finished = 0
 
-        self._executor = ThreadPoolExecutor(
-            max_workers=max_workers,
-            thread_name_prefix=thread_name_prefix
-        )
+        self._queue: Queue = Queue(maxsize=queue_size)
+        self._workers = []
+        for i in range(max_workers):
+            t = threading.Thread(target=self._worker_loop,
+                                 name=f"{thread_name_prefix}{i}",
+                                 daemon=True)
+            t.start()
+            self._workers.append(t)
+
+        # 超时监控：由单独的看门狗线程按截止时间标记超时，不占用工作线程
+        self._deadlines = []
+        self._deadline_cond = threading.Condition()
+        if task_timeout:
+            self._watchdog = threading.Thread(target=self._watchdog_loop,
+                                              name=f"{thread_name_prefix}watchdog",
+                                              daemon=True)
+            self._watchdog.start()
 
-        self._task_counter = AtomicCounter(initial_value=queue_size)
         logger.info(
             f"ProductionThreadPool initialized | workers={max_workers} | "
-            f"queue_size={queue_size}"
+            f"queue_size={queue_size} | rejection_policy={rejection_policy}"
         )
 
-    def _wrap_task(self, fn: Callable, *args, **kwargs) -> Any:
-        """任务包装：统一异常捕获 + 超时控制 + 指标更新"""
-        start_time = time.time()
+    def _worker_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _SHUTDOWN_SENTINEL:
+                    return
+                self._run_item(item)
+            finally:
+                self._queue.task_done()
+
+    def _run_item(self, item: _WorkItem) -> None:
+        """执行任务：统一异常捕获 + 超时登记 + 指标更新"""
+        if not item.future.set_running_or_notify_cancel():
+            return
+
+        start_time = time.monotonic()
+        with self._lock:
+            self._active += 1
+            self._total_wait += start_time - item.submit_time
+        if self.task_timeout:
+            with self._deadline_cond:
+                heapq.heappush(self._deadlines, (start_time + self.task_timeout, id(item), item.future))
+                self._deadline_cond.notify()
+
         try:
-            if self.task_timeout:
-                # 使用wait实现任务级超时（避免Future.result阻塞线程）
-                future = self._executor.submit(fn, *args, **kwargs)
-                done, _ = wait([future], timeout=self.task_timeout)
-                if not done:
-                    with self._lock:
-                        self._stats["timeout"] += 1
-                    raise TimeoutError(f"Task exceeded {self.task_timeout}s timeout")
-                return future.result()
-            else:
-                return fn(*args, **kwargs)
-        except Exception as e:
-            with self._lock:
-                self._stats["failed"] += 1
+            result = item.fn(*item.args, **item.kwargs)
+        except BaseException as e:
+            # 与concurrent.futures一致：SystemExit等也记入future，保证future完成、指标不泄漏
+            duration = time.monotonic() - start_time
+            self._finish(duration, "failed")
             logger.exception(
-                f"Task failed | type={type(e).__name__} | duration={time.time() - start_time:.3f}s"
+                f"Task failed | type={type(e).__name__} | duration={duration:.3f}s"
             )
-            raise
-        finally:
+            self._set_future(item.future, exception=e)
+        else:
+            self._finish(time.monotonic() - start_time, "completed")
+            self._set_future(item.future, result=result)
+
+    @staticmethod
+    def _set_future(future: Future, result: Any = None, exception: Optional[BaseException] = None) -> None:
+        # 已被看门狗标记为超时的任务，结果直接丢弃
+        try:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass
+
+    def _finish(self, duration: float, stat_key: str) -> None:
+        with self._lock:
+            self._active -= 1
+            self._finished += 1
+            self._stats[stat_key] += 1
+            self._total_latency += duration
+            self._max_latency = max(self._max_latency, duration)
+
+    def _watchdog_loop(self) -> None:
+        while True:
+            with self._deadline_cond:
+                while not self._deadlines:
+                    if self._shutdown:
+                        return
+                    self._deadline_cond.wait(timeout=0.5)
+                deadline, _, future = self._deadlines[0]
+                now = time.monotonic()
+                if deadline > now:
+                    self._deadline_cond.wait(timeout=deadline - now)
+                    continue
+                heapq.heappop(self._deadlines)
+
+            if future.done():
+                continue
+            try:
+                future.set_exception(TimeoutError(f"Task exceeded {self.task_timeout}s timeout"))
+            except InvalidStateError:
+                continue
             with self._lock:
-                self._stats["completed"] += 1
+                self._stats["timeout"] += 1
+            logger.error(f"Task exceeded {self.task_timeout}s timeout, result will be discarded")
 
     def submit(self, fn: Callable, *args, **kwargs) -> Future:
         if self._shutdown:
@@ -88,20 +184,31 @@ class ThreadPool:
         with self._lock:
             self._stats["submitted"] += 1
 
-        if self._task_counter.decrement() < 0:
-            self._task_counter.increment()
+        item = _WorkItem(Future(), fn, args, kwargs)
+        if self.rejection_policy == self.POLICY_BLOCK:
+            self._queue.put(item)
+            return item.future
+
+        try:
+            self._queue.put_nowait(item)
+        except Full:
+            if self.rejection_policy == self.POLICY_CALLER_RUNS:
+                with self._lock:
+                    self._stats["caller_runs"] += 1
+                self._run_item(item)
+                return item.future
             with self._lock:
                 self._stats["rejected"] += 1
             raise QueueFullError(
                 f"Task rejected: thread pool queue full (max={self.queue_size}). "
                 f"Current stats: {self.get_stats()}"
             ) from None
-        return self._executor.submit(fn, *args, **kwargs)
+        return item.future
 
-    def shutdown(self, force: bool = False) -> Dict[str, int]:
+    def shutdown(self, force: bool = False) -> Dict[str, Any]:
         """
         优雅关闭线程池
-        :param force: True=立即终止（不推荐），False=等待任务完成（带超时）
+        :param force: True=取消队列中未开始的任务，False=等待队列中的任务执行完（带超时）
         :return: 最终统计指标
         """
         if self._shutdown:
@@ -111,31 +218,60 @@ class ThreadPool:
         logger.info(f"Initiating thread pool shutdown (force={force}) | {self.get_stats()}")
 
         if force:
-            self._executor.shutdown(wait=False)
+            self._cancel_queued()
+            for _ in self._workers:
+                try:
+                    self._queue.put_nowait(_SHUTDOWN_SENTINEL)
+                except Full:
+                    break
         else:
-            # 先停止接收新任务
-            self._executor.shutdown(wait=False)
-
-            # 等待活跃任务完成（带超时保护）
-            start = time.time()
-            while time.time() - start < self.shutdown_timeout:
-                if self._stats["submitted"] <= self._stats["completed"] + self._stats["failed"]:
+            # 哨兵排在已入队任务之后：工作线程执行完队列中的任务再退出（带超时保护）
+            deadline = time.monotonic() + self.shutdown_timeout
+            for _ in self._workers:
+                try:
+                    self._queue.put(_SHUTDOWN_SENTINEL, timeout=max(deadline - time.monotonic(), 0))
+                except Full:
                     break
-                time.sleep(0.5)
-            else:
+            for t in self._workers:
+                t.join(timeout=max(deadline - time.monotonic(), 0))
+            alive = sum(1 for t in self._workers if t.is_alive())
+            if alive:
                 logger.warning(
                     f"Shutdown timeout ({self.shutdown_timeout}s) reached. "
-                    f"Remaining tasks: {self._stats['submitted'] - self._stats['completed'] - self._stats['failed']}"
+                    f"Remaining tasks: queued={self._queue.qsize()} | active={self._active}"
                 )
+            else:
+                # 与关闭并发提交、排在哨兵之后的任务不会再被执行
+                self._cancel_queued()
+
+        with self._deadline_cond:
+            self._deadline_cond.notify_all()
 
         final_stats = self.get_stats()
         logger.info(f"ThreadPool shutdown complete | {final_stats}")
         return final_stats
 
-    def get_stats(self) -> Dict[str, int]:
+    def _cancel_queued(self) -> None:
+        """取消队列中未开始的任务"""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except Empty:
+                return
+            if item is not _SHUTDOWN_SENTINEL:
+                item.future.cancel()
+            self._queue.task_done()
+
+    def get_stats(self) -> Dict[str, Any]:
         """获取实时统计指标（线程安全）"""
         with self._lock:
-            return self._stats.copy()
+            stats = self._stats.copy()
+            stats["queue_depth"] = self._queue.qsize()
+            stats["active"] = self._active
+            stats["avg_latency"] = self._total_latency / self._finished if self._finished else 0.0
+            stats["max_latency"] = self._max_latency
+            stats["avg_wait"] = self._total_wait / self._finished if self._finished else 0.0
+            return stats
 
     def __enter__(self):
         return self
@@ -157,4 +293,4 @@ class ThreadPool:
             logger.exception(f"Task '{task_name}' failed after {time.time() - start:.3f}s")
             raise
         else:
-            logger.debug(f"Task '{task_name}' completed in {time.time() - start:.3f}s")
\ No newline at end of file
+            logger.debug(f"Task '{task_name}' completed in {time.time() - start:.3f}s")
@@ -0,0 +1,46 @@
+from typing import List
+
+from core.tool.lru_cache import LRUCache
+
+
+class TokenLengthCounter:
+    """
+    带LRU缓存的token长度计算器，可直接作为length_function使用
+    - 重复字符串直接命中缓存（切分器合并候选块时会反复计算同一片段）
+    - batch()使用fast tokenizer的批量编码一次性计算多个未命中的字符串
+    - 只缓存不超过max_cached_chars的短字符串（标题、分割片段），整段正文不进缓存，缓存内存有界
+    """
+    CACHE_SIZE = 65536
+    MAX_CACHED_CHARS = 256
+
+    def __init__(self, tokenizer, cache_size: int = CACHE_SIZE, max_cached_chars: int = MAX_CACHED_CHARS):
+        self._tokenizer = tokenizer
+        self._cache = LRUCache(max_size=cache_size)
+        self._max_cached_chars = max_cached_chars
+
+    def __call__(self, text: str) -> int:
+        if len(text) > self._max_cached_chars:
+            return len(self._tokenizer.encode(text))
+        length = self._cache.get(text)
+        if length is None:
+            length = len(self._tokenizer.encode(text))
+            self._cache.put(text, length)
+        return length
+
+    def batch(self, texts: List[str]) -> List[int]:
+        """批量计算token长度，只对缓存未命中的字符串做一次批量编码"""
+        lengths = [self._cache.get(text) for text in texts]
+        misses = list({text for text, length in zip(texts, lengths) if length is None})
+        if misses:
+            encoded = self._tokenizer(misses, add_special_tokens=True)["input_ids"]
+            miss_lengths = {}
+            for text, ids in zip(misses, encoded):
+                miss_lengths[text] = len(ids)
+                if len(text) <= self._max_cached_chars:
+                    self._cache.put(text, len(ids))
+            lengths = [miss_lengths[text] if length is None else length
+                       for text, length in zip(texts, lengths)]
+        return lengths
+
+    def get_stats(self):
+        return self._cache.get_stats()
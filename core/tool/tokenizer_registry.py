@@ -0,0 +1,76 @@
+import os
+import threading
+import time
+from typing import Dict, List, Tuple, Union
+
+from config.logging_config import logger
+
+TOKENIZER_FILE = "tokenizer.json"
+
+
+class FastTokenizer:
+    """
+    直接基于tokenizers库加载tokenizer.json，不依赖transformers
+    只实现项目中用到的接口：encode() 与 __call__()（返回input_ids / offset_mapping）
+    """
+
+    def __init__(self, tokenizer_file: str):
+        from tokenizers import Tokenizer
+
+        self._tokenizer = Tokenizer.from_file(tokenizer_file)
+        # 与transformers默认行为一致：不截断、不填充
+        self._tokenizer.no_truncation()
+        self._tokenizer.no_padding()
+
+    def encode(self, text: str, add_special_tokens: bool = True) -> List[int]:
+        return self._tokenizer.encode(text, add_special_tokens=add_special_tokens).ids
+
+    def __call__(self, text: Union[str, List[str]],
+                 add_special_tokens: bool = True,
+                 return_offsets_mapping: bool = False) -> dict:
+        if isinstance(text, str):
+            encoding = self._tokenizer.encode(text, add_special_tokens=add_special_tokens)
+            result = {"input_ids": encoding.ids}
+            if return_offsets_mapping:
+                result["offset_mapping"] = encoding.offsets
+            return result
+
+        encodings = self._tokenizer.encode_batch(text, add_special_tokens=add_special_tokens)
+        result = {"input_ids": [encoding.ids for encoding in encodings]}
+        if return_offsets_mapping:
+            result["offset_mapping"] = [encoding.offsets for encoding in encodings]
+        return result
+
+
+_lock = threading.Lock()
+_tokenizers: Dict[Tuple[str, bool], object] = {}
+
+
+def _load(model_name: str, fast: bool):
+    tokenizer_file = os.path.join(model_name, TOKENIZER_FILE)
+    if fast and os.path.isfile(tokenizer_file):
+        return FastTokenizer(tokenizer_file)
+
+    # 没有tokenizer.json（或显式关闭快速路径）时回退到transformers
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(model_name)
+
+
+def get_tokenizer(model_name: str, fast: bool = True):
+    """
+    获取进程内共享的tokenizer，首次使用时加载
+    :param model_name: 模型目录（或HuggingFace模型名）
+    :param fast: 优先只加载tokenizer.json，避免导入整个transformers
+    """
+    key = (model_name, fast)
+    tokenizer = _tokenizers.get(key)
+    if tokenizer is None:
+        with _lock:
+            tokenizer = _tokenizers.get(key)
+            if tokenizer is None:
+                start_time = time.time()
+                tokenizer = _load(model_name, fast)
+                _tokenizers[key] = tokenizer
+                logger.info(f"tokenizer loaded | model={model_name} | type={type(tokenizer).__name__} | "
+                            f"elapsed={time.time() - start_time:.2f}s")
+    return tokenizer
@@ -0,0 +1,103 @@
+import asyncio
+import random
+from typing import List, Optional
+
+from pymilvus import AsyncMilvusClient
+
+from config.logging_config import logger
+from config.service_config import config
+from core.tool.http_req import get_default_pool
+from core.tool.time import get_current_timestamp_ms
+from core.vector.embedding_cache import EmbeddingCache
+from core.vector.embedding_generator import AsyncEmbeddingGenerator
+from core.vector.milvus_write import WriteNotifier
+from core.vector.row_batch import EmbeddingBatch, RowBatch
+
+
+class AsyncMilvusWrite(WriteNotifier):
+    """
+    MilvusWrite的asyncio版本：异步生成向量 + AsyncMilvusClient异步upsert，用信号量限制并发
+    写入成功后与MilvusWrite一样通知写入监听器（在事件循环线程中回调）
+    """
+    MAX_RETRIES = 10
+
+    def __init__(self, milvus_uri: str="http://172.18.10.65:19530",
+                 embedding_uri: str="http://172.18.10.61:8010",
+                 max_embedding_concurrency: int=64,
+                 max_write_concurrency: int=16,
+                 embedding_cache: Optional[EmbeddingCache]=None):
+        super().__init__()
+        self.milvus_uri = milvus_uri
+        self.embedding_generator = AsyncEmbeddingGenerator(base_url=embedding_uri,
+                                                           max_concurrency=max_embedding_concurrency)
+        if embedding_cache is None and config.embedding_cache_file:
+            embedding_cache = EmbeddingCache(db_path=config.embedding_cache_file,
+                                             model_id=config.embedding_model_id,
+                                             max_bytes=config.embedding_cache_max_mb * 1024 * 1024)
+        self.embedding_cache = embedding_cache
+        self._write_semaphore = asyncio.Semaphore(max_write_concurrency)
+        self._client: Optional[AsyncMilvusClient] = None
+
+    def _get_client(self) -> AsyncMilvusClient:
+        # AsyncMilvusClient需在事件循环中创建
+        if self._client is None:
+            self._client = AsyncMilvusClient(uri=self.milvus_uri, timeout=10.0)
+        return self._client
+
+    async def upsert(self, collection_name: str, data: List[dict]) -> None:
+        current_retry = 0
+        async with self._write_semaphore:
+            while True:
+                try:
+                    ret = await self._get_client().upsert(collection_name=collection_name,
+                                                          data=data,
+                                                          timeout=10.0)
+                    logger.info(f"upsert ret: {ret}")
+                    break
+                except Exception as e:
+                    current_retry = current_retry + 1
+                    logger.error(f"async write catch exception {e}")
+                    if current_retry >= self.MAX_RETRIES:
+                        raise
+                    await asyncio.sleep(random.uniform(0, min(2.0, 0.05 * (2 ** current_retry))))
+        self._notify_write(collection_name, {row["doc_id"] for row in data})
+
+    async def gene_data_batch(self,
+                              doc_id: int,
+                              doc_name: str,
+                              texts: List[str],
+                              chunk_ids: List[int]) -> List[dict]:
+        if len(texts) != len(chunk_ids):
+            raise ValueError("texts and chunk_ids must have the same length")
+
+        embeddings = await self._embeddings(texts)
+
+        # AsyncMilvusClient只支持按行写入
+        return RowBatch.build(doc_id=doc_id,
+                              doc_name=doc_name,
+                              texts=texts,
+                              chunk_ids=chunk_ids,
+                              embeddings=embeddings,
+                              timestamp_ms=get_current_timestamp_ms()).to_rows()
+
+    async def _embeddings(self, texts: List[str]) -> EmbeddingBatch:
+        """先查向量缓存，只对未命中的文本调用向量服务；SQLite读写放到线程中执行，不阻塞事件循环"""
+        if self.embedding_cache is None:
+            return await self.embedding_generator.embeddings_batch_array(texts)
+
+        cached = await asyncio.to_thread(self.embedding_cache.get_many, texts)
+        miss_texts = [text for text, item in zip(texts, cached) if item is None]
+        miss_embeddings = None
+        if miss_texts:
+            miss_embeddings = await self.embedding_generator.embeddings_batch_array(miss_texts)
+            try:
+                await asyncio.to_thread(self.embedding_cache.put_many, miss_texts, miss_embeddings)
+            except Exception as e:
+                logger.error(f"embedding cache put failed: {e}")
+        return EmbeddingCache.merge(cached, miss_embeddings)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+        await get_default_pool().aclose()
@@ -0,0 +1,189 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config.logging_config import logger
+from core.tool.hash import text_to_sha256
+from core.vector.row_batch import EmbeddingBatch
+
+
+class EmbeddingCache:
+    """
+    基于SQLite的持久化向量缓存，key为 SHA-256(模型标识 + 文本)
+    - 稠密向量以float32紧凑存储，稀疏向量存为 uint32索引数组 + float32权重数组
+    - 读写均为NumPy数组，读取时直接映射查询结果的字节，不解码为Python float
+    - 超过max_bytes时按最近访问时间淘汰；读取只在内存中记录访问时间，随写入批量落盘
+    """
+    MAX_BYTES = 1024 * 1024 * 1024  # 1GB
+    # 淘汰到上限的该比例以下，避免每次写入都触发淘汰
+    EVICT_RATIO = 0.9
+    # 内存中积压的访问时间达到该条数时落盘，避免只读场景下无限增长
+    ACCESS_FLUSH_SIZE = 4096
+
+    def __init__(self, db_path: str, model_id: str = "bge-m3", max_bytes: int = MAX_BYTES):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be > 0")
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self.model_id = model_id
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache ("
+            "key TEXT PRIMARY KEY, "
+            "dense BLOB NOT NULL, "
+            "sparse_indices BLOB NOT NULL, "
+            "sparse_values BLOB NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "last_access INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_access ON embedding_cache(last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM embedding_cache").fetchone()[0]
+        # 待落盘的访问时间 key -> last_access
+        self._pending_access: Dict[str, int] = {}
+
+        # 指标统计
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0
+        }
+
+    def _key(self, text: str) -> str:
+        return text_to_sha256(self.model_id + "\n" + text)
+
+    @staticmethod
+    def _decode(dense: bytes, sparse_indices: bytes, sparse_values: bytes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return (np.frombuffer(dense, dtype=np.float32),
+                np.frombuffer(sparse_indices, dtype=np.uint32),
+                np.frombuffer(sparse_values, dtype=np.float32))
+
+    def get_many(self, texts: List[str]) -> List[Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]]:
+        """批量查询，命中的位置为(稠密向量, 稀疏token id, 稀疏权重)，未命中的位置返回None"""
+        keys = [self._key(text) for text in texts]
+        rows: Dict[str, tuple] = {}
+        with self._lock:
+            unique_keys = list(set(keys))
+            # SQLite单条语句的参数个数有限制，分批查询
+            for start in range(0, len(unique_keys), 500):
+                batch_keys = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch_keys))
+                for row in self._conn.execute(
+                        f"SELECT key, dense, sparse_indices, sparse_values FROM embedding_cache "
+                        f"WHERE key IN ({placeholders})", batch_keys):
+                    rows[row[0]] = row[1:]
+            if rows:
+                now = int(time.time())
+                for key in rows:
+                    self._pending_access[key] = now
+                if len(self._pending_access) >= self.ACCESS_FLUSH_SIZE:
+                    self._flush_access()
+                    self._conn.commit()
+            hits = sum(1 for key in keys if key in rows)
+            self._stats["hits"] += hits
+            self._stats["misses"] += len(keys) - hits
+
+        return [self._decode(*rows[key]) if key in rows else None for key in keys]
+
+    def put_many(self, texts: List[str], embeddings: EmbeddingBatch) -> None:
+        now = int(time.time())
+        records = []
+        for i, text in enumerate(texts):
+            indices, values = embeddings.sparse_row(i)
+            dense = embeddings.dense[i].astype(np.float32, copy=False).tobytes()
+            sparse_indices = indices.astype(np.uint32, copy=False).tobytes()
+            sparse_values = values.astype(np.float32, copy=False).tobytes()
+            size = len(dense) + len(sparse_indices) + len(sparse_values) + 64
+            records.append((self._key(text), dense, sparse_indices, sparse_values, size, now))
+
+        with self._lock:
+            for record in records:
+                old = self._conn.execute("SELECT size FROM embedding_cache WHERE key=?", (record[0],)).fetchone()
+                if old:
+                    self._total_bytes -= old[0]
+                self._conn.execute("INSERT OR REPLACE INTO embedding_cache VALUES (?, ?, ?, ?, ?, ?)", record)
+                self._total_bytes += record[4]
+            # 与写入同一事务提交；淘汰前需落盘，保证按真实访问时间淘汰
+            self._flush_access()
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    @staticmethod
+    def merge(cached: List[Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]],
+              miss_embeddings: Optional[EmbeddingBatch]) -> EmbeddingBatch:
+        """将get_many的命中结果与未命中部分（按顺序）新生成的向量合并为一批"""
+        if miss_embeddings is not None and len(miss_embeddings) == len(cached):
+            return miss_embeddings
+        if not cached:
+            return EmbeddingBatch.from_rows([], [])
+        dim = next(len(item[0]) for item in cached if item is not None)
+        dense = np.empty((len(cached), dim), dtype=np.float32)
+        sparse_rows = []
+        miss_index = 0
+        for i, item in enumerate(cached):
+            if item is not None:
+                dense[i] = item[0]
+                sparse_rows.append((item[1], item[2]))
+            else:
+                dense[i] = miss_embeddings.dense[miss_index]
+                sparse_rows.append(miss_embeddings.sparse_row(miss_index))
+                miss_index += 1
+        return EmbeddingBatch.from_rows(dense, sparse_rows)
+
+    def _flush_access(self) -> None:
+        """将内存中记录的访问时间写回，调用方负责加锁与提交"""
+        if not self._pending_access:
+            return
+        # 取较大值，避免覆盖刚写入记录的更新时间
+        self._conn.executemany("UPDATE embedding_cache SET last_access=MAX(last_access, ?) WHERE key=?",
+                               [(now, key) for key, now in self._pending_access.items()])
+        self._pending_access.clear()
+
+    def _evict(self) -> None:
+        """按最近访问时间淘汰，直到总大小低于上限的EVICT_RATIO"""
+        target = int(self.max_bytes * self.EVICT_RATIO)
+        evicted = 0
+        while self._total_bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, size FROM embedding_cache ORDER BY last_access LIMIT 256").fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            evict_keys = []
+            for key, size in rows:
+                if self._total_bytes <= target:
+                    break
+                evict_keys.append((key,))
+                self._total_bytes -= size
+            self._conn.executemany("DELETE FROM embedding_cache WHERE key=?", evict_keys)
+            evicted += len(evict_keys)
+        self._stats["evictions"] += evicted
+        logger.info(f"embedding cache evicted {evicted} entries | total_bytes={self._total_bytes}")
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = self._stats.copy()
+            stats["bytes"] = self._total_bytes
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / total if total else 0.0
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+            self._conn.close()
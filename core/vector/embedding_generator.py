@@ -1,18 +1,69 @@
+import asyncio
+from typing import Callable, Iterable, List, Optional, Tuple, Union
 from urllib.parse import urljoin
 
-from core.tool.http_req import send_request
+import numpy as np
+
+from config.service_config import config
+from core.tool.http_req import async_send_request, send_request
 from core.tool.thread_pool import logger
+from core.vector.row_batch import EmbeddingBatch
+
+# 一次请求的解析结果：紧凑格式为EmbeddingBatch，JSON格式为[(dense_vec, lexical_weights)]
+EmbeddingResults = Union[EmbeddingBatch, List[Tuple[list, dict]]]
+
+
+def _iter_pairs(results: EmbeddingResults) -> Iterable[Tuple[list, dict]]:
+    """逐条返回(dense_vec, lexical_weights)，格式与JSON响应一致"""
+    if isinstance(results, EmbeddingBatch):
+        return ((results.dense[i].tolist(), results.lexical_weights(i)) for i in range(len(results)))
+    return results
 
 
 class EmbeddingGenerator:
+    """
+    向量服务客户端
+    开启紧凑格式时通过Accept头协商：服务端支持则返回float32/CSR二进制（EmbeddingBatch.to_bytes），
+    直接以数组视图解析；不支持的服务端按Accept中的JSON返回，无需额外往返。JSON响应的gzip压缩由httpx透明处理
+    """
     API_PATH = "api"
     EMBEDDINGS_API = API_PATH + "/embeddings"
+    EMBEDDINGS_BATCH_API = EMBEDDINGS_API + "/batch"
     # EMBEDDINGS_URL = urljoin("http://172.18.10.61:8010", EMBEDDINGS_API)
 
-    def __init__(self, base_url: str):
+    # 单次批量请求的条数上限与token预算上限
+    MAX_BATCH_SIZE = 32
+    MAX_BATCH_TOKENS = 8192
+    BATCH_TIMEOUT = 30.0
+    COMPACT_CONTENT_TYPE = "application/x-embedding-batch"
+
+    def __init__(self, base_url: str,
+                 max_batch_size: int = MAX_BATCH_SIZE,
+                 max_batch_tokens: int = MAX_BATCH_TOKENS,
+                 length_function: Optional[Callable[[str], int]] = None,
+                 compact_format: Optional[bool] = None):
+        if max_batch_size <= 0:
+            raise ValueError("max_batch_size must be > 0")
+        if max_batch_tokens <= 0:
+            raise ValueError("max_batch_tokens must be > 0")
+
         self.embedding_url = urljoin(base_url, EmbeddingGenerator.EMBEDDINGS_API)
+        self.embedding_batch_url = urljoin(base_url, EmbeddingGenerator.EMBEDDINGS_BATCH_API)
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        # 未提供tokenizer时按字符数估算（中文约1字符1token）
+        self._length_function = length_function or len
+        if compact_format is None:
+            compact_format = config.embedding_compact_format
+        self.compact_format = compact_format
+        self._headers = {"Content-Type": "application/json; charset=UTF-8",
+                         "Accept": f"{self.COMPACT_CONTENT_TYPE}, application/json;q=0.9"} if compact_format else None
+        self._fallback_logged = False
 
     def embeddings(self, query: str):
+        return next(iter(_iter_pairs(self._request_one(query))))
+
+    def _request_one(self, query: str) -> EmbeddingResults:
         payload = {
             "query": query
         }
@@ -20,20 +71,246 @@ class EmbeddingGenerator:
         response = send_request(url=self.embedding_url,
                                 method="POST",
                                 json_data=payload,
+                                headers=self._headers,
                                 timeout=5.0)
+        return self._parse_response(response)
+
+    def _is_compact(self, response) -> bool:
+        content_type = response.headers.get("content-type", "").split(";")[0].strip()
+        if content_type == self.COMPACT_CONTENT_TYPE:
+            return True
+        if self.compact_format and not self._fallback_logged:
+            self._fallback_logged = True
+            logger.info(f"embedding service returned {content_type or 'unknown content type'}, "
+                        f"fallback to JSON | url={response.url}")
+        return False
+
+    def _parse_response(self, response) -> EmbeddingResults:
         if not response:
             raise Exception(f"请求失败, unknown error")
 
+        if self._is_compact(response):
+            results = EmbeddingBatch.from_bytes(response.content)
+            if len(results) != 1:
+                raise Exception(f"请求结果数量不匹配: expect 1, got {len(results)}")
+            return results
+
         res_data = response.json()
         if res_data.get("code") == 0:
             data = res_data.get("data")
-            return data.get('dense_vec'), data.get('lexical_weights')
+            return [(data.get('dense_vec'), data.get('lexical_weights'))]
         else:
             logger.error(f"请求失败 (code:{res_data.get('code')}): {res_data.get('msg')}")
             raise Exception(f"请求失败 (code:{res_data.get('code')}): {res_data.get('msg')}")
 
+    def embeddings_batch(self, texts: List[str]) -> Tuple[List[list], List[dict]]:
+        """
+        批量生成向量：按条数/token预算打包请求，失败的批次对半拆分重试
+
+        Returns:
+            (dense_vecs, lexical_weights)，顺序与输入texts一致
+        """
+        dense_vecs = [None] * len(texts)
+        lexical_weights = [None] * len(texts)
+
+        def store(start: int, results: EmbeddingResults) -> None:
+            for offset, (dense_vec, lexical_weight) in enumerate(_iter_pairs(results)):
+                dense_vecs[start + offset] = dense_vec
+                lexical_weights[start + offset] = lexical_weight
+
+        for start, end in self._plan_batches(texts):
+            self._embed_range(texts, start, end, store)
+        return dense_vecs, lexical_weights
+
+    def embeddings_batch_array(self, texts: List[str]) -> EmbeddingBatch:
+        """同embeddings_batch，每个响应解析后立即写入float32矩阵与稀疏数组，不保留Python float列表"""
+        sink = _ArraySink(len(texts))
+        for start, end in self._plan_batches(texts):
+            self._embed_range(texts, start, end, sink.store)
+        return sink.to_batch()
+
+    def _plan_batches(self, texts: List[str]) -> List[Tuple[int, int]]:
+        """按条数和token预算贪心切分批次，返回[start, end)区间列表"""
+        batches = []
+        start = 0
+        batch_tokens = 0
+        for i, text in enumerate(texts):
+            text_tokens = self._length_function(text)
+            if i > start and (i - start >= self.max_batch_size or
+                              batch_tokens + text_tokens > self.max_batch_tokens):
+                batches.append((start, i))
+                start = i
+                batch_tokens = 0
+            batch_tokens += text_tokens
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+
+    def _embed_range(self, texts: List[str], start: int, end: int,
+                     store: Callable[[int, EmbeddingResults], None]) -> None:
+        """请求[start, end)区间的向量，结果交给store(start, results)保存"""
+        try:
+            results = self._request_batch(texts[start:end])
+        except Exception as e:
+            if end - start <= 1:
+                raise
+            # 批次失败时对半拆分，缩小失败影响范围
+            mid = (start + end) // 2
+            logger.warning(f"embeddings batch [{start}, {end}) failed, split and retry: {e}")
+            self._embed_range(texts, start, mid, store)
+            self._embed_range(texts, mid, end, store)
+            return
+        store(start, results)
+
+    def _request_batch(self, texts: List[str]) -> EmbeddingResults:
+        if len(texts) == 1:
+            return self._request_one(texts[0])
+
+        payload = {
+            "queries": texts
+        }
+        response = send_request(url=self.embedding_batch_url,
+                                method="POST",
+                                json_data=payload,
+                                headers=self._headers,
+                                timeout=self.BATCH_TIMEOUT)
+        return self._parse_batch_response(response, len(texts))
+
+    def _parse_batch_response(self, response, expect_num: int) -> EmbeddingResults:
+        if not response:
+            raise Exception(f"批量请求失败, unknown error")
+
+        if self._is_compact(response):
+            results = EmbeddingBatch.from_bytes(response.content)
+            if len(results) != expect_num:
+                raise Exception(f"批量请求结果数量不匹配: expect {expect_num}, got {len(results)}")
+            return results
+
+        res_data = response.json()
+        if res_data.get("code") != 0:
+            logger.error(f"批量请求失败 (code:{res_data.get('code')}): {res_data.get('msg')}")
+            raise Exception(f"批量请求失败 (code:{res_data.get('code')}): {res_data.get('msg')}")
+
+        data = res_data.get("data") or []
+        if len(data) != expect_num:
+            raise Exception(f"批量请求结果数量不匹配: expect {expect_num}, got {len(data)}")
+        return [(item.get('dense_vec'), item.get('lexical_weights')) for item in data]
+
+
+class _ArraySink:
+    """按下标保存向量：稠密向量写入预分配的float32矩阵，稀疏向量转为数组"""
+
+    def __init__(self, size: int):
+        self._dense: Optional[np.ndarray] = None
+        self._sparse_rows: list = [None] * size
+
+    def store(self, start: int, results: EmbeddingResults) -> None:
+        if isinstance(results, EmbeddingBatch):
+            # 紧凑格式整批拷贝，稀疏数组在to_batch时合并
+            if self._dense is None:
+                self._dense = np.empty((len(self._sparse_rows), results.dense.shape[1]), dtype=np.float32)
+            self._dense[start:start + len(results)] = results.dense
+            for offset in range(len(results)):
+                self._sparse_rows[start + offset] = results.sparse_row(offset)
+            return
+        for offset, (dense_vec, lexical_weight) in enumerate(results):
+            if self._dense is None:
+                self._dense = np.empty((len(self._sparse_rows), len(dense_vec)), dtype=np.float32)
+            self._dense[start + offset] = dense_vec
+            self._sparse_rows[start + offset] = EmbeddingBatch.sparse_to_arrays(lexical_weight)
+
+    def to_batch(self) -> EmbeddingBatch:
+        return EmbeddingBatch.from_rows(self._dense if self._dense is not None else [], self._sparse_rows)
+
+
+class AsyncEmbeddingGenerator(EmbeddingGenerator):
+    """EmbeddingGenerator的asyncio版本，批次拆分与失败重试规则相同，多个批次并发请求"""
+
+    def __init__(self, base_url: str,
+                 max_batch_size: int = EmbeddingGenerator.MAX_BATCH_SIZE,
+                 max_batch_tokens: int = EmbeddingGenerator.MAX_BATCH_TOKENS,
+                 length_function: Optional[Callable[[str], int]] = None,
+                 max_concurrency: int = 64,
+                 compact_format: Optional[bool] = None):
+        super().__init__(base_url=base_url,
+                         max_batch_size=max_batch_size,
+                         max_batch_tokens=max_batch_tokens,
+                         length_function=length_function,
+                         compact_format=compact_format)
+        # 限制同时发往向量服务的请求数
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def embeddings(self, query: str):
+        return next(iter(_iter_pairs(await self._request_one(query))))
+
+    async def _request_one(self, query: str) -> EmbeddingResults:
+        payload = {
+            "query": query
+        }
+        async with self._semaphore:
+            response = await async_send_request(url=self.embedding_url,
+                                                method="POST",
+                                                json_data=payload,
+                                                headers=self._headers,
+                                                timeout=5.0)
+        return self._parse_response(response)
+
+    async def embeddings_batch(self, texts: List[str]) -> Tuple[List[list], List[dict]]:
+        dense_vecs = [None] * len(texts)
+        lexical_weights = [None] * len(texts)
+
+        def store(start: int, results: EmbeddingResults) -> None:
+            for offset, (dense_vec, lexical_weight) in enumerate(_iter_pairs(results)):
+                dense_vecs[start + offset] = dense_vec
+                lexical_weights[start + offset] = lexical_weight
+
+        await asyncio.gather(*(self._embed_range(texts, start, end, store)
+                               for start, end in self._plan_batches(texts)))
+        return dense_vecs, lexical_weights
+
+    async def embeddings_batch_array(self, texts: List[str]) -> EmbeddingBatch:
+        sink = _ArraySink(len(texts))
+        await asyncio.gather(*(self._embed_range(texts, start, end, sink.store)
+                               for start, end in self._plan_batches(texts)))
+        return sink.to_batch()
+
+    async def _embed_range(self, texts: List[str], start: int, end: int,
+                           store: Callable[[int, EmbeddingResults], None]) -> None:
+        try:
+            results = await self._request_batch(texts[start:end])
+        except Exception as e:
+            if end - start <= 1:
+                raise
+            mid = (start + end) // 2
+            logger.warning(f"embeddings batch [{start}, {end}) failed, split and retry: {e}")
+            await asyncio.gather(self._embed_range(texts, start, mid, store),
+                                 self._embed_range(texts, mid, end, store))
+            return
+        store(start, results)
+
+    async def _request_batch(self, texts: List[str]) -> EmbeddingResults:
+        if len(texts) == 1:
+            return await self._request_one(texts[0])
+
+        payload = {
+            "queries": texts
+        }
+        async with self._semaphore:
+            response = await async_send_request(url=self.embedding_batch_url,
+                                                method="POST",
+                                                json_data=payload,
+                                                headers=self._headers,
+                                                timeout=self.BATCH_TIMEOUT)
+        return self._parse_batch_response(response, len(texts))
+
+
 if __name__ == "__main__":
     embeddingGenerator = EmbeddingGenerator("http://172.18.10.61:8010")
     dense_vec, lexical_weights = embeddingGenerator.embeddings("python怎样安装？")
     print(f"dense_vec: {dense_vec}")
-    print(f"lexical_weights: {lexical_weights}")
\ No newline at end of file
+    print(f"lexical_weights: {lexical_weights}")
+
+    dense_vecs, lexical_weights_list = embeddingGenerator.embeddings_batch(
+        ["python怎样安装？", "python是一门解释性语言"])
+    print(f"dense_vecs: {len(dense_vecs)}")
+    print(f"lexical_weights: {lexical_weights_list}")
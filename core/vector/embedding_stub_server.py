@@ -0,0 +1,150 @@
+import argparse
+import gzip
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from core.vector.embedding_generator import EmbeddingGenerator
+from core.vector.row_batch import EmbeddingBatch
+
+
+class EmbeddingStubServer:
+    """
+    本地向量服务桩，接口与BGE-M3向量服务一致（api/embeddings、api/embeddings/batch），用于测试与压测
+    - compact=True时按Accept头协商，可返回紧凑的二进制格式；compact=False模拟只支持JSON的旧服务
+    - JSON响应在请求带Accept-Encoding: gzip时gzip压缩
+    - 向量由文本哈希确定性生成，同一文本每次结果相同
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, dim: int = 1024, compact: bool = True):
+        self.dim = dim
+        self.compact = compact
+        # 按响应格式统计请求数：compact / json / json+gzip
+        self.stats: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def embed(self, text: str) -> Tuple[np.ndarray, dict]:
+        """返回(归一化的float32稠密向量, {token id字符串: 权重})"""
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        dense_vec = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        dense_vec /= np.linalg.norm(dense_vec)
+        lexical_weights = {}
+        for char in text:
+            token_id = str(ord(char) % 250002)
+            lexical_weights[token_id] = round(lexical_weights.get(token_id, 0.0) + 0.1, 4)
+        return dense_vec, lexical_weights
+
+    def _record(self, response_format: str) -> None:
+        with self._lock:
+            self.stats[response_format] = self.stats.get(response_format, 0) + 1
+
+    def _respond(self, handler: BaseHTTPRequestHandler, texts: List[str], batch: bool) -> None:
+        embeddings = [self.embed(text) for text in texts]
+        if self.compact and EmbeddingGenerator.COMPACT_CONTENT_TYPE in handler.headers.get("Accept", ""):
+            body = EmbeddingBatch.from_lists([dense_vec for dense_vec, _ in embeddings],
+                                             [lexical_weights for _, lexical_weights in embeddings]).to_bytes()
+            self._record("compact")
+            self._send(handler, 200, body, EmbeddingGenerator.COMPACT_CONTENT_TYPE)
+            return
+
+        data = [{"dense_vec": dense_vec.tolist(), "lexical_weights": lexical_weights}
+                for dense_vec, lexical_weights in embeddings]
+        self._send_json(handler, {"code": 0, "msg": "success", "data": data if batch else data[0]})
+
+    def _send_json(self, handler: BaseHTTPRequestHandler, payload: dict, status: int = 200) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        if "gzip" in handler.headers.get("Accept-Encoding", ""):
+            self._record("json+gzip")
+            self._send(handler, status, gzip.compress(body), "application/json", content_encoding="gzip")
+        else:
+            self._record("json")
+            self._send(handler, status, body, "application/json")
+
+    @staticmethod
+    def _send(handler: BaseHTTPRequestHandler, status: int, body: bytes, content_type: str,
+              content_encoding: str = None) -> None:
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        if content_encoding:
+            handler.send_header("Content-Encoding", content_encoding)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                try:
+                    payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                except ValueError:
+                    stub._send_json(self, {"code": 400, "msg": "invalid json"}, status=400)
+                    return
+                path = self.path.rstrip("/")
+                if path == "/" + EmbeddingGenerator.EMBEDDINGS_BATCH_API and isinstance(payload.get("queries"), list):
+                    stub._respond(self, payload["queries"], batch=True)
+                elif path == "/" + EmbeddingGenerator.EMBEDDINGS_API and isinstance(payload.get("query"), str):
+                    stub._respond(self, [payload["query"]], batch=False)
+                else:
+                    stub._send_json(self, {"code": 404, "msg": f"unknown api: {self.path}"}, status=404)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def start(self) -> 'EmbeddingStubServer':
+        """在后台线程中运行"""
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        name="EmbeddingStubServer",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地向量服务桩")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--json-only", action="store_true", help="只返回JSON，模拟不支持紧凑格式的服务")
+    args = parser.parse_args()
+
+    server = EmbeddingStubServer(host=args.host, port=args.port, dim=args.dim, compact=not args.json_only)
+    print(f"embedding stub server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
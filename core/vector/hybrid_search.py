@@ -0,0 +1,215 @@
+import copy
+import json
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from pymilvus import AnnSearchRequest, Function, FunctionType, MilvusClient
+
+from config.logging_config import logger
+from config.service_config import config
+from core.tool.lru_cache import LRUCache
+from core.vector.embedding_generator import EmbeddingGenerator
+
+# 进程内按uri共享的MilvusClient，底层gRPC连接可被多线程复用
+_clients: Dict[str, MilvusClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(uri: str, timeout: float = 5.0) -> MilvusClient:
+    client = _clients.get(uri)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(uri)
+            if client is None:
+                client = MilvusClient(uri=uri, timeout=timeout)
+                _clients[uri] = client
+    return client
+
+
+class HybridSearcher:
+    """
+    稠密向量语义检索 + 稀疏向量全文检索，RRF融合排序
+    - 查询向量按归一化后的查询文本缓存（LRU），重复查询不再调用向量服务
+    - 检索结果按(collection, 查询, doc_id过滤, 检索参数)缓存，带过期时间
+    - 通过attach(milvus_write)注册写入监听，文档写入后使相关的检索结果失效
+    - search_batch将多个查询合并为一次批量向量化请求和一次多向量(nq=N)的hybrid_search调用
+    """
+    DENSE_PARAM = {"ef": 500}
+    SPARSE_PARAM = {"metric_type": "IP"}
+    RRF_K = 60
+    OUTPUT_FIELDS = ("doc_id", "chunk_id", "raw_text")
+
+    def __init__(self,
+                 milvus_uri: Optional[str] = None,
+                 embedding_uri: Optional[str] = None,
+                 embedding_cache_size: Optional[int] = None,
+                 result_cache_size: Optional[int] = None,
+                 result_cache_ttl: Optional[float] = None,
+                 timeout: float = 5.0):
+        self.milvus_uri = milvus_uri or config.milvus_url
+        self.embedding_generator = EmbeddingGenerator(embedding_uri or config.embedding_url)
+        self.timeout = timeout
+        self._embedding_cache = LRUCache(max_size=embedding_cache_size or config.search_embedding_cache_size)
+        if result_cache_ttl is None:
+            result_cache_ttl = config.search_result_cache_ttl
+        self._result_cache = LRUCache(max_size=result_cache_size or config.search_result_cache_size,
+                                      ttl=result_cache_ttl) if result_cache_ttl > 0 else None
+        # 每次失效加1，检索期间发生写入时不缓存该次结果，避免缓存旧数据
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> MilvusClient:
+        # 首次检索时才连接Milvus
+        return get_client(self.milvus_uri, timeout=self.timeout)
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """全角转半角、合并空白，作为缓存key与向量化的输入"""
+        return " ".join(unicodedata.normalize("NFKC", query).split())
+
+    def embed_queries(self, queries: List[str]) -> Tuple[List[list], List[dict]]:
+        """返回(dense_vecs, lexical_weights)，queries需已归一化；缓存未命中的查询合并为一次批量请求"""
+        embeddings = [self._embedding_cache.get(query) for query in queries]
+        misses = list(dict.fromkeys(query for query, embedding in zip(queries, embeddings) if embedding is None))
+        if misses:
+            dense_vecs, lexical_weights = self.embedding_generator.embeddings_batch(misses)
+            miss_embeddings = {}
+            for query, dense_vec, lexical_weight in zip(misses, dense_vecs, lexical_weights):
+                miss_embeddings[query] = (dense_vec, lexical_weight)
+                self._embedding_cache.put(query, (dense_vec, lexical_weight))
+            embeddings = [miss_embeddings[query] if embedding is None else embedding
+                          for query, embedding in zip(queries, embeddings)]
+        return [embedding[0] for embedding in embeddings], [embedding[1] for embedding in embeddings]
+
+    def _build_requests(self, dense_vecs: List[list], lexical_weights: List[dict], limit: int,
+                        expr: Optional[str], dense_param: dict, sparse_param: dict) -> List[AnnSearchRequest]:
+        return [AnnSearchRequest(data=dense_vecs,
+                                 anns_field="dense_vector",
+                                 param=dense_param,
+                                 limit=limit,
+                                 expr=expr),
+                AnnSearchRequest(data=lexical_weights,
+                                 anns_field="sparse_vector",
+                                 param=sparse_param,
+                                 limit=limit,
+                                 expr=expr)]
+
+    def _ranker(self) -> Function:
+        return Function(name="rrf",
+                        input_field_names=[],
+                        function_type=FunctionType.RERANK,
+                        params={"reranker": "rrf", "k": self.RRF_K})
+
+    @staticmethod
+    def _to_hits(hits) -> List[dict]:
+        """转换为普通dict，缓存的结果不引用pymilvus对象"""
+        return [{"id": hit["id"], "distance": hit["distance"], "entity": dict(hit["entity"])} for hit in hits]
+
+    def search(self,
+               collection_name: str,
+               query: str,
+               limit: int = 10,
+               doc_id: Optional[int] = None,
+               output_fields: Optional[Iterable[str]] = None,
+               dense_param: Optional[dict] = None,
+               sparse_param: Optional[dict] = None) -> List[dict]:
+        """
+        混合检索
+        :param doc_id: 只检索该文档，None表示检索整个collection
+        :return: [{"id", "distance", "entity": {输出字段}}]，按融合得分降序
+        """
+        return self.search_batch(collection_name, [query], limit=limit, doc_id=doc_id,
+                                 output_fields=output_fields, dense_param=dense_param,
+                                 sparse_param=sparse_param)[0]
+
+    def search_batch(self,
+                     collection_name: str,
+                     queries: List[str],
+                     limit: int = 10,
+                     doc_id: Optional[int] = None,
+                     output_fields: Optional[Iterable[str]] = None,
+                     dense_param: Optional[dict] = None,
+                     sparse_param: Optional[dict] = None) -> List[List[dict]]:
+        """
+        批量混合检索：命中结果缓存的查询直接返回，其余查询（去重后）一次向量化、一次检索
+        :return: 与queries一一对应的检索结果，格式同search
+        """
+        queries = [self.normalize_query(query) for query in queries]
+        output_fields = list(output_fields or self.OUTPUT_FIELDS)
+        dense_param = dense_param or self.DENSE_PARAM
+        sparse_param = sparse_param or self.SPARSE_PARAM
+        params = (limit, tuple(output_fields),
+                  json.dumps(dense_param, sort_keys=True), json.dumps(sparse_param, sort_keys=True))
+
+        results: Dict[str, List[dict]] = {}
+        if self._result_cache is not None:
+            for query in queries:
+                hits = self._result_cache.get((collection_name, doc_id, query) + params)
+                if hits is not None:
+                    results[query] = hits
+        misses = list(dict.fromkeys(query for query in queries if query not in results))
+
+        if misses:
+            with self._lock:
+                generation = self._generation
+            dense_vecs, lexical_weights = self.embed_queries(misses)
+            res = self._hybrid_search(collection_name, dense_vecs, lexical_weights, limit, doc_id,
+                                      output_fields, dense_param, sparse_param)
+            for query, hits in zip(misses, res):
+                results[query] = hits
+            if self._result_cache is not None:
+                with self._lock:
+                    if generation == self._generation:
+                        for query in misses:
+                            self._result_cache.put((collection_name, doc_id, query) + params,
+                                                   copy.deepcopy(results[query]))
+
+        # 每个查询返回独立的副本，调用方修改结果不影响缓存与重复的查询
+        return [copy.deepcopy(results[query]) for query in queries]
+
+    def _hybrid_search(self, collection_name: str, dense_vecs: List[list], lexical_weights: List[dict],
+                       limit: int, doc_id: Optional[int], output_fields: List[str],
+                       dense_param: dict, sparse_param: dict) -> List[List[dict]]:
+        """执行一次多向量混合检索，返回与查询向量一一对应的结果"""
+        expr = f"doc_id=={int(doc_id)}" if doc_id is not None else None
+        res = self.client.hybrid_search(collection_name=collection_name,
+                                        reqs=self._build_requests(dense_vecs, lexical_weights, limit, expr,
+                                                                  dense_param, sparse_param),
+                                        ranker=self._ranker(),
+                                        limit=limit,
+                                        output_fields=output_fields,
+                                        timeout=self.timeout)
+        # 结果按查询向量顺序返回，每个查询一组
+        return [self._to_hits(hits) for hits in res]
+
+    def invalidate(self, collection_name: str, doc_ids: Optional[Set[int]] = None) -> int:
+        """
+        使检索结果缓存失效：过滤条件为这些文档的结果，以及未按文档过滤的结果
+        :param doc_ids: None表示该collection的全部结果
+        :return: 失效的条数
+        """
+        with self._lock:
+            self._generation += 1
+        if self._result_cache is None:
+            return 0
+        removed = self._result_cache.remove_where(
+            lambda key: key[0] == collection_name and (doc_ids is None or key[1] is None or key[1] in doc_ids))
+        if removed:
+            logger.info(f"search result cache invalidated | collection={collection_name} | "
+                        f"doc_ids={sorted(doc_ids) if doc_ids is not None else None} | removed={removed}")
+        return removed
+
+    def attach(self, milvus_write) -> None:
+        """监听MilvusWrite的写入，写入成功后使相关检索结果失效"""
+        milvus_write.add_write_listener(self.invalidate)
+
+    def detach(self, milvus_write) -> None:
+        milvus_write.remove_write_listener(self.invalidate)
+
+    def get_stats(self) -> Dict[str, dict]:
+        return {
+            "embedding_cache": self._embedding_cache.get_stats(),
+            "result_cache": self._result_cache.get_stats() if self._result_cache is not None else None
+        }
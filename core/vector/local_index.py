@@ -0,0 +1,377 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+from config.logging_config import logger
+from core.vector.hybrid_search import HybridSearcher
+from core.vector.milvus_write import MilvusWrite
+from core.vector.row_batch import RowBatch
+
+
+class LocalCollection:
+    """
+    单个collection的本地索引，存储于 <data_dir>/<collection_name>/
+    - 稠密向量：float32矩阵，memmap映射到dense.f32，按行号(slot)存放，内积检索
+    - 稀疏向量：内存中的倒排索引 token id -> {slot: 权重}，启动时由SQLite中的数据重建
+    - 标量字段与稀疏向量存于SQLite，删除的slot复用
+    """
+    INITIAL_CAPACITY = 1024
+    DENSE_FILE = "dense.f32"
+    META_FILE = "meta.db"
+    FIELDS = ("id", "raw_text", "doc_id", "file_name", "chunk_id", "metadata", "create_time", "update_time")
+    UPDATABLE_FIELDS = ("raw_text", "file_name", "chunk_id", "create_time", "update_time")
+
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(path, self.META_FILE), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rows ("
+            "slot INTEGER PRIMARY KEY, "
+            "id TEXT UNIQUE NOT NULL, "
+            "raw_text TEXT, "
+            "doc_id INTEGER, "
+            "file_name TEXT, "
+            "chunk_id INTEGER, "
+            "metadata TEXT, "
+            "create_time INTEGER, "
+            "update_time INTEGER, "
+            "sparse_indices BLOB NOT NULL, "
+            "sparse_values BLOB NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_rows_doc_id ON rows(doc_id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+        row = self._conn.execute("SELECT value FROM info WHERE key='dim'").fetchone()
+        self.dim: Optional[int] = int(row[0]) if row else None
+        self._dense: Optional[np.memmap] = None
+        self._capacity = 0
+        self._size = 0
+        self._valid = np.zeros(0, dtype=bool)
+        self._doc_ids = np.zeros(0, dtype=np.int64)
+        # slot被删除（及随后复用）时递增，检索在锁外打分后据此丢弃期间被删除的slot
+        self._generations = np.zeros(0, dtype=np.int64)
+        self._id_to_slot: Dict[str, int] = {}
+        self._free_slots: List[int] = []
+        self._inverted: Dict[int, Dict[int, float]] = {}
+        self._slot_tokens: Dict[int, np.ndarray] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if self.dim is None:
+            return
+        dense_path = os.path.join(self.path, self.DENSE_FILE)
+        self._capacity = os.path.getsize(dense_path) // (self.dim * 4)
+        self._dense = np.memmap(dense_path, dtype=np.float32, mode="r+", shape=(self._capacity, self.dim))
+        self._valid = np.zeros(self._capacity, dtype=bool)
+        self._doc_ids = np.full(self._capacity, -1, dtype=np.int64)
+        self._generations = np.zeros(self._capacity, dtype=np.int64)
+        for slot, row_id, doc_id, sparse_indices, sparse_values in self._conn.execute(
+                "SELECT slot, id, doc_id, sparse_indices, sparse_values FROM rows"):
+            self._id_to_slot[row_id] = slot
+            self._valid[slot] = True
+            self._doc_ids[slot] = doc_id
+            self._index_sparse(slot, np.frombuffer(sparse_indices, dtype=np.uint32),
+                               np.frombuffer(sparse_values, dtype=np.float32))
+            self._size = max(self._size, slot + 1)
+        self._free_slots = [int(slot) for slot in np.flatnonzero(~self._valid[:self._size])]
+        logger.info(f"local index loaded | path={self.path} | rows={len(self._id_to_slot)}")
+
+    def _ensure_capacity(self, dim: int, capacity: int) -> None:
+        """按需扩容：容量翻倍并重新映射dense文件"""
+        if self.dim is None:
+            self.dim = dim
+            self._conn.execute("INSERT OR REPLACE INTO info VALUES ('dim', ?)", (str(dim),))
+            self._conn.commit()
+        elif dim != self.dim:
+            raise ValueError(f"dense vector dim mismatch: expected {self.dim}, got {dim}")
+        if capacity <= self._capacity:
+            return
+
+        new_capacity = max(self._capacity, self.INITIAL_CAPACITY)
+        while new_capacity < capacity:
+            new_capacity *= 2
+        if self._dense is not None:
+            self._dense.flush()
+            del self._dense
+        dense_path = os.path.join(self.path, self.DENSE_FILE)
+        with open(dense_path, "ab") as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self._dense = np.memmap(dense_path, dtype=np.float32, mode="r+", shape=(new_capacity, self.dim))
+        self._valid = np.concatenate([self._valid, np.zeros(new_capacity - self._capacity, dtype=bool)])
+        self._doc_ids = np.concatenate([self._doc_ids,
+                                        np.full(new_capacity - self._capacity, -1, dtype=np.int64)])
+        self._generations = np.concatenate([self._generations,
+                                            np.zeros(new_capacity - self._capacity, dtype=np.int64)])
+        self._capacity = new_capacity
+
+    def _index_sparse(self, slot: int, indices: np.ndarray, values: np.ndarray) -> None:
+        for index, value in zip(indices.tolist(), values.tolist()):
+            self._inverted.setdefault(index, {})[slot] = value
+        self._slot_tokens[slot] = indices
+
+    def _unindex_sparse(self, slot: int) -> None:
+        for index in self._slot_tokens.pop(slot, np.zeros(0, dtype=np.uint32)).tolist():
+            postings = self._inverted.get(index)
+            if postings is not None:
+                postings.pop(slot, None)
+                if not postings:
+                    del self._inverted[index]
+
+    def upsert(self, data: Union[List[dict], RowBatch]) -> None:
+        if not isinstance(data, RowBatch):
+            if not data:
+                return
+            data = RowBatch.from_rows(data)
+        if not len(data):
+            return
+        embeddings = data.embeddings
+        with self._lock:
+            # 先在局部变量中分配slot，SQL提交成功后才修改内存状态，写入失败时内存索引保持不变
+            free_slots = list(self._free_slots)
+            size = self._size
+            new_slots: Dict[str, int] = {}
+            slots = np.empty(len(data), dtype=np.int64)
+            for i, row_id in enumerate(data.ids):
+                slot = self._id_to_slot.get(row_id, new_slots.get(row_id))
+                if slot is None:
+                    slot = free_slots.pop() if free_slots else size
+                    size = max(size, slot + 1)
+                    new_slots[row_id] = slot
+                slots[i] = slot
+            # 扩容只追加空slot，不影响已有数据
+            self._ensure_capacity(embeddings.dense.shape[1], size)
+
+            metadata = data.metadata or [None] * len(data)
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(slot, row_id, raw_text, doc_id, file_name, chunk_id,
+                      json.dumps(item, ensure_ascii=False) if item is not None else None,
+                      create_time, update_time, indices.tobytes(), values.tobytes())
+                     for slot, row_id, raw_text, doc_id, file_name, chunk_id, item, create_time, update_time,
+                     (indices, values)
+                     in zip(slots.tolist(), data.ids, data.raw_texts, data.doc_ids.tolist(), data.file_names,
+                            data.chunk_ids.tolist(), metadata, data.create_times.tolist(),
+                            data.update_times.tolist(), (embeddings.sparse_row(i) for i in range(len(data))))])
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+            for i, slot in enumerate(slots.tolist()):
+                if slot in self._slot_tokens:
+                    self._unindex_sparse(slot)
+                indices, values = embeddings.sparse_row(i)
+                # 复制出独立的数组，倒排索引不引用整批数据
+                self._index_sparse(slot, indices.copy(), values)
+            # 同一批内主键重复时后出现的行生效，与逐行写入一致
+            self._dense[slots] = embeddings.dense
+            self._dense.flush()
+            self._valid[slots] = True
+            self._doc_ids[slots] = data.doc_ids
+            self._id_to_slot.update(new_slots)
+            self._free_slots = free_slots
+            self._size = size
+
+    def update_fields(self, data: List[dict]) -> None:
+        """按主键更新部分标量字段（对应Milvus的partial update），不存在的主键忽略"""
+        with self._lock:
+            for row in data:
+                fields = [field for field in row if field in self.UPDATABLE_FIELDS]
+                if row["id"] not in self._id_to_slot or not fields:
+                    continue
+                self._conn.execute(f"UPDATE rows SET {', '.join(f'{field}=?' for field in fields)} WHERE id=?",
+                                   [row[field] for field in fields] + [row["id"]])
+            self._conn.commit()
+
+    def delete(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            for row_id in ids:
+                slot = self._id_to_slot.pop(row_id, None)
+                if slot is None:
+                    continue
+                self._unindex_sparse(slot)
+                self._valid[slot] = False
+                self._doc_ids[slot] = -1
+                self._generations[slot] += 1
+                self._free_slots.append(slot)
+                self._conn.execute("DELETE FROM rows WHERE slot=?", (slot,))
+            self._conn.commit()
+
+    def query_chunk_ids(self, doc_id: int) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT id, chunk_id FROM rows WHERE doc_id=?", (int(doc_id),)))
+
+    def _fetch(self, slots: List[int], output_fields: List[str]) -> Dict[int, dict]:
+        fields = [field for field in output_fields if field in self.FIELDS]
+        rows = {}
+        for start in range(0, len(slots), 500):
+            batch = slots[start:start + 500]
+            for row in self._conn.execute(
+                    f"SELECT slot, id{''.join(', ' + field for field in fields)} FROM rows "
+                    f"WHERE slot IN ({','.join('?' * len(batch))})", batch):
+                entity = dict(zip(fields, row[2:]))
+                if entity.get("metadata") is not None:
+                    entity["metadata"] = json.loads(entity["metadata"])
+                rows[row[0]] = {"id": row[1], "entity": entity}
+        return rows
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, limit: int) -> List[int]:
+        """得分降序的前limit个slot（排除-inf）"""
+        candidates = np.flatnonzero(scores > -np.inf)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        return candidates[np.argsort(-scores[candidates], kind="stable")].tolist()
+
+    def search(self, dense_vecs: List[list], lexical_weights: List[dict], limit: int,
+               doc_id: Optional[int], output_fields: List[str], rrf_k: int = 60) -> List[List[dict]]:
+        # 锁内只复制检索所需的状态，打分与矩阵乘法在锁外进行，不阻塞写入
+        with self._lock:
+            if self._size == 0 or limit <= 0:
+                return [[] for _ in dense_vecs]
+            size = self._size
+            dense = np.asarray(self._dense[:size])
+            generations = self._generations[:size].copy()
+            mask = self._valid[:size].copy()
+            if doc_id is not None:
+                mask &= self._doc_ids[:size] == int(doc_id)
+            postings = [[list(self._inverted.get(int(index), {}).items()) for index in lexical_weight]
+                        for lexical_weight in lexical_weights]
+
+        # 稠密向量：一次矩阵乘法计算所有查询的内积
+        queries = np.asarray(dense_vecs, dtype=np.float32).reshape(len(dense_vecs), self.dim)
+        dense_scores = dense @ queries.T
+        dense_scores[~mask] = -np.inf
+
+        ranked = []
+        for i, lexical_weight in enumerate(lexical_weights):
+            # 稀疏向量：遍历查询token的倒排表累加内积
+            accumulated: Dict[int, float] = {}
+            for weight, token_postings in zip(lexical_weight.values(), postings[i]):
+                for slot, value in token_postings:
+                    accumulated[slot] = accumulated.get(slot, 0.0) + weight * value
+            sparse_scores = np.full(size, -np.inf, dtype=np.float32)
+            if accumulated:
+                sparse_scores[list(accumulated.keys())] = list(accumulated.values())
+            sparse_scores[~mask] = -np.inf
+
+            # RRF融合：score = sum(1 / (k + rank))，rank从1开始
+            fused: Dict[int, float] = {}
+            for top in (self._top_k(dense_scores[:, i], limit), self._top_k(sparse_scores, limit)):
+                for rank, slot in enumerate(top, start=1):
+                    fused[slot] = fused.get(slot, 0.0) + 1.0 / (rrf_k + rank)
+            ranked.append(sorted(fused.items(), key=lambda item: -item[1])[:limit])
+
+        with self._lock:
+            # 打分期间被删除（或被其他行复用）的slot不再返回
+            slots = sorted({slot for hits in ranked for slot, _ in hits
+                            if self._generations[slot] == generations[slot]})
+            rows = self._fetch(slots, output_fields)
+        return [[{"id": rows[slot]["id"], "distance": score, "entity": dict(rows[slot]["entity"])}
+                 for slot, score in hits if slot in rows] for hits in ranked]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._dense is not None:
+                self._dense.flush()
+            self._conn.close()
+
+
+class LocalIndex:
+    """本地向量索引，每个collection一个子目录，无需Milvus服务，适合小规模collection与离线测试"""
+
+    def __init__(self, data_dir: str):
+        self.data_dir = os.path.abspath(data_dir)
+        self._collections: Dict[str, LocalCollection] = {}
+        self._lock = threading.Lock()
+
+    def collection(self, collection_name: str) -> LocalCollection:
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            if collection is None:
+                collection = LocalCollection(os.path.join(self.data_dir, collection_name))
+                self._collections[collection_name] = collection
+            return collection
+
+    def has_collection(self, collection_name: str) -> bool:
+        return os.path.isdir(os.path.join(self.data_dir, collection_name))
+
+    def close(self) -> None:
+        with self._lock:
+            for collection in self._collections.values():
+                collection.close()
+            self._collections.clear()
+
+
+# 进程内按目录共享的本地索引，写入与检索看到同一份内存索引
+_indexes: Dict[str, LocalIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_local_index(data_dir: str) -> LocalIndex:
+    data_dir = os.path.abspath(data_dir)
+    with _indexes_lock:
+        index = _indexes.get(data_dir)
+        if index is None:
+            index = LocalIndex(data_dir)
+            _indexes[data_dir] = index
+        return index
+
+
+class LocalIndexWrite(MilvusWrite):
+    """写入本地索引的MilvusWrite：向量生成、异步写入、写入监听与MilvusWrite一致，只替换存储"""
+
+    def __init__(self, data_dir: str,
+                 embedding_uri: str = "http://172.18.10.61:8010",
+                 **kwargs):
+        self.local_index = get_local_index(data_dir)
+        super().__init__(embedding_uri=embedding_uri, **kwargs)
+
+    @staticmethod
+    def _create_conn_pool(milvus_uri: str, pool_size: int) -> None:
+        return None
+
+    def upsert(self, collection_name: str, data: Union[List[dict], RowBatch], partial_update: bool = False) -> None:
+        collection = self.local_index.collection(collection_name)
+        if partial_update:
+            collection.update_fields(data)
+            # 部分更新的行不一定带doc_id
+            self._notify_write(collection_name, None)
+        else:
+            collection.upsert(data)
+            self._notify_write(collection_name, data.doc_id_set() if isinstance(data, RowBatch)
+                               else {row["doc_id"] for row in data})
+        logger.info(f"local upsert | collection={collection_name} | rows={len(data)}")
+
+    def query_chunk_ids(self, collection_name: str, doc_id: int, batch_size: int = 1000) -> Dict[str, int]:
+        return self.local_index.collection(collection_name).query_chunk_ids(doc_id)
+
+    def delete(self, collection_name: str, ids: List[str], batch_size: int = 1000) -> None:
+        self.local_index.collection(collection_name).delete(ids)
+        logger.info(f"local delete | collection={collection_name} | ids={len(ids)}")
+        self._notify_write(collection_name, None)
+
+
+class LocalHybridSearcher(HybridSearcher):
+    """在本地索引上执行混合检索，缓存与批量检索逻辑与HybridSearcher一致"""
+
+    def __init__(self, data_dir: str, embedding_uri: Optional[str] = None, **kwargs):
+        super().__init__(embedding_uri=embedding_uri, **kwargs)
+        self.local_index = get_local_index(data_dir)
+
+    def _hybrid_search(self, collection_name: str, dense_vecs: List[list], lexical_weights: List[dict],
+                       limit: int, doc_id: Optional[int], output_fields: List[str],
+                       dense_param: dict, sparse_param: dict) -> List[List[dict]]:
+        # 本地索引为精确检索，dense_param/sparse_param中的索引参数不适用
+        return self.local_index.collection(collection_name).search(dense_vecs, lexical_weights, limit, doc_id,
+                                                                   output_fields, rrf_k=self.RRF_K)
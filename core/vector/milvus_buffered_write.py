@@ -0,0 +1,137 @@
+import threading
+import time
+from typing import Dict, List, Optional, Union
+
+from config.logging_config import logger
+from core.vector.milvus_write import MilvusWrite
+from core.vector.row_batch import RowBatch
+
+
+class _CollectionBuffer:
+    def __init__(self):
+        self.batches: List[RowBatch] = []
+        self.rows = 0
+        self.bytes = 0
+        self.first_row_time: Optional[float] = None
+
+
+class MilvusBufferedWrite:
+    """
+    按collection缓存待写入的行，满足条数/字节数/等待时长任一条件时合并为一次upsert
+    缓冲区按列存放（RowBatch），合并后按列写入
+    flush()/close()通过MilvusWrite.drain()等待所有已提交的upsert完成，保证返回时数据已写入Milvus
+    """
+    MAX_ROWS = 256
+    MAX_BYTES = 8 * 1024 * 1024  # 8MB
+    LINGER = 1.0
+
+    def __init__(self,
+                 milvus_write: MilvusWrite,
+                 max_rows: int = MAX_ROWS,
+                 max_bytes: int = MAX_BYTES,
+                 linger: float = LINGER):
+        if max_rows <= 0:
+            raise ValueError("max_rows must be > 0")
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be > 0")
+
+        self._milvus_write = milvus_write
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.linger = linger
+
+        self._lock = threading.Lock()
+        self._buffers: Dict[str, _CollectionBuffer] = {}
+        self._failed_rows: List[dict] = []
+        self._closed = False
+
+        # 后台线程负责按linger超时刷新，避免少量数据长期滞留在缓冲区
+        self._stop_event = threading.Event()
+        self._linger_thread = threading.Thread(target=self._linger_loop,
+                                               name="MilvusBufferedWrite-linger",
+                                               daemon=True)
+        self._linger_thread.start()
+
+    def write(self, collection_name: str, data: Union[List[dict], RowBatch]) -> None:
+        """追加行到缓冲区，达到条数或字节数阈值时触发刷新"""
+        if not isinstance(data, RowBatch):
+            data = RowBatch.from_rows(data)
+        to_flush = []
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MilvusBufferedWrite is closed, cannot write")
+            buffer = self._buffers.setdefault(collection_name, _CollectionBuffer())
+            start = 0
+            while start < len(data):
+                if buffer.first_row_time is None:
+                    buffer.first_row_time = time.monotonic()
+                end = min(len(data), start + self.max_rows - buffer.rows)
+                part = data if start == 0 and end == len(data) else data.slice(start, end)
+                buffer.batches.append(part)
+                buffer.rows += len(part)
+                buffer.bytes += part.nbytes()
+                start = end
+                if buffer.rows >= self.max_rows or buffer.bytes >= self.max_bytes:
+                    to_flush.append(self._take_rows(buffer))
+        for rows in to_flush:
+            self._submit(collection_name, rows)
+
+    @staticmethod
+    def _take_rows(buffer: _CollectionBuffer) -> RowBatch:
+        rows = RowBatch.concat(buffer.batches)
+        buffer.batches = []
+        buffer.rows = 0
+        buffer.bytes = 0
+        buffer.first_row_time = None
+        return rows
+
+    def _submit(self, collection_name: str, rows: RowBatch) -> None:
+        try:
+            self._milvus_write.write(collection_name, rows)
+        except Exception as e:
+            logger.error(f"submit upsert failed | collection={collection_name} | rows={len(rows)} | {e}")
+            with self._lock:
+                self._failed_rows.extend(rows.to_rows())
+
+    def _linger_loop(self) -> None:
+        interval = max(self.linger / 2, 0.01)
+        while not self._stop_event.wait(interval):
+            expired = []
+            now = time.monotonic()
+            with self._lock:
+                for collection_name, buffer in self._buffers.items():
+                    if buffer.first_row_time is not None and now - buffer.first_row_time >= self.linger:
+                        expired.append((collection_name, self._take_rows(buffer)))
+            for collection_name, rows in expired:
+                self._submit(collection_name, rows)
+
+    def flush(self, timeout: Optional[float] = None) -> List[dict]:
+        """
+        刷新所有缓冲区并等待已提交的upsert完成
+        :return: 写入失败的行（自上次flush以来）
+        """
+        with self._lock:
+            to_flush = [(collection_name, self._take_rows(buffer))
+                        for collection_name, buffer in self._buffers.items() if buffer.rows]
+        for collection_name, rows in to_flush:
+            self._submit(collection_name, rows)
+
+        failed_rows = self._milvus_write.drain(timeout=timeout)
+        with self._lock:
+            failed_rows.extend(self._failed_rows)
+            self._failed_rows = []
+        return failed_rows
+
+    def close(self, timeout: Optional[float] = None) -> List[dict]:
+        with self._lock:
+            self._closed = True
+        self._stop_event.set()
+        self._linger_thread.join()
+        return self.flush(timeout=timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
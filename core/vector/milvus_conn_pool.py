@@ -1,63 +1,246 @@
 import threading
-from queue import Queue, Empty
-from typing import Optional
+import time
+from collections import deque
+from typing import Dict, Optional
 
-from pymilvus import connections
+from pymilvus import Collection, connections
 from pymilvus.orm import utility
 
+from config.logging_config import logger
 from core.tool.queue_full_error import QueueFullError
 
 
+class _PooledConn:
+    __slots__ = ("alias", "last_used", "collections")
+
+    def __init__(self, alias: str):
+        self.alias = alias
+        self.last_used = time.monotonic()
+        # 按collection名缓存Collection句柄，避免每次写入都发describe_collection请求
+        self.collections: Dict[str, Collection] = {}
+
+
 class MilvusConnPool:
+    """
+    弹性Milvus连接池
+    - 连接数在[min_size, max_size]之间伸缩：空闲连接不足时按需新建，长时间空闲的多余连接被回收
+    - 后台线程定期对空闲连接做健康检查（同时起到keep-alive作用），异常连接自动重连
+    - 每个连接缓存其Collection句柄
+    """
     _instance: Optional['MilvusConnPool'] = None
     _lock = threading.Lock()
+    # 健康检查探测超时（秒），需覆盖正常的网络往返与服务端抖动，过短会把健康连接误判为异常
+    HEALTH_CHECK_TIMEOUT = 3.0
 
-    def __new__(cls, uri: str, pool_size: int = 10):
+    def __new__(cls, uri: str, pool_size: int = 10,
+                min_size: Optional[int] = None,
+                idle_timeout: float = 300.0,
+                health_check_interval: float = 30.0):
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:
                     cls._instance = super().__new__(cls)
-                    cls._instance._init_pool(uri, pool_size)
+                    cls._instance._init_pool(uri, pool_size, min_size, idle_timeout, health_check_interval)
         return cls._instance
 
-    def _init_pool(self, uri: str, pool_size: int = 10):
+    def _init_pool(self, uri: str, pool_size: int = 10,
+                   min_size: Optional[int] = None,
+                   idle_timeout: float = 300.0,
+                   health_check_interval: float = 30.0):
+        if pool_size <= 0:
+            raise ValueError("pool_size must be > 0")
+
         self.uri = uri
         self.pool_size = pool_size
-        self._pool = Queue(maxsize=pool_size)
+        self.max_size = pool_size
+        self.min_size = min(pool_size, 1 if min_size is None else max(min_size, 0))
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+
+        self._cond = threading.Condition()
+        self._conns: Dict[str, _PooledConn] = {}
+        self._idle = deque()
+        self._creating = 0
+        self._next_id = 0
+        self._closed = False
+
+        for _ in range(self.min_size):
+            conn = self._new_conn()
+            self._conns[conn.alias] = conn
+            self._idle.append(conn)
 
-        for i in range(pool_size):
-            alias = f"conn_{i}"
-            self.create_connection(alias=alias)
-            self._pool.put(alias)
+        self._stop_event = threading.Event()
+        self._health_thread = threading.Thread(target=self._health_loop,
+                                               name="MilvusConnPool-health",
+                                               daemon=True)
+        self._health_thread.start()
+
+    def _new_conn(self) -> _PooledConn:
+        with self._cond:
+            alias = f"conn_{self._next_id}"
+            self._next_id += 1
+        self.create_connection(alias=alias)
+        return _PooledConn(alias)
 
     def create_connection(self, alias: str):
         connections.connect(
             alias=alias,
             uri=self.uri
         )
+        # 重连后旧的Collection句柄不再可用
+        with self._cond:
+            conn = self._conns.get(alias)
+            if conn is not None:
+                conn.collections.clear()
 
-    @staticmethod
-    def test_connection(alias: str) -> bool:
+    @classmethod
+    def test_connection(cls, alias: str) -> bool:
         try:
-            utility.get_server_version(using=alias, timeout=0.1)
+            utility.get_server_version(using=alias, timeout=cls.HEALTH_CHECK_TIMEOUT)
             return True
         except Exception:
             return False
 
     def acquire(self, timeout: float = 5.0) -> str:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Milvus connection pool is closed")
+                if self._idle:
+                    # 后进先出：优先复用最近使用的连接，让多余连接自然空闲后被回收
+                    return self._idle.pop().alias
+                if len(self._conns) + self._creating < self.max_size:
+                    self._creating += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise QueueFullError("Milvus connection pool exhausted")
+                self._cond.wait(timeout=remaining)
+
+        # 在锁外建立新连接，避免阻塞其他线程归还/获取连接
         try:
-            return self._pool.get(timeout=timeout)
-        except Empty:
-            raise QueueFullError("Milvus connection pool exhausted")
+            conn = self._new_conn()
+        except Exception:
+            with self._cond:
+                self._creating -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._creating -= 1
+            self._conns[conn.alias] = conn
+        logger.info(f"Milvus connection pool grow | alias={conn.alias} | size={len(self._conns)}")
+        return conn.alias
 
     def release(self, alias: str):
-        self._pool.put(alias)
+        with self._cond:
+            conn = self._conns.get(alias)
+            if conn is None:
+                return
+            conn.last_used = time.monotonic()
+            self._idle.append(conn)
+            self._cond.notify()
 
-    def close(self):
-        with self._lock:
-            while not self._pool.empty():
+    def get_collection(self, alias: str, collection_name: str) -> Collection:
+        """获取连接上缓存的Collection句柄，首次使用时创建"""
+        with self._cond:
+            conn = self._conns[alias]
+            collection = conn.collections.get(collection_name)
+        if collection is not None:
+            return collection
+        # 创建句柄会请求服务端，放在锁外
+        collection = Collection(collection_name, using=alias)
+        with self._cond:
+            return conn.collections.setdefault(collection_name, collection)
+
+    def invalidate(self, alias: str, collection_name: Optional[str] = None):
+        """丢弃连接上缓存的Collection句柄（如collection被重建）"""
+        with self._cond:
+            conn = self._conns.get(alias)
+            if conn is None:
+                return
+            if collection_name is None:
+                conn.collections.clear()
+            else:
+                conn.collections.pop(collection_name, None)
+
+    def _health_loop(self):
+        while not self._stop_event.wait(self.health_check_interval):
+            try:
+                self._check_idle_connections()
+            except Exception as e:
+                logger.error(f"Milvus connection pool health check failed: {e}")
+
+    def _check_idle_connections(self):
+        """逐个检查空闲连接：每次只取出一个探测，其余空闲连接仍可被获取"""
+        with self._cond:
+            # 从最久未使用的一端开始
+            candidates = list(self._idle)
+
+        evicted = 0
+        kept = 0
+        for conn in candidates:
+            with self._cond:
+                if self._closed:
+                    return
+                # 已被其他线程取走的连接跳过
                 try:
-                    alias = self._pool.get_nowait()
-                    connections.disconnect(alias)
-                except Empty:
-                    break
\ No newline at end of file
+                    self._idle.remove(conn)
+                except ValueError:
+                    continue
+                if (time.monotonic() - conn.last_used > self.idle_timeout and
+                        len(self._conns) > self.min_size):
+                    self._conns.pop(conn.alias, None)
+                    evict = True
+                else:
+                    evict = False
+
+            if not evict and not self.test_connection(conn.alias):
+                logger.warning(f"Milvus connection unhealthy, reconnect | alias={conn.alias}")
+                try:
+                    self.create_connection(conn.alias)
+                except Exception as e:
+                    logger.error(f"Milvus reconnect failed | alias={conn.alias} | {e}")
+                    with self._cond:
+                        self._conns.pop(conn.alias, None)
+                    evict = True
+
+            if evict:
+                evicted += 1
+                try:
+                    connections.disconnect(conn.alias)
+                except Exception:
+                    pass
+            else:
+                with self._cond:
+                    if self._closed:
+                        return
+                    # 放回已检查连接之后，保持原有的复用顺序
+                    self._idle.insert(min(kept, len(self._idle)), conn)
+                    kept += 1
+            with self._cond:
+                self._cond.notify()
+
+        if evicted:
+            logger.info(f"Milvus connection pool shrink | evicted={evicted} | size={len(self._conns)}")
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "size": len(self._conns),
+                "idle": len(self._idle),
+                "in_use": len(self._conns) - len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size
+            }
+
+    def close(self):
+        self._stop_event.set()
+        with self._cond:
+            self._closed = True
+            aliases = list(self._conns.keys())
+            self._conns.clear()
+            self._idle.clear()
+            self._cond.notify_all()
+        for alias in aliases:
+            connections.disconnect(alias)
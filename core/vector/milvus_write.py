@@ -1,18 +1,77 @@
+import asyncio
+import json
+import threading
 import time
-from typing import List
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Set, Union
 
 from pymilvus import Collection
 
 from config.logging_config import logger
-from core.tool.atomic_counter import AtomicCounter
+from config.service_config import config
 from core.tool.hash import text_to_sha256
+from core.tool.queue_full_error import QueueFullError
 from core.tool.thread_pool import ThreadPool
 from core.vector.milvus_conn_pool import MilvusConnPool
 from core.tool.time import get_current_timestamp_ms
+from core.vector.embedding_cache import EmbeddingCache
 from core.vector.embedding_generator import EmbeddingGenerator
+from core.vector.row_batch import EmbeddingBatch, RowBatch
 
 
-class MilvusWrite:
+class WriteHandle:
+    """异步写入的句柄：可join(result)或在协程中await，失败时异常中带有对应的行"""
+
+    def __init__(self, collection_name: str, rows: Union[List[dict], RowBatch], future: Future):
+        self.collection_name = collection_name
+        self.rows = rows
+        self._future = future
+
+    def done(self) -> bool:
+        return self._future.done()
+
+    def result(self, timeout: Optional[float] = None) -> None:
+        return self._future.result(timeout=timeout)
+
+    def exception(self, timeout: Optional[float] = None) -> Optional[BaseException]:
+        return self._future.exception(timeout=timeout)
+
+    def add_done_callback(self, fn: Callable[['WriteHandle'], Any]) -> None:
+        self._future.add_done_callback(lambda _: fn(self))
+
+    def __await__(self):
+        return asyncio.wrap_future(self._future).__await__()
+
+
+class WriteNotifier:
+    """写入监听：写入成功后回调(collection_name, doc_ids)，doc_ids为None表示影响范围未知"""
+
+    def __init__(self):
+        self._write_listeners: List[Callable[[str, Optional[Set[int]]], None]] = []
+        self._listeners_lock = threading.Lock()
+
+    def add_write_listener(self, listener: Callable[[str, Optional[Set[int]]], None]) -> None:
+        """注册写入监听器，如检索结果缓存在数据变更后失效"""
+        with self._listeners_lock:
+            self._write_listeners.append(listener)
+
+    def remove_write_listener(self, listener: Callable[[str, Optional[Set[int]]], None]) -> None:
+        with self._listeners_lock:
+            if listener in self._write_listeners:
+                self._write_listeners.remove(listener)
+
+    def _notify_write(self, collection_name: str, doc_ids: Optional[Set[int]]) -> None:
+        with self._listeners_lock:
+            listeners = list(self._write_listeners)
+        for listener in listeners:
+            try:
+                listener(collection_name, doc_ids)
+            except Exception as e:
+                # 监听器异常不影响写入结果
+                logger.error(f"write listener failed | collection={collection_name} | {e}")
+
+
+class MilvusWrite(WriteNotifier):
     MAX_TASK_NUM = 8
     MAX_RETRIES = 10
 
@@ -20,63 +79,242 @@ class MilvusWrite:
                  embedding_uri: str="http://172.18.10.61:8010",
                  pool_size: int=4,
                  max_workers: int=4,
-                 queue_size: int=100):
-        self.conn_pool = MilvusConnPool(uri=milvus_uri, pool_size=pool_size)
+                 queue_size: int=100,
+                 embedding_cache: Optional[EmbeddingCache]=None,
+                 max_task_num: int=MAX_TASK_NUM):
+        super().__init__()
+        self.conn_pool = self._create_conn_pool(milvus_uri, pool_size)
         self.embedding_generator = EmbeddingGenerator(base_url=embedding_uri)
+        if embedding_cache is None and config.embedding_cache_file:
+            embedding_cache = EmbeddingCache(db_path=config.embedding_cache_file,
+                                             model_id=config.embedding_model_id,
+                                             max_bytes=config.embedding_cache_max_mb * 1024 * 1024)
+        self.embedding_cache = embedding_cache
         self.task_thread = ThreadPool(max_workers=max_workers, queue_size=queue_size)
-        self.task_counter = AtomicCounter(0)
-
-    def write_batch(self, collection_name: str, data_batch: List[List[dict]]) -> None:
-        for data in data_batch:
-            while self.task_counter.increment() > self.MAX_TASK_NUM:
-                self.task_counter.decrement()
-                time.sleep(0.002)
-            self.task_thread.submit(self._write, collection_name, data)
-
-    def write(self, collection_name: str, data: List[dict]) -> None:
-        while self.task_counter.increment() > self.MAX_TASK_NUM:
-            self.task_counter.decrement()
-            time.sleep(0.002)
-        self.task_thread.submit(self._write, collection_name, data)
-
-    def _write(self, collection_name:str, data: List[dict]) -> None:
+        # 准入控制：同时在途的写入任务数上限，满时阻塞等待而非自旋
+        self.max_task_num = max_task_num
+        self._task_semaphore = threading.BoundedSemaphore(max_task_num)
+        self._lock = threading.Lock()
+        # 在途的写入，以及完成后尚未被drain收集的失败写入
+        self._outstanding = set()
+
+    @staticmethod
+    def _create_conn_pool(milvus_uri: str, pool_size: int) -> Optional[MilvusConnPool]:
+        """创建存储连接，本地索引等其他存储后端通过覆盖此方法跳过Milvus连接"""
+        return MilvusConnPool(uri=milvus_uri, pool_size=pool_size)
+
+    def write_batch(self, collection_name: str, data_batch: List[Union[List[dict], RowBatch]],
+                    timeout: Optional[float] = None) -> List[WriteHandle]:
+        return [self._submit(collection_name, data, timeout) for data in data_batch]
+
+    def write(self, collection_name: str, data: Union[List[dict], RowBatch],
+              timeout: Optional[float] = None) -> WriteHandle:
+        """
+        异步写入，在途任务已满时阻塞等待
+        :param timeout: 等待准入的超时时间（秒），None表示一直等待，超时抛出QueueFullError
+        """
+        return self._submit(collection_name, data, timeout)
+
+    def _submit(self, collection_name: str, data: Union[List[dict], RowBatch],
+                timeout: Optional[float]) -> WriteHandle:
+        if not self._task_semaphore.acquire(timeout=timeout):
+            raise QueueFullError(f"write admission timeout after {timeout}s "
+                                 f"(max in-flight tasks={self.max_task_num})")
+        try:
+            future = self.task_thread.submit(self._write, collection_name, data)
+        except Exception:
+            self._task_semaphore.release()
+            raise
+
+        handle = WriteHandle(collection_name, data, future)
+        with self._lock:
+            self._outstanding.add(handle)
+        handle.add_done_callback(self._on_write_done)
+        return handle
+
+    def _write(self, collection_name: str, data: Union[List[dict], RowBatch]) -> None:
+        try:
+            self.upsert(collection_name, data)
+        finally:
+            self._task_semaphore.release()
+
+    def _on_write_done(self, handle: WriteHandle) -> None:
+        # 失败的写入保留到drain时收集
+        if handle.exception() is None:
+            with self._lock:
+                self._outstanding.discard(handle)
+
+    def drain(self, timeout: Optional[float] = None) -> List[dict]:
+        """
+        等待所有在途写入完成
+        :return: 自上次drain以来写入失败的行
+        """
+        with self._lock:
+            outstanding = list(self._outstanding)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for handle in outstanding:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                handle.exception(timeout=remaining)
+            except FutureTimeoutError:
+                raise TimeoutError(f"drain timeout after {timeout}s, "
+                                   f"{sum(1 for handle in outstanding if not handle.done())} writes still outstanding") from None
+
+        # 直接从句柄读取结果：future的等待方先于done回调被唤醒，不能依赖回调收集失败的行
+        failed_rows = []
+        for handle in outstanding:
+            if handle.exception() is not None:
+                failed_rows.extend(handle.rows.to_rows() if isinstance(handle.rows, RowBatch) else handle.rows)
+        with self._lock:
+            self._outstanding.difference_update(outstanding)
+        if failed_rows:
+            logger.error(f"drain finished with {len(failed_rows)} failed rows")
+        return failed_rows
+
+    def upsert(self, collection_name: str, data: Union[List[dict], RowBatch], partial_update: bool = False) -> None:
+        """
+        同步写入（带重试），供需要在调用线程上完成写入的场景使用
+        :param data: 行列表，或按列存放的RowBatch（按schema字段顺序按列写入，省去逐行组装与校验）
+        """
+        if isinstance(data, RowBatch):
+            ret = self._execute(collection_name,
+                                lambda collection: collection.upsert(
+                                    data=data.columns(field.name for field in collection.schema.fields
+                                                      if not field.auto_id),
+                                    timeout=10.0,
+                                    partial_update=partial_update
+                                ))
+            doc_ids = None if partial_update else data.doc_id_set()
+        else:
+            ret = self._execute(collection_name,
+                                lambda collection: collection.upsert(
+                                    data=data,
+                                    timeout=10.0,
+                                    partial_update=partial_update
+                                ))
+            # 部分更新的行不一定带doc_id，影响范围未知
+            doc_ids = None
+            if not partial_update and all("doc_id" in row for row in data):
+                doc_ids = {row["doc_id"] for row in data}
+        logger.info(f"upsert ret: {ret}")
+        self._notify_write(collection_name, doc_ids)
+
+    def query_chunk_ids(self, collection_name: str, doc_id: int, batch_size: int = 1000) -> Dict[str, int]:
+        """查询文档已入库的切片：主键id -> chunk_id"""
+        def query(collection: Collection) -> Dict[str, int]:
+            chunk_ids = {}
+            iterator = collection.query_iterator(batch_size=batch_size,
+                                                 expr=f"doc_id == {int(doc_id)}",
+                                                 output_fields=["id", "chunk_id"],
+                                                 timeout=10.0)
+            try:
+                while True:
+                    rows = iterator.next()
+                    if not rows:
+                        break
+                    for row in rows:
+                        chunk_ids[row["id"]] = row["chunk_id"]
+            finally:
+                iterator.close()
+            return chunk_ids
+
+        return self._execute(collection_name, query)
+
+    def delete(self, collection_name: str, ids: List[str], batch_size: int = 1000) -> None:
+        """按主键删除"""
+        for start in range(0, len(ids), batch_size):
+            batch_ids = ids[start:start + batch_size]
+            ret = self._execute(collection_name,
+                                lambda collection: collection.delete(expr=f"id in {json.dumps(batch_ids)}",
+                                                                     timeout=10.0))
+            logger.info(f"delete ret: {ret}")
+        # 按主键删除时无法得知所属文档
+        self._notify_write(collection_name, None)
+
+    def _execute(self, collection_name: str, fn: Callable[[Collection], Any]) -> Any:
+        """获取连接并执行操作，失败时检测并重建连接后重试"""
         current_retry = 0
         while current_retry < self.MAX_RETRIES:
             conn_alias = None
             try:
                 conn_alias = self.conn_pool.acquire()
-                collection = Collection(collection_name, using=conn_alias)
-                ret = collection.upsert(
-                    data=data,
-                    timeout=10.0,
-                    partial_update=False
-                )
-                logger.info(f"upsert ret: {ret}")
-                return
+                collection = self.conn_pool.get_collection(conn_alias, collection_name)
+                return fn(collection)
             except Exception as e:
                 logger.error(f"write catch exception {e}")
                 if conn_alias:
                     if not MilvusConnPool.test_connection(conn_alias):
                         self.conn_pool.create_connection(conn_alias)
+                    else:
+                        # 连接正常时丢弃缓存的句柄，collection可能已被重建
+                        self.conn_pool.invalidate(conn_alias, collection_name)
                     time.sleep(0.005)
                     current_retry = current_retry + 1
                     continue
                 raise
             finally:
-                self.task_counter.decrement()
                 if conn_alias:
                     self.conn_pool.release(conn_alias)
+        raise Exception(f"milvus operation failed after {self.MAX_RETRIES} retries")
 
     def gene_data(self,
                   doc_id: int,
                   doc_name: str,
                   text: str,
                   chunk_id: int) -> List[dict]:
-        dense_vec, lexical_weights = self.embedding_generator.embeddings(text)
+        return self.gene_data_batch(doc_id=doc_id, doc_name=doc_name, texts=[text], chunk_ids=[chunk_id])
+
+    def gene_data_batch(self,
+                        doc_id: int,
+                        doc_name: str,
+                        texts: List[str],
+                        chunk_ids: List[int]) -> List[dict]:
+        return self.gene_row_batch(doc_id=doc_id, doc_name=doc_name, texts=texts, chunk_ids=chunk_ids).to_rows()
+
+    def gene_row_batch(self,
+                       doc_id: int,
+                       doc_name: str,
+                       texts: List[str],
+                       chunk_ids: List[int]) -> RowBatch:
+        """生成按列存放的待写入数据，可直接传给upsert/write"""
+        if len(texts) != len(chunk_ids):
+            raise ValueError("texts and chunk_ids must have the same length")
 
-        current_timestamp_ms = get_current_timestamp_ms()
+        embeddings = self._embeddings(texts)
+
+        return RowBatch.build(doc_id=doc_id,
+                              doc_name=doc_name,
+                              texts=texts,
+                              chunk_ids=chunk_ids,
+                              embeddings=embeddings,
+                              timestamp_ms=get_current_timestamp_ms())
+
+    def _embeddings(self, texts: List[str]) -> EmbeddingBatch:
+        """先查向量缓存，只对未命中的文本调用向量服务"""
+        if self.embedding_cache is None:
+            return self.embedding_generator.embeddings_batch_array(texts)
+
+        cached = self.embedding_cache.get_many(texts)
+        miss_texts = [text for text, item in zip(texts, cached) if item is None]
+        miss_embeddings = None
+        if miss_texts:
+            miss_embeddings = self.embedding_generator.embeddings_batch_array(miss_texts)
+            try:
+                self.embedding_cache.put_many(miss_texts, miss_embeddings)
+            except Exception as e:
+                # 缓存写入失败不影响入库
+                logger.error(f"embedding cache put failed: {e}")
+        return EmbeddingCache.merge(cached, miss_embeddings)
 
-        data = [{
+    @staticmethod
+    def build_row(doc_id: int,
+                   doc_name: str,
+                   text: str,
+                   chunk_id: int,
+                   dense_vec: list,
+                   lexical_weights: dict,
+                   timestamp_ms: int) -> dict:
+        return {
             "id": text_to_sha256(text),
             "raw_text": text,
             "dense_vector": dense_vec,
@@ -84,7 +322,6 @@ class MilvusWrite:
             "doc_id": doc_id,
             "file_name": doc_name,
             "chunk_id": chunk_id,
-            "create_time": current_timestamp_ms,
-            "update_time": current_timestamp_ms
-        }]
-        return data
\ No newline at end of file
+            "create_time": timestamp_ms,
+            "update_time": timestamp_ms
+        }
@@ -0,0 +1,270 @@
+import struct
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from core.tool.hash import text_to_sha256
+
+
+@dataclass
+class EmbeddingBatch:
+    """
+    一批文本的向量，按列存放
+    - dense: (n, dim) float32矩阵
+    - 稀疏向量按CSR格式存放：第i行的token id与权重为
+      sparse_indices/sparse_values[sparse_indptr[i]:sparse_indptr[i + 1]]
+    """
+    dense: np.ndarray
+    sparse_indptr: np.ndarray
+    sparse_indices: np.ndarray
+    sparse_values: np.ndarray
+
+    # 二进制格式（小端）：头部(magic, 行数n, 维度dim, 稀疏非零数nnz)
+    # + indptr int64[n+1] + dense float32[n*dim] + indices uint32[nnz] + values float32[nnz]
+    MAGIC = b"EMB1"
+    _HEADER = struct.Struct("<4sIII")
+
+    def __len__(self) -> int:
+        return len(self.sparse_indptr) - 1
+
+    def to_bytes(self) -> bytes:
+        n = len(self)
+        dim = self.dense.shape[1] if n else 0
+        return b"".join([self._HEADER.pack(self.MAGIC, n, dim, len(self.sparse_indices)),
+                         self.sparse_indptr.astype("<i8", copy=False).tobytes(),
+                         self.dense.astype("<f4", copy=False).tobytes(),
+                         self.sparse_indices.astype("<u4", copy=False).tobytes(),
+                         self.sparse_values.astype("<f4", copy=False).tobytes()])
+
+    @classmethod
+    def from_bytes(cls, buffer: bytes) -> 'EmbeddingBatch':
+        """解析to_bytes的结果，各数组为buffer上的只读视图，不复制数据"""
+        if len(buffer) < cls._HEADER.size:
+            raise ValueError("embedding buffer too short")
+        magic, n, dim, nnz = cls._HEADER.unpack_from(buffer)
+        if magic != cls.MAGIC:
+            raise ValueError(f"unknown embedding buffer magic: {magic!r}")
+        expect = cls._HEADER.size + 8 * (n + 1) + 4 * n * dim + 8 * nnz
+        if len(buffer) != expect:
+            raise ValueError(f"embedding buffer size mismatch: expect {expect}, got {len(buffer)}")
+
+        offset = cls._HEADER.size
+        indptr = np.frombuffer(buffer, dtype="<i8", count=n + 1, offset=offset)
+        offset += indptr.nbytes
+        dense = np.frombuffer(buffer, dtype="<f4", count=n * dim, offset=offset).reshape(n, dim)
+        offset += dense.nbytes
+        indices = np.frombuffer(buffer, dtype="<u4", count=nnz, offset=offset)
+        offset += indices.nbytes
+        values = np.frombuffer(buffer, dtype="<f4", count=nnz, offset=offset)
+        if indptr[0] != 0 or indptr[-1] != nnz:
+            raise ValueError("invalid sparse indptr in embedding buffer")
+        return cls(dense=dense, sparse_indptr=indptr, sparse_indices=indices, sparse_values=values)
+
+    @classmethod
+    def from_rows(cls, dense_rows: Sequence, sparse_rows: Sequence[Tuple[np.ndarray, np.ndarray]]) -> 'EmbeddingBatch':
+        """由稠密向量（逐行或(n, dim)矩阵）与逐行的(token id数组, 权重数组)构建"""
+        indptr = np.zeros(len(sparse_rows) + 1, dtype=np.int64)
+        np.cumsum([len(indices) for indices, _ in sparse_rows], out=indptr[1:])
+        if len(dense_rows):
+            # 已是float32矩阵时不复制
+            dense = np.asarray(dense_rows, dtype=np.float32)
+        else:
+            dense = np.zeros((0, 0), dtype=np.float32)
+        return cls(dense=dense,
+                   sparse_indptr=indptr,
+                   sparse_indices=np.concatenate([indices for indices, _ in sparse_rows]).astype(np.uint32)
+                   if sparse_rows else np.zeros(0, dtype=np.uint32),
+                   sparse_values=np.concatenate([values for _, values in sparse_rows]).astype(np.float32)
+                   if sparse_rows else np.zeros(0, dtype=np.float32))
+
+    @staticmethod
+    def sparse_to_arrays(lexical_weights: Dict) -> Tuple[np.ndarray, np.ndarray]:
+        """向量服务返回的 {token id字符串: 权重} 转为(uint32数组, float32数组)"""
+        return (np.fromiter((int(index) for index in lexical_weights.keys()), dtype=np.uint32,
+                            count=len(lexical_weights)),
+                np.fromiter(lexical_weights.values(), dtype=np.float32, count=len(lexical_weights)))
+
+    @classmethod
+    def from_lists(cls, dense_vecs: List[list], lexical_weights: List[dict]) -> 'EmbeddingBatch':
+        """由向量服务的JSON格式构建"""
+        return cls.from_rows([np.asarray(dense_vec, dtype=np.float32) for dense_vec in dense_vecs],
+                             [cls.sparse_to_arrays(lexical_weight) for lexical_weight in lexical_weights])
+
+    @classmethod
+    def concat(cls, batches: Sequence['EmbeddingBatch']) -> 'EmbeddingBatch':
+        batches = [batch for batch in batches if len(batch)]
+        if not batches:
+            return cls.from_rows([], [])
+        if len(batches) == 1:
+            return batches[0]
+        indptr = [np.zeros(1, dtype=np.int64)]
+        offset = 0
+        for batch in batches:
+            indptr.append(batch.sparse_indptr[1:] + offset)
+            offset += int(batch.sparse_indptr[-1])
+        return cls(dense=np.concatenate([batch.dense for batch in batches]),
+                   sparse_indptr=np.concatenate(indptr),
+                   sparse_indices=np.concatenate([batch.sparse_indices for batch in batches]),
+                   sparse_values=np.concatenate([batch.sparse_values for batch in batches]))
+
+    def sparse_row(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.sparse_indptr[i], self.sparse_indptr[i + 1]
+        return self.sparse_indices[start:end], self.sparse_values[start:end]
+
+    def lexical_weights(self, i: int) -> Dict[str, float]:
+        """第i行稀疏向量，格式与向量服务返回的一致：token id字符串 -> 权重"""
+        indices, values = self.sparse_row(i)
+        return {str(index): value for index, value in zip(indices.tolist(), values.tolist())}
+
+    def sparse_pairs(self, i: int) -> List[Tuple[int, float]]:
+        """第i行稀疏向量的(token id, 权重)列表，pymilvus可直接接受"""
+        indices, values = self.sparse_row(i)
+        return list(zip(indices.tolist(), values.tolist()))
+
+
+@dataclass
+class RowBatch:
+    """
+    按列存放的一批待写入行，字段与collection schema对应
+    向量保存在EmbeddingBatch的连续数组中，不再为每行保存上千个Python float
+    """
+    ids: List[str]
+    raw_texts: List[str]
+    doc_ids: np.ndarray
+    file_names: List[str]
+    chunk_ids: np.ndarray
+    embeddings: EmbeddingBatch
+    create_times: np.ndarray
+    update_times: np.ndarray
+    metadata: Optional[List[Optional[dict]]] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, doc_id: int, doc_name: str, texts: List[str], chunk_ids: List[int],
+              embeddings: EmbeddingBatch, timestamp_ms: int) -> 'RowBatch':
+        n = len(texts)
+        return cls(ids=[text_to_sha256(text) for text in texts],
+                   raw_texts=list(texts),
+                   doc_ids=np.full(n, doc_id, dtype=np.int64),
+                   file_names=[doc_name] * n,
+                   chunk_ids=np.asarray(chunk_ids, dtype=np.int64),
+                   embeddings=embeddings,
+                   create_times=np.full(n, timestamp_ms, dtype=np.int64),
+                   update_times=np.full(n, timestamp_ms, dtype=np.int64))
+
+    @classmethod
+    def from_rows(cls, rows: List[dict]) -> 'RowBatch':
+        """由行格式（MilvusWrite.build_row）构建"""
+        embeddings = EmbeddingBatch.from_rows(
+            [np.asarray(row["dense_vector"], dtype=np.float32) for row in rows],
+            [EmbeddingBatch.sparse_to_arrays(row["sparse_vector"]) for row in rows])
+        metadata = [row.get("metadata") for row in rows]
+        return cls(ids=[row["id"] for row in rows],
+                   raw_texts=[row["raw_text"] for row in rows],
+                   doc_ids=np.asarray([row["doc_id"] for row in rows], dtype=np.int64),
+                   file_names=[row["file_name"] for row in rows],
+                   chunk_ids=np.asarray([row["chunk_id"] for row in rows], dtype=np.int64),
+                   embeddings=embeddings,
+                   create_times=np.asarray([row["create_time"] for row in rows], dtype=np.int64),
+                   update_times=np.asarray([row["update_time"] for row in rows], dtype=np.int64),
+                   metadata=metadata if any(item is not None for item in metadata) else None)
+
+    @classmethod
+    def concat(cls, batches: Sequence['RowBatch']) -> 'RowBatch':
+        if len(batches) == 1:
+            return batches[0]
+        metadata = None
+        if any(batch.metadata is not None for batch in batches):
+            metadata = [item for batch in batches for item in (batch.metadata or [None] * len(batch))]
+        return cls(ids=[row_id for batch in batches for row_id in batch.ids],
+                   raw_texts=[text for batch in batches for text in batch.raw_texts],
+                   doc_ids=np.concatenate([batch.doc_ids for batch in batches]),
+                   file_names=[name for batch in batches for name in batch.file_names],
+                   chunk_ids=np.concatenate([batch.chunk_ids for batch in batches]),
+                   embeddings=EmbeddingBatch.concat([batch.embeddings for batch in batches]),
+                   create_times=np.concatenate([batch.create_times for batch in batches]),
+                   update_times=np.concatenate([batch.update_times for batch in batches]),
+                   metadata=metadata)
+
+    def slice(self, start: int, end: int) -> 'RowBatch':
+        """第[start, end)行，向量为原数组的视图"""
+        embeddings = self.embeddings
+        sparse_start, sparse_end = embeddings.sparse_indptr[start], embeddings.sparse_indptr[end]
+        return RowBatch(ids=self.ids[start:end],
+                        raw_texts=self.raw_texts[start:end],
+                        doc_ids=self.doc_ids[start:end],
+                        file_names=self.file_names[start:end],
+                        chunk_ids=self.chunk_ids[start:end],
+                        embeddings=EmbeddingBatch(dense=embeddings.dense[start:end],
+                                                  sparse_indptr=embeddings.sparse_indptr[start:end + 1] - sparse_start,
+                                                  sparse_indices=embeddings.sparse_indices[sparse_start:sparse_end],
+                                                  sparse_values=embeddings.sparse_values[sparse_start:sparse_end]),
+                        create_times=self.create_times[start:end],
+                        update_times=self.update_times[start:end],
+                        metadata=self.metadata[start:end] if self.metadata is not None else None)
+
+    def nbytes(self) -> int:
+        """估算序列化后的大小：文本 + float32稠密向量 + 稀疏向量(索引+值)，每行另计128字节标量字段"""
+        embeddings = self.embeddings
+        return (128 * len(self)
+                + sum(len(text.encode("utf-8")) for text in self.raw_texts)
+                + embeddings.dense.nbytes
+                + embeddings.sparse_indices.nbytes + embeddings.sparse_values.nbytes)
+
+    def doc_id_set(self) -> Set[int]:
+        return set(self.doc_ids.tolist())
+
+    def iter_keys(self) -> Iterable[Tuple[int, int]]:
+        """逐行返回(doc_id, chunk_id)，用于记录失败的切片"""
+        return zip(self.doc_ids.tolist(), self.chunk_ids.tolist())
+
+    def column(self, name: str) -> list:
+        """按schema字段名返回列数据，格式为pymilvus按列写入所接受的格式"""
+        if name == "id":
+            return self.ids
+        if name == "raw_text":
+            return self.raw_texts
+        if name == "dense_vector":
+            # 每行是连续float32数组的视图，不复制数据
+            return list(self.embeddings.dense)
+        if name == "sparse_vector":
+            return [self.embeddings.sparse_pairs(i) for i in range(len(self))]
+        if name == "doc_id":
+            return self.doc_ids.tolist()
+        if name == "file_name":
+            return self.file_names
+        if name == "chunk_id":
+            return self.chunk_ids.tolist()
+        if name == "metadata":
+            return self.metadata if self.metadata is not None else [None] * len(self)
+        if name == "create_time":
+            return self.create_times.tolist()
+        if name == "update_time":
+            return self.update_times.tolist()
+        raise ValueError(f"unknown field: {name}")
+
+    def columns(self, field_names: Iterable[str]) -> List[list]:
+        return [self.column(name) for name in field_names]
+
+    def to_rows(self) -> List[dict]:
+        """转为行格式，dense_vector为float32数组视图"""
+        rows = []
+        for i in range(len(self)):
+            row = {
+                "id": self.ids[i],
+                "raw_text": self.raw_texts[i],
+                "dense_vector": self.embeddings.dense[i],
+                "sparse_vector": self.embeddings.lexical_weights(i),
+                "doc_id": int(self.doc_ids[i]),
+                "file_name": self.file_names[i],
+                "chunk_id": int(self.chunk_ids[i]),
+                "create_time": int(self.create_times[i]),
+                "update_time": int(self.update_times[i])
+            }
+            if self.metadata is not None and self.metadata[i] is not None:
+                row["metadata"] = self.metadata[i]
+            rows.append(row)
+        return rows
@@ -1,141 +1,184 @@
-from langchain_core.documents import Document
-from langchain_text_splitters import MarkdownHeaderTextSplitter
-from langchain_community.document_loaders import TextLoader
-from transformers import AutoTokenizer
-
-from core.file_split import FileSplit
-from core.gilingual_text_splitter import BilingualTextSplitter
-from core.vector.milvus_write import MilvusWrite
-
-separators = [
-    "\n\n",        # 段落分隔（优先级最高）
-    "\n",          # 行分隔
-    "。",          # 中文句号（句子结束）
-    "？",          # 中文问号
-    "！",          # 中文感叹号
-    "……",         # 中文省略号（四个点，规范表示）
-    "...",         # 英文省略号（三个点，常见于中英文混合文本）
-    ".",           # 英文句号
-    "?",           # 英文问号
-    "!",           # 英文感叹号
-    "；",          # 中文分号（用于长句分隔）
-    "，",          # 中文逗号（谨慎使用，避免过度分割）
-    " ",           # 空格（用于英文单词分隔）
-    ""             # 最后按字符分割（兜底）
-]
-
-HEADERS_TO_SPLIT_ON = [
-    ("#", "Header1"),
-    ("##", "Header2"),
-    ("###", "Header3"),
-    ("####", "Header4"),
-]
-
-MODEL_NAME = "/home/zhangjiang/bge-m3-model"
-
-CHUNK_SIZE = 512
-CHUNK_OVERLAP = 0
-
-HEAD_HEAD_SEG = " - "
-HEAD_CONTENT_SEG = "："
-LATER_HEAD_PREFIX = "续"
-
-def merge_headers(metadata: dict) -> str:
-    header_str = ""
-    for header in HEADERS_TO_SPLIT_ON:
-        key = header[1]
-        if key in metadata.keys():
-            if header_str:
-                header_str += HEAD_HEAD_SEG + metadata[key]
-            else:
-                header_str += metadata[key]
-    return header_str
-
-def split_markdown_by_headers(input_file, headers_to_split_on, chunk_size, chunk_overlap):
-    # 1. 读取markdown文件
-    loader = TextLoader(input_file)
-    documents = loader.load()
-
-    # 2. 创建标题分割器(按标题层级分割)
-    # 这是核心：保留标题结构，将标题信息作为元数据
-    splitter = MarkdownHeaderTextSplitter(
-        headers_to_split_on = headers_to_split_on,
-        return_each_line = False,
-        strip_headers = True
-    )
-
-    # 3. 执行标题分割(按标题层级分割文档)
-    # 例如：将"## 财务表现"作为边界，分割出财务表现部分
-    headers_chunks = splitter.split_text(documents[0].page_content)
-
-    # BGE-M3 等开源模型（HuggingFace）
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-
-    # 4. 递归分割(处理过长的块)
-    # 如果某个块内容过长(超过chunk_size)，按内容递归分割
-    final_chunks = []
-    length_function = lambda x: len(tokenizer.encode(x))
-    for chunk in headers_chunks:
-        # 如果块内容长度超过限制，则递归分割
-        header = merge_headers(chunk.metadata)
-        header_len = length_function(header)
-
-        if header_len + length_function(chunk.page_content) > chunk_size:
-            # 使用递归分割器处理长内容
-            recursive_splitter = BilingualTextSplitter(
-                chunk_size = CHUNK_SIZE - header_len,
-                chunk_overlap = chunk_overlap,
-                length_function = length_function
-            )
-            # 递归分割内容(保留标题元数据)
-            sub_chunks = recursive_splitter.split_text(chunk.page_content)
-
-            # 为每个子块添加相同的元数据(保留标题结构)
-            first_sub_chunk = True
-            for sub_chunk in sub_chunks:
-                if first_sub_chunk:
-                    first_sub_chunk = False
-                    sub_chunk_content = header + HEAD_CONTENT_SEG + sub_chunk
-                else:
-                    sub_chunk_content = LATER_HEAD_PREFIX + header + HEAD_CONTENT_SEG + sub_chunk
-                # 保留父级标题信息(避免结构断裂)
-                new_chunk = Document(
-                    page_content = sub_chunk_content,
-                    metadata = chunk.metadata.copy()  # 重要：复制metadata，避免引用问题
-                )
-                final_chunks.append(new_chunk)
-        else:
-            new_chunk = Document(
-                page_content = header + HEAD_CONTENT_SEG + chunk.page_content,
-                metadata = chunk.metadata
-            )
-            final_chunks.append(new_chunk)
-    return final_chunks
-
-class DataProcess:
-    def __init__(self, collection_name: str):
-        self._milvus_write = MilvusWrite()
-        self._collection_name = collection_name
-
-    def process(self, doc_id: int, doc_name: str, chunk_id: int, content: str, metadata: dict):
-        data = self._milvus_write.gene_data(doc_id = doc_id,
-                                     doc_name = doc_name,
-                                     text=content,
-                                     chunk_id = chunk_id)
-        self._milvus_write.write(collection_name = self._collection_name,
-                                 data = data)
+import argparse
+import sys
+import threading
+from typing import List
+
+# 重量级依赖（langchain、transformers、pymilvus等）均在用到时才导入，
+# 保证 --help 及各子命令只付出自身所需的导入开销
+
+
+def create_milvus_write():
+    """配置了本地索引目录时写入本地索引，否则写入Milvus；写入后使共享检索器中受影响的检索结果失效"""
+    from config.service_config import config
+
+    if config.local_index_dir:
+        from core.vector.local_index import LocalIndexWrite
+        milvus_write = LocalIndexWrite(data_dir=config.local_index_dir, embedding_uri=config.embedding_url)
+    else:
+        from core.vector.milvus_write import MilvusWrite
+        milvus_write = MilvusWrite()
+    get_searcher().attach(milvus_write)
+    return milvus_write
 
 
+_searcher = None
+_searcher_lock = threading.Lock()
+
+
+def get_searcher():
+    """进程内共享的检索器，查询向量与检索结果缓存在多次检索间复用"""
+    global _searcher
+    if _searcher is None:
+        with _searcher_lock:
+            if _searcher is None:
+                from config.service_config import config
+
+                if config.local_index_dir:
+                    from core.vector.local_index import LocalHybridSearcher
+                    _searcher = LocalHybridSearcher(data_dir=config.local_index_dir)
+                else:
+                    from core.vector.hybrid_search import HybridSearcher
+                    _searcher = HybridSearcher()
+    return _searcher
+
+
+def cmd_ingest(args) -> int:
+    from core.file_split import FileSplit
+
+    file_split_kwargs = {"chunk_size": args.chunk_size}
+    if args.model_name:
+        file_split_kwargs["model_name"] = args.model_name
+
+    if args.source.lower().endswith(".md") and args.process_workers is None:
+        # 单个Markdown文件直接在当前进程中入库，省去进程池启动开销
+        from core.ingest_pipeline import IngestPipeline
+
+        # 切分、向量化、写入三个阶段并发执行，互相掩盖延迟
+        with IngestPipeline(milvus_write=create_milvus_write(),
+                            collection_name=args.collection,
+                            file_split=FileSplit(**file_split_kwargs)) as pipeline:
+            pipeline.submit_document(doc_id=args.start_doc_id, doc_name=args.source)
+        print(f"doc_name: {args.source} process Finished | {pipeline.get_stats()}")
+        return 1 if pipeline.get_failures() else 0
+
+    from core.batch_ingest import BatchIngest, load_tasks
+
+    batch_ingest = BatchIngest(milvus_write=create_milvus_write(),
+                               collection_name=args.collection,
+                               process_workers=args.process_workers,
+                               pdf_output_dir=args.pdf_output_dir,
+                               file_split_kwargs=file_split_kwargs,
+                               pdf_concurrency=args.pdf_concurrency,
+                               pdf_batch_size=args.pdf_batch_size,
+                               pdf_shard_pages=args.pdf_shard_pages)
+    statuses = batch_ingest.run(load_tasks(args.source, start_doc_id=args.start_doc_id))
+    for doc_status in statuses:
+        print(doc_status)
+    return 0 if all(doc_status.status == "done" for doc_status in statuses) else 1
+
+
+def cmd_convert(args) -> int:
+    from core.pdf_convert_scheduler import PdfConvertScheduler
+
+    scheduler = PdfConvertScheduler(output_dir=args.output_dir,
+                                    max_concurrency=args.concurrency,
+                                    batch_size=args.batch_size,
+                                    timeout_per_file=args.timeout,
+                                    gpu_memory_utilization=args.gpu_memory_utilization,
+                                    shard_pages=args.shard_pages)
+    exit_code = 0
+    for result in scheduler.convert(args.pdf):
+        print(f"{result.pdf_path}\t{'ok' if result.success else 'failed'}\t"
+              f"{','.join(result.markdown_paths) if result.success else result.error}")
+        if not result.success:
+            exit_code = 1
+    return exit_code
+
+
+def cmd_create_collection(args) -> int:
+    from config.service_config import config
+
+    if config.local_index_dir and not args.milvus_uri:
+        # 本地索引的collection在首次写入时自动创建
+        print(f"collection {args.collection} uses local index at {config.local_index_dir}")
+        return 0
+
+    from pymilvus import MilvusClient
+
+    from core.vector.collection import CollectionCreate
+
+    client = MilvusClient(uri=args.milvus_uri or config.milvus_url, timeout=5.0)
+    if client.has_collection(args.collection):
+        print(f"collection {args.collection} already exists")
+        return 0
+    CollectionCreate(client).create_collection(args.collection)
+    print(f"collection {args.collection} created")
+    return 0
+
+
+def cmd_search(args) -> int:
+    # 稠密向量语义检索 + 稀疏向量全文检索，RRF融合排序；多个查询合并为一次检索
+    results = get_searcher().search_batch(collection_name=args.collection,
+                                          queries=args.query,
+                                          limit=args.limit,
+                                          doc_id=args.doc_id)
+    for query, hits in zip(args.query, results):
+        if len(args.query) > 1:
+            print(f"# {query}")
+        for hit in hits:
+            entity = hit["entity"]
+            print(f"{hit['distance']:.4f}\tdoc_id={entity['doc_id']}\tchunk_id={entity['chunk_id']}\t"
+                  f"{entity['raw_text']}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="文档切分、向量化与Milvus入库工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest", help="切分并入库Markdown/PDF文档")
+    ingest_parser.add_argument("source", help="Markdown文件、文档目录或清单文件（.jsonl / 每行一个路径）")
+    ingest_parser.add_argument("--collection", default="cn_1")
+    ingest_parser.add_argument("--start-doc-id", type=int, default=1)
+    ingest_parser.add_argument("--process-workers", type=int, default=None)
+    ingest_parser.add_argument("--pdf-output-dir", default=None)
+    ingest_parser.add_argument("--pdf-concurrency", type=int, default=1)
+    ingest_parser.add_argument("--pdf-batch-size", type=int, default=4)
+    ingest_parser.add_argument("--pdf-shard-pages", type=int, default=0,
+                               help="超过该页数的PDF按页码范围分片并行转换与切分，0表示不分片")
+    ingest_parser.add_argument("--model-name", default=None)
+    ingest_parser.add_argument("--chunk-size", type=int, default=512)
+    ingest_parser.set_defaults(func=cmd_ingest)
+
+    convert_parser = subparsers.add_parser("convert", help="使用MinerU将PDF转换为Markdown")
+    convert_parser.add_argument("pdf", nargs="+")
+    convert_parser.add_argument("--output-dir", required=True)
+    convert_parser.add_argument("--gpu-memory-utilization", type=float, default=0.2)
+    convert_parser.add_argument("--timeout", type=float, default=600.0, help="单个文件的超时时间（秒）")
+    convert_parser.add_argument("--concurrency", type=int, default=1, help="同时运行的转换进程数")
+    convert_parser.add_argument("--batch-size", type=int, default=4, help="每次转换调用处理的PDF数")
+    convert_parser.add_argument("--shard-pages", type=int, default=0,
+                                help="超过该页数的PDF按页码范围分片并行转换，0表示不分片")
+    convert_parser.set_defaults(func=cmd_convert)
+
+    create_parser = subparsers.add_parser("create-collection", help="创建Milvus collection")
+    create_parser.add_argument("collection")
+    create_parser.add_argument("--milvus-uri", default=None)
+    create_parser.set_defaults(func=cmd_create_collection)
+
+    search_parser = subparsers.add_parser("search", help="混合检索（稠密+稀疏向量）")
+    search_parser.add_argument("query", nargs="+", help="查询文本，可指定多个")
+    search_parser.add_argument("--collection", default="cn_1")
+    search_parser.add_argument("--doc-id", type=int, default=None)
+    search_parser.add_argument("--limit", type=int, default=3)
+    search_parser.set_defaults(func=cmd_search)
+    return parser
+
+
+def main(argv: List[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
 
 if __name__ == "__main__":
-    collection_name = "cn_1"
-    data_process = DataProcess(collection_name = collection_name)
-
-    doc_id = 1
-    doc_name = "/home/zhangjiang/广东大湾区空天信息研究院2025年度职工考核评价办法.md"
-    file_split = FileSplit()
-    file_split.split_markdown_callback(
-        doc_id = doc_id,
-        doc_name=doc_name,
-        fn = data_process.process)
-    print(f"doc_name: {doc_name} process Finished")
\ No newline at end of file
+    sys.exit(main())
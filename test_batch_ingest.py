@@ -0,0 +1,53 @@
+import os
+import tempfile
+
+from core.batch_ingest import BatchIngest, DocTask, load_tasks
+
+
+def test_load_tasks_sources():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        md_path = os.path.join(tmp_dir, "doc.md")
+        pdf_path = os.path.join(tmp_dir, "Doc.PDF")
+        with open(md_path, "w", encoding="utf-8") as f:
+            f.write("hello world\n")
+        with open(pdf_path, "wb") as f:
+            f.write(b"%PDF-1.4\n\xff\xfe\x00")
+
+        # 单个文档文件不按清单解析
+        assert load_tasks(md_path, start_doc_id=5) == [DocTask(doc_id=5, path=md_path)]
+        assert load_tasks(pdf_path) == [DocTask(doc_id=1, path=pdf_path)]
+
+        list_path = os.path.join(tmp_dir, "docs.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            f.write(f"# 注释\n{md_path}\n\n{pdf_path}\n")
+        assert load_tasks(list_path, start_doc_id=3) == [DocTask(doc_id=3, path=md_path),
+                                                         DocTask(doc_id=4, path=pdf_path)]
+
+        assert load_tasks(tmp_dir) == [DocTask(doc_id=1, path=pdf_path), DocTask(doc_id=2, path=md_path)]
+
+
+def _assert_duplicate_rejected(fn, *args):
+    try:
+        fn(*args)
+    except ValueError as e:
+        assert "duplicate doc_id" in str(e) and "[2]" in str(e)
+    else:
+        assert False, "duplicate doc_id should be rejected"
+
+
+def test_duplicate_doc_ids_rejected():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # 未指定doc_id的行接着上一行编号，与显式指定的2重复
+        manifest_path = os.path.join(tmp_dir, "docs.jsonl")
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            f.write('{"doc_id": 1, "path": "a.md"}\n{"path": "b.md"}\n{"doc_id": 2, "path": "c.md"}\n')
+        _assert_duplicate_rejected(load_tasks, manifest_path)
+
+    batch_ingest = BatchIngest(milvus_write=None, collection_name="c")
+    _assert_duplicate_rejected(batch_ingest.run, [DocTask(doc_id=2, path="a.md"), DocTask(doc_id=2, path="b.md")])
+
+
+if __name__ == "__main__":
+    test_load_tasks_sources()
+    test_duplicate_doc_ids_rejected()
+    print("batch ingest check passed")
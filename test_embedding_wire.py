@@ -0,0 +1,60 @@
+import asyncio
+
+import numpy as np
+
+from core.vector.embedding_generator import AsyncEmbeddingGenerator, EmbeddingGenerator
+from core.vector.embedding_stub_server import EmbeddingStubServer
+from core.vector.row_batch import EmbeddingBatch
+
+DIM = 16
+# 含单条批次（走单条接口）与多条批次
+TEXTS = ["python怎样安装？", "python是一门解释性语言", "入门门槛很低", "应用极为广泛", "不适合高并发场景"]
+
+
+def _assert_matches_stub(server: EmbeddingStubServer, batch: EmbeddingBatch) -> None:
+    assert len(batch) == len(TEXTS)
+    assert batch.dense.dtype == np.float32
+    for i, text in enumerate(TEXTS):
+        dense_vec, lexical_weights = server.embed(text)
+        np.testing.assert_array_equal(batch.dense[i], dense_vec)
+        assert batch.lexical_weights(i).keys() == lexical_weights.keys()
+        np.testing.assert_allclose(list(batch.lexical_weights(i).values()), list(lexical_weights.values()),
+                                   rtol=1e-6)
+
+
+def test_compact_format_negotiated():
+    with EmbeddingStubServer(dim=DIM) as server:
+        generator = EmbeddingGenerator(server.base_url, max_batch_size=2, compact_format=True)
+        _assert_matches_stub(server, generator.embeddings_batch_array(TEXTS))
+        assert set(server.stats) == {"compact"}
+
+        # 列表接口格式不变
+        dense_vec, lexical_weights = generator.embeddings(TEXTS[0])
+        assert isinstance(dense_vec, list) and len(dense_vec) == DIM
+        assert lexical_weights.keys() == server.embed(TEXTS[0])[1].keys()
+        dense_vecs, _ = generator.embeddings_batch(TEXTS)
+        np.testing.assert_array_equal(np.asarray(dense_vecs, dtype=np.float32)[1], server.embed(TEXTS[1])[0])
+
+        async_generator = AsyncEmbeddingGenerator(server.base_url, max_batch_size=2, compact_format=True)
+        _assert_matches_stub(server, asyncio.run(async_generator.embeddings_batch_array(TEXTS)))
+        assert set(server.stats) == {"compact"}
+
+
+def test_fallback_to_json():
+    # 服务端不支持紧凑格式时按JSON返回（gzip压缩），结果一致
+    with EmbeddingStubServer(dim=DIM, compact=False) as server:
+        generator = EmbeddingGenerator(server.base_url, max_batch_size=2, compact_format=True)
+        _assert_matches_stub(server, generator.embeddings_batch_array(TEXTS))
+        assert set(server.stats) == {"json+gzip"}
+
+    # 客户端关闭紧凑格式时不协商
+    with EmbeddingStubServer(dim=DIM) as server:
+        generator = EmbeddingGenerator(server.base_url, max_batch_size=2, compact_format=False)
+        _assert_matches_stub(server, generator.embeddings_batch_array(TEXTS))
+        assert "compact" not in server.stats
+
+
+if __name__ == "__main__":
+    test_compact_format_negotiated()
+    test_fallback_to_json()
+    print("embedding wire format check passed")
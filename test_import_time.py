@@ -0,0 +1,66 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+# 冷启动导入耗时预算（秒），可通过环境变量调整
+IMPORT_BUDGET = float(os.getenv("IMPORT_BUDGET", "0.5"))
+# 导入入口模块时不应被加载的重量级依赖
+HEAVY_MODULES = [
+    "langchain_community",
+    "langchain_text_splitters",
+    "langchain_core",
+    "transformers",
+    "torch",
+    "pymilvus",
+    "httpx",
+]
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _run(code: str) -> dict:
+    # 每次在新的解释器中执行，避免已导入的模块影响结果
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code],
+                            cwd=ROOT_DIR,
+                            capture_output=True,
+                            text=True,
+                            check=True)
+    elapsed = time.perf_counter() - start
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    data["elapsed"] = elapsed
+    return data
+
+
+def test_main_import_is_light():
+    data = _run("import json, sys, main; "
+                "print(json.dumps({'modules': sorted(m.split('.')[0] for m in sys.modules)}))")
+    loaded = sorted(set(HEAVY_MODULES) & set(data["modules"]))
+    assert not loaded, f"import main loaded heavy modules: {loaded}"
+    assert data["elapsed"] < IMPORT_BUDGET, \
+        f"import main took {data['elapsed']:.3f}s, budget {IMPORT_BUDGET}s"
+
+
+def test_logging_config_import_has_no_side_effect():
+    data = _run("import json, logging; import config.logging_config; "
+                "print(json.dumps({'handlers': len(logging.getLogger().handlers)}))")
+    assert data["handlers"] == 0, "importing config.logging_config should not install log handlers"
+
+
+def test_cli_help():
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "main.py", "--help"],
+                   cwd=ROOT_DIR,
+                   capture_output=True,
+                   check=True)
+    elapsed = time.perf_counter() - start
+    assert elapsed < IMPORT_BUDGET, f"main.py --help took {elapsed:.3f}s, budget {IMPORT_BUDGET}s"
+
+
+if __name__ == "__main__":
+    test_main_import_is_light()
+    test_logging_config_import_has_no_side_effect()
+    test_cli_help()
+    print("import time check passed")
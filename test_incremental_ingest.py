@@ -0,0 +1,67 @@
+import tempfile
+
+from core.file_split import Chunk
+from core.incremental_ingest import IncrementalIngest, ManifestChunkIndex
+from core.tool.hash import text_to_sha256
+from core.vector.milvus_write import MilvusWrite
+
+
+class _StubMilvusWrite(MilvusWrite):
+    """不连接Milvus，_execute直接作用于记录调用的假collection"""
+
+    @staticmethod
+    def _create_conn_pool(milvus_uri: str, pool_size: int) -> None:
+        return None
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+        collection = self
+
+        class FakeCollection:
+            def upsert(self, data, timeout=None, partial_update=False):
+                collection.calls.append(("upsert", data, partial_update))
+
+            def delete(self, expr, timeout=None):
+                collection.calls.append(("delete", expr))
+
+        self._execute = lambda collection_name, fn: fn(FakeCollection())
+
+
+class _StubFileSplit:
+    def __init__(self, contents):
+        self.contents = contents
+
+    def iter_chunks(self, doc_id, path):
+        for chunk_id, content in enumerate(self.contents, start=1):
+            yield Chunk(doc_id=doc_id, chunk_id=chunk_id, content=content)
+
+
+def test_moved_and_removed_chunks():
+    with tempfile.TemporaryDirectory() as manifest_dir:
+        milvus_write = _StubMilvusWrite()
+        notified = []
+        milvus_write.add_write_listener(lambda collection_name, doc_ids: notified.append(doc_ids))
+        chunk_index = ManifestChunkIndex(manifest_dir, "c")
+        chunk_index.save(7, {text_to_sha256("a"): 1, text_to_sha256("b"): 2, text_to_sha256("c"): 3})
+
+        # "b"被删除，"c"前移：只部分更新chunk_id，不重新向量化
+        ingest = IncrementalIngest(milvus_write=milvus_write,
+                                   collection_name="c",
+                                   file_split=_StubFileSplit(["a", "c"]),
+                                   chunk_index=chunk_index)
+        stats = ingest.ingest(7, "doc.md")
+
+        assert (stats["added"], stats["moved"], stats["removed"], stats["unchanged"]) == (0, 1, 1, 1)
+        upsert_call, delete_call = milvus_write.calls
+        assert upsert_call[0] == "upsert" and upsert_call[2] is True
+        assert [(row["id"], row["chunk_id"]) for row in upsert_call[1]] == [(text_to_sha256("c"), 2)]
+        assert delete_call == ("delete", f'id in ["{text_to_sha256("b")}"]')
+        # 部分更新的行不带doc_id，按影响范围未知通知
+        assert notified == [None, None]
+        assert chunk_index.load(7) == {text_to_sha256("a"): 1, text_to_sha256("c"): 2}
+
+
+if __name__ == "__main__":
+    test_moved_and_removed_chunks()
+    print("incremental ingest check passed")
@@ -0,0 +1,264 @@
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+from core.ingest_pipeline import IngestPipeline
+from core.vector.local_index import LocalHybridSearcher, LocalIndex, LocalIndexWrite
+from core.vector.row_batch import EmbeddingBatch, RowBatch
+
+DIM = 8
+
+
+def _row(doc_id: int, chunk_id: int, dense_axis: int, tokens: dict) -> dict:
+    dense_vec = np.zeros(DIM, dtype=np.float32)
+    dense_vec[dense_axis] = 1.0
+    return {
+        "id": f"{doc_id}-{chunk_id}",
+        "raw_text": f"doc {doc_id} chunk {chunk_id}",
+        "dense_vector": dense_vec.tolist(),
+        "sparse_vector": tokens,
+        "doc_id": doc_id,
+        "file_name": f"doc{doc_id}.md",
+        "chunk_id": chunk_id,
+        "create_time": 0,
+        "update_time": 0
+    }
+
+
+def _query(dense_axis: int) -> list:
+    dense_vec = [0.0] * DIM
+    dense_vec[dense_axis] = 1.0
+    return dense_vec
+
+
+def test_upsert_search_delete_and_reload():
+    with tempfile.TemporaryDirectory() as data_dir:
+        index = LocalIndex(data_dir)
+        collection = index.collection("c")
+        collection.upsert([_row(1, 1, 0, {"10": 0.5}),
+                           _row(1, 2, 1, {"11": 0.5}),
+                           _row(2, 1, 2, {"10": 0.1, "12": 0.9})])
+
+        # 稠密与稀疏都排第一的切片融合后排第一
+        hits = collection.search([_query(0)], [{"10": 1.0}], limit=2, doc_id=None,
+                                 output_fields=["doc_id", "chunk_id"])[0]
+        assert [hit["id"] for hit in hits][0] == "1-1"
+        assert hits[0]["entity"] == {"doc_id": 1, "chunk_id": 1}
+
+        # 按doc_id过滤，多个查询一次检索
+        results = collection.search([_query(0), _query(2)], [{"10": 1.0}, {"12": 1.0}], limit=3, doc_id=2,
+                                    output_fields=["chunk_id"])
+        assert [[hit["id"] for hit in hits] for hits in results] == [["2-1"], ["2-1"]]
+
+        # upsert覆盖同一主键，delete后slot复用
+        collection.upsert([_row(1, 2, 3, {"13": 1.0})])
+        collection.delete(["2-1"])
+        collection.upsert([_row(3, 1, 4, {"14": 1.0})])
+        assert collection.query_chunk_ids(1) == {"1-1": 1, "1-2": 2}
+        index.close()
+
+        # 重新打开后从磁盘恢复
+        collection = LocalIndex(data_dir).collection("c")
+        hits = collection.search([_query(3)], [{"13": 1.0}], limit=1, doc_id=None, output_fields=["raw_text"])[0]
+        assert hits[0]["id"] == "1-2"
+        assert collection.query_chunk_ids(2) == {}
+        hits = collection.search([_query(4)], [{"14": 1.0}], limit=1, doc_id=3, output_fields=[])[0]
+        assert hits[0]["id"] == "3-1"
+
+
+class _FailingConn:
+    """executemany失败的SQLite连接，模拟写盘出错"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def executemany(self, *args):
+        raise sqlite3.OperationalError("disk I/O error")
+
+
+def test_failed_upsert_leaves_index_unchanged():
+    with tempfile.TemporaryDirectory() as data_dir:
+        collection = LocalIndex(data_dir).collection("c")
+        collection.upsert([_row(1, 1, 0, {"10": 1.0}), _row(1, 2, 1, {"11": 1.0})])
+        collection.delete(["1-2"])
+
+        conn = collection._conn
+        collection._conn = _FailingConn(conn)
+        try:
+            collection.upsert([_row(1, 1, 5, {"15": 1.0}), _row(1, 3, 6, {"16": 1.0})])
+            assert False, "upsert should fail"
+        except sqlite3.OperationalError:
+            pass
+        collection._conn = conn
+
+        # 内存索引与SQLite保持一致：覆盖写入未生效，新行未占用slot
+        assert collection.query_chunk_ids(1) == {"1-1": 1}
+        hits = collection.search([_query(5)], [{"15": 1.0, "16": 1.0}], limit=3, doc_id=None, output_fields=[])[0]
+        assert [hit["id"] for hit in hits] == ["1-1"] and hits[0]["distance"] == 1.0 / 61
+        hits = collection.search([_query(0)], [{"10": 1.0}], limit=1, doc_id=None, output_fields=[])[0]
+        assert hits[0]["id"] == "1-1"
+
+        collection.upsert([_row(1, 3, 6, {"16": 1.0})])
+        hits = collection.search([_query(6)], [{"16": 1.0}], limit=1, doc_id=None, output_fields=["chunk_id"])[0]
+        assert hits[0]["entity"] == {"chunk_id": 3}
+        assert collection._size == 2
+
+
+def test_local_searcher_invalidated_by_attached_writer():
+    with tempfile.TemporaryDirectory() as data_dir:
+        milvus_write = LocalIndexWrite(data_dir=data_dir)
+        milvus_write.upsert("c", [_row(1, 1, 0, {"10": 1.0}), _row(2, 1, 0, {"10": 1.0})])
+
+        searcher = LocalHybridSearcher(data_dir=data_dir)
+        searcher.embedding_generator.embeddings_batch = lambda texts: (
+            [_query(0) for _ in texts], [{"10": 1.0} for _ in texts])
+        searches = []
+        hybrid_search = searcher._hybrid_search
+        searcher._hybrid_search = lambda *args: searches.append(args[4]) or hybrid_search(*args)
+        searcher.attach(milvus_write)
+
+        def search(doc_id):
+            return sorted(hit["id"] for hit in searcher.search("c", "q", doc_id=doc_id))
+
+        assert (search(None), search(1), search(2)) == (["1-1", "2-1"], ["1-1"], ["2-1"])
+        assert (search(None), search(1), search(2)) == (["1-1", "2-1"], ["1-1"], ["2-1"])
+        assert searches == [None, 1, 2]
+
+        # 写入doc 1：doc 1与未过滤的结果失效，doc 2的结果仍命中缓存
+        milvus_write.upsert("c", [_row(1, 2, 0, {"10": 1.0})])
+        assert (search(None), search(1), search(2)) == (["1-1", "1-2", "2-1"], ["1-1", "1-2"], ["2-1"])
+        assert searches == [None, 1, 2, None, 1]
+
+        searcher.detach(milvus_write)
+        milvus_write.upsert("c", [_row(2, 2, 0, {"10": 1.0})])
+        assert search(2) == ["2-1"]
+
+
+def test_search_batch_dedupes_and_skips_cached_queries():
+    with tempfile.TemporaryDirectory() as data_dir:
+        milvus_write = LocalIndexWrite(data_dir=data_dir)
+        milvus_write.upsert("c", [_row(1, 1, 0, {"10": 1.0}), _row(2, 1, 1, {"11": 1.0}), _row(3, 1, 2, {"12": 1.0})])
+
+        searcher = LocalHybridSearcher(data_dir=data_dir)
+        axes = {"a": 0, "b": 1, "c": 2}
+        embed_calls = []
+
+        def embeddings_batch(texts):
+            embed_calls.append(list(texts))
+            return [_query(axes[text]) for text in texts], [{str(10 + axes[text]): 1.0} for text in texts]
+
+        searcher.embedding_generator.embeddings_batch = embeddings_batch
+        searches = []
+        hybrid_search = searcher._hybrid_search
+        searcher._hybrid_search = lambda *args: searches.append(len(args[1])) or hybrid_search(*args)
+
+        assert [hit["id"] for hit in searcher.search("c", "b", limit=1)] == ["2-1"]
+        embed_calls.clear()
+        searches.clear()
+
+        # 归一化后重复的查询合并，"b"命中结果缓存；一次向量化、一次检索，结果按输入顺序返回
+        results = searcher.search_batch("c", ["a", "b", "ａ", " c ", "a"], limit=1)
+        assert [[hit["id"] for hit in hits] for hits in results] == [["1-1"], ["2-1"], ["1-1"], ["3-1"], ["1-1"]]
+        assert embed_calls == [["a", "c"]]
+        assert searches == [2]
+
+        # 重复查询的结果互相独立
+        results[0][0]["entity"]["chunk_id"] = -1
+        assert results[2][0]["entity"]["chunk_id"] == 1
+
+        # 全部命中缓存时不再向量化与检索
+        results = searcher.search_batch("c", ["c", "a"], limit=1)
+        assert [[hit["id"] for hit in hits] for hits in results] == [["3-1"], ["1-1"]]
+        assert embed_calls == [["a", "c"]] and searches == [2]
+
+
+def test_row_batch_round_trip_and_columnar_upsert():
+    rows = [_row(1, 1, 0, {"10": 0.5}), _row(1, 2, 1, {"11": 0.25, "12": 0.75}), _row(2, 1, 2, {})]
+    batch = RowBatch.from_rows(rows)
+    assert batch.embeddings.dense.dtype == np.float32
+    assert [dict(row, dense_vector=row["dense_vector"].tolist()) for row in batch.to_rows()] == rows
+
+    # 切片后再合并与原批次一致
+    merged = RowBatch.concat([batch.slice(0, 1), batch.slice(1, 3)])
+    assert merged.columns(["id", "chunk_id", "sparse_vector"]) == batch.columns(["id", "chunk_id", "sparse_vector"])
+    assert merged.column("sparse_vector") == [[(10, 0.5)], [(11, 0.25), (12, 0.75)], []]
+    assert merged.doc_id_set() == {1, 2}
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        collection = LocalIndex(data_dir).collection("c")
+        collection.upsert(merged)
+        hits = collection.search([_query(1)], [{"12": 1.0}], limit=1, doc_id=None, output_fields=["chunk_id"])[0]
+        assert hits[0]["id"] == "1-2"
+        assert collection.query_chunk_ids(2) == {"2-1": 1}
+
+
+def test_drain_returns_failures_before_done_callbacks():
+    with tempfile.TemporaryDirectory() as data_dir:
+        milvus_write = LocalIndexWrite(data_dir=data_dir)
+
+        def failing_upsert(collection_name, data, partial_update=False):
+            raise RuntimeError("disk full")
+
+        # done回调晚于等待方被唤醒时，drain仍能拿到失败的行
+        on_write_done = milvus_write._on_write_done
+        milvus_write._on_write_done = lambda handle: time.sleep(0.002) or on_write_done(handle)
+        milvus_write.upsert = failing_upsert
+        for chunk_id in range(20):
+            milvus_write.write("c", [_row(1, chunk_id, 0, {})])
+            assert [row["id"] for row in milvus_write.drain()] == [f"1-{chunk_id}"]
+        assert milvus_write.drain() == []
+
+        milvus_write.upsert = lambda collection_name, data, partial_update=False: None
+        milvus_write.write("c", [_row(1, 0, 0, {})])
+        assert milvus_write.drain() == []
+        time.sleep(0.01)
+        assert not milvus_write._outstanding
+
+
+def _stub_embeddings(texts: list) -> EmbeddingBatch:
+    return EmbeddingBatch.from_lists([_query(len(text) % DIM) for text in texts],
+                                     [{str(len(text)): 1.0} for text in texts])
+
+
+def test_pipeline_writes_through_buffered_write():
+    with tempfile.TemporaryDirectory() as data_dir:
+        milvus_write = LocalIndexWrite(data_dir=data_dir)
+        milvus_write.embedding_generator.embeddings_batch_array = _stub_embeddings
+        upsert = milvus_write.upsert
+
+        def failing_upsert(collection_name, data, partial_update=False):
+            if 2 in data.doc_id_set():
+                raise RuntimeError("disk full")
+            upsert(collection_name, data, partial_update)
+
+        milvus_write.upsert = failing_upsert
+        with IngestPipeline(milvus_write=milvus_write, collection_name="c",
+                            embed_batch_size=2, write_batch_size=3) as pipeline:
+            for chunk_id in range(1, 6):
+                pipeline.submit(doc_id=1, doc_name="a.md", chunk_id=chunk_id, content=f"doc 1 chunk {chunk_id}")
+            pipeline.submit(doc_id=2, doc_name="b.md", chunk_id=1, content="doc 2 chunk 1")
+
+        # close返回前全部写入已完成；同一次upsert中的行一起失败，记入get_failures
+        stats = pipeline.get_stats()
+        failed = {(failure["doc_id"], failure["chunk_id"]) for failure in pipeline.get_failures()
+                  if failure["stage"] == "write"}
+        assert (2, 1) in failed
+        assert stats["written"] + stats["failed"] == 6 and stats["failed"] == len(failed)
+        written = {(1, chunk_id) for chunk_id in milvus_write.query_chunk_ids("c", 1).values()}
+        assert len(written) == stats["written"] and not written & failed
+
+
+if __name__ == "__main__":
+    test_upsert_search_delete_and_reload()
+    test_failed_upsert_leaves_index_unchanged()
+    test_local_searcher_invalidated_by_attached_writer()
+    test_search_batch_dedupes_and_skips_cached_queries()
+    test_row_batch_round_trip_and_columnar_upsert()
+    test_drain_returns_failures_before_done_callbacks()
+    test_pipeline_writes_through_buffered_write()
+    print("local index check passed")
@@ -0,0 +1,63 @@
+import os
+import random
+import tempfile
+
+from langchain_text_splitters import MarkdownHeaderTextSplitter
+
+from core.markdown_stream_reader import MarkdownStreamReader
+
+HEADERS_TO_SPLIT_ON = [("#", "Header 1"), ("##", "Header 2"), ("###", "Header 3"), ("####", "Header 4")]
+
+# 随机文档的行素材：标题、正文、空行、代码块围栏、行内代码、形似标题的行等
+LINE_POOL = [
+    "# 标题一", "## 标题二", "### 标题三", "#### 标题四", "##### 五级标题不分割", "#不是标题", "#",
+    "  ## 缩进标题", "正文内容", "python是一门解释性语言", "  带缩进的正文  ", "行内 ``` 代码", "```单行代码```",
+    "```", "```python", "~~~", "~~~ text", "", "", "   ", "- 列表项", "> 引用", "中文\t制表符",
+]
+
+
+def _random_markdown(rng: random.Random) -> str:
+    lines = [rng.choice(LINE_POOL) for _ in range(rng.randint(0, 40))]
+    newline = rng.choice(["\n", "\n", "\r\n"])
+    text = newline.join(lines)
+    if rng.random() < 0.5:
+        text += newline
+    return text
+
+
+def _check_random_inputs(use_mmap: bool, rounds: int = 300) -> None:
+    rng = random.Random(14 if use_mmap else 41)
+    splitter = MarkdownHeaderTextSplitter(headers_to_split_on=HEADERS_TO_SPLIT_ON, strip_headers=True)
+    reader = MarkdownStreamReader(headers_to_split_on=HEADERS_TO_SPLIT_ON, use_mmap=use_mmap)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "doc.md")
+        for _ in range(rounds):
+            text = _random_markdown(rng)
+            with open(path, "wb") as f:
+                f.write(text.encode("utf-8"))
+
+            expected = [(doc.page_content, doc.metadata) for doc in splitter.split_text(text)]
+            sections = list(reader.read(path))
+            actual = [(section.page_content, section.metadata) for section in sections]
+            assert actual == expected, text
+
+            # 字节范围落在文件内且按顺序排列
+            size = os.path.getsize(path)
+            for prev, section in zip([None] + sections, sections):
+                assert 0 <= section.start_byte < section.end_byte <= size
+                if prev is not None:
+                    assert prev.end_byte <= section.start_byte
+
+
+def test_matches_langchain_splitter():
+    _check_random_inputs(use_mmap=False)
+
+
+def test_matches_langchain_splitter_mmap():
+    _check_random_inputs(use_mmap=True)
+
+
+if __name__ == "__main__":
+    test_matches_langchain_splitter()
+    test_matches_langchain_splitter_mmap()
+    print("markdown stream reader check passed")
@@ -0,0 +1,123 @@
+import os
+import sys
+import tempfile
+
+from core.pdf_convert_scheduler import PdfConvertScheduler
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+# 使用假转换器，无需安装MinerU
+FAKE_MINERU = [sys.executable, os.path.join(ROOT_DIR, "core", "tool", "fake_mineru.py")]
+
+
+def _make_pdfs(pdf_dir: str, names):
+    paths = []
+    for name in names:
+        path = os.path.join(pdf_dir, name + ".pdf")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"# {name}\n\n{name} content\n")
+        paths.append(path)
+    return paths
+
+
+def test_convert_batches_and_isolates_failures():
+    os.environ["FAKE_MINERU_FAIL"] = "bad"
+    os.environ["FAKE_MINERU_HANG"] = "hang"
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pdf_paths = _make_pdfs(tmp_dir, ["a", "b", "bad", "c", "hang"])
+            scheduler = PdfConvertScheduler(output_dir=os.path.join(tmp_dir, "out"),
+                                            max_concurrency=2,
+                                            batch_size=3,
+                                            timeout_per_file=2.0,
+                                            command=FAKE_MINERU)
+            results = {os.path.basename(r.pdf_path): r for r in scheduler.convert(pdf_paths)}
+
+            assert sorted(results) == ["a.pdf", "b.pdf", "bad.pdf", "c.pdf", "hang.pdf"]
+            for name in ("a", "b", "c"):
+                result = results[name + ".pdf"]
+                assert result.success, result.error
+                with open(result.markdown_path, encoding="utf-8") as f:
+                    assert f.read().startswith(f"# {name}")
+            assert not results["bad.pdf"].success
+            assert not results["hang.pdf"].success
+    finally:
+        os.environ.pop("FAKE_MINERU_FAIL", None)
+        os.environ.pop("FAKE_MINERU_HANG", None)
+
+
+def test_convert_cache_and_same_stem():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.makedirs(os.path.join(tmp_dir, "x"))
+        os.makedirs(os.path.join(tmp_dir, "y"))
+        pdf_paths = _make_pdfs(os.path.join(tmp_dir, "x"), ["a"]) + _make_pdfs(os.path.join(tmp_dir, "y"), ["b"])
+        # 同名文件内容不同
+        same_stem = os.path.join(tmp_dir, "y", "a.pdf")
+        os.rename(pdf_paths[1], same_stem)
+        pdf_paths[1] = same_stem
+
+        def run():
+            scheduler = PdfConvertScheduler(output_dir=os.path.join(tmp_dir, "out"),
+                                            batch_size=2,
+                                            command=FAKE_MINERU)
+            return {r.pdf_path: r for r in scheduler.convert(pdf_paths)}
+
+        first = run()
+        assert all(r.success and not r.cached for r in first.values())
+        assert first[pdf_paths[0]].markdown_path != first[pdf_paths[1]].markdown_path
+        with open(first[pdf_paths[1]].markdown_path, encoding="utf-8") as f:
+            assert f.read().startswith("# b")
+
+        # 内容未变的PDF直接命中缓存
+        second = run()
+        assert all(r.success and r.cached for r in second.values())
+        assert second[pdf_paths[0]].markdown_path == first[pdf_paths[0]].markdown_path
+
+
+def test_convert_shards_large_pdf():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # 假转换器以换页符分页
+        pages = [f"# page {i}\n\ncontent {i}\n" for i in range(5)]
+        pdf_path = os.path.join(tmp_dir, "big.pdf")
+        with open(pdf_path, "w", encoding="utf-8") as f:
+            f.write("\f".join(pages))
+
+        def page_counter(path):
+            with open(path, encoding="utf-8") as f:
+                return f.read().count("\f") + 1
+
+        def run():
+            scheduler = PdfConvertScheduler(output_dir=os.path.join(tmp_dir, "out"),
+                                            max_concurrency=3,
+                                            shard_pages=2,
+                                            page_counter=page_counter,
+                                            command=FAKE_MINERU)
+            return list(scheduler.convert([pdf_path]))
+
+        first = run()
+        assert len(first) == 1 and first[0].success, first[0].error
+        assert len(first[0].markdown_paths) == 3
+        contents = []
+        for markdown_path in first[0].markdown_paths:
+            with open(markdown_path, encoding="utf-8") as f:
+                contents.append(f.read())
+        assert [content.count("# page") for content in contents] == [2, 2, 1]
+        assert contents[0].startswith("# page 0") and contents[2].startswith("# page 4")
+
+        # 各分片单独缓存
+        second = run()
+        assert second[0].cached and second[0].markdown_paths == first[0].markdown_paths
+
+        # 无法获取页数时整篇转换
+        scheduler = PdfConvertScheduler(output_dir=os.path.join(tmp_dir, "out2"),
+                                        shard_pages=2,
+                                        page_counter=lambda path: None,
+                                        command=FAKE_MINERU)
+        results = list(scheduler.convert([pdf_path]))
+        assert results[0].success and len(results[0].markdown_paths) == 1
+
+
+if __name__ == "__main__":
+    test_convert_batches_and_isolates_failures()
+    test_convert_cache_and_same_stem()
+    test_convert_shards_large_pdf()
+    print("pdf convert scheduler check passed")
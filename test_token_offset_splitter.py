@@ -0,0 +1,104 @@
+import random
+import re
+
+from core.gilingual_text_splitter import BilingualTextSplitter
+from core.token_offset_splitter import TokenOffsetTextSplitter
+
+CHARS = "甲乙丙丁戊己庚辛壬癸"
+
+
+class CharTokenizer:
+    """测试用分词器：每个非空白字符为一个token，encode默认加2个特殊token"""
+    SPECIAL_TOKENS = 2
+
+    @staticmethod
+    def _offsets(text: str):
+        return [(i, i + 1) for i, char in enumerate(text) if not char.isspace()]
+
+    def encode(self, text: str, add_special_tokens: bool = True):
+        return [0] * (len(self._offsets(text)) + (self.SPECIAL_TOKENS if add_special_tokens else 0))
+
+    def __call__(self, text: str, add_special_tokens: bool = True, return_offsets_mapping: bool = False):
+        offsets = self._offsets(text)
+        result = {"input_ids": [0] * (len(offsets) + (self.SPECIAL_TOKENS if add_special_tokens else 0))}
+        if return_offsets_mapping:
+            result["offset_mapping"] = offsets
+        return result
+
+
+TOKENIZER = CharTokenizer()
+
+
+def _token_len(text: str) -> int:
+    return len(TOKENIZER.encode(text))
+
+
+def _split_both(text: str, chunk_size: int, chunk_overlap: int = 0):
+    token_offset = TokenOffsetTextSplitter(TOKENIZER, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    bilingual = BilingualTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=_token_len)
+    return token_offset.split_text(text), bilingual.split_text(text)
+
+
+def _words(rng: random.Random, low: int, high: int) -> str:
+    return "".join(rng.choice(CHARS) for _ in range(rng.randint(low, high)))
+
+
+def test_regex_separators_match_bilingual():
+    # "\n\nN." 编号为正则分隔符；每节超过半个块、不超过一个块时，两者都按节切分
+    rng = random.Random(5)
+    for _ in range(50):
+        text = "\n\n".join(f"{i}.{_words(rng, 9, 14)}" for i in range(1, rng.randint(3, 12)))
+        chunks, expected = _split_both(text, chunk_size=20)
+        assert chunks == expected, text
+
+
+def test_lookbehind_separators_match_bilingual():
+    # "(?<=。)"为零宽断言分隔符，句号保留在前一块末尾
+    rng = random.Random(7)
+    for _ in range(50):
+        text = "".join(_words(rng, 9, 16) + "。" for _ in range(rng.randint(2, 12)))
+        chunks, expected = _split_both(text, chunk_size=20)
+        assert chunks == expected, text
+        assert all(chunk.endswith("。") for chunk in chunks)
+
+
+def test_overlap_boundaries():
+    rng = random.Random(11)
+    for _ in range(50):
+        sentences = [_words(rng, 2, 6) + "。" for _ in range(rng.randint(5, 30))]
+        text = "".join(sentences)
+        chunks, expected = _split_both(text, chunk_size=20, chunk_overlap=6)
+
+        # 与BilingualTextSplitter一样：块由完整句子组成，不超过块大小，整体覆盖全文
+        for chunk_list in (chunks, expected):
+            assert all(_token_len(chunk) <= 20 for chunk in chunk_list)
+            assert all(re.fullmatch(r"([^。]+。)+", chunk) for chunk in chunk_list), chunk_list
+            assert chunk_list[0].startswith(sentences[0]) and chunk_list[-1].endswith(sentences[-1])
+
+        # 相邻块首尾相接或重叠，重叠部分不超过chunk_overlap个token
+        position = 0
+        prev_end = 0
+        for chunk in chunks:
+            start = text.index(chunk, position)
+            assert start <= prev_end
+            assert _token_len(text[start:prev_end]) - CharTokenizer.SPECIAL_TOKENS <= 6
+            position = start + 1
+            prev_end = start + len(chunk)
+        assert prev_end == len(text)
+
+
+def test_overlap_without_separators():
+    # 没有分隔符时按token数重叠
+    text = CHARS * 5
+    chunks = TokenOffsetTextSplitter(TOKENIZER, chunk_size=12, chunk_overlap=4).split_text(text)
+    assert chunks[0] == text[:10]
+    assert chunks[1] == text[6:16]
+    assert "".join(chunk[4:] if i else chunk for i, chunk in enumerate(chunks)) == text
+
+
+if __name__ == "__main__":
+    test_regex_separators_match_bilingual()
+    test_lookbehind_separators_match_bilingual()
+    test_overlap_boundaries()
+    test_overlap_without_separators()
+    print("token offset splitter check passed")